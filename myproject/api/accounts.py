@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+MENOS_CARREGADA = "menos_carregada"
+RODIZIO = "rodizio"
+ESTRATEGIAS = (MENOS_CARREGADA, RODIZIO)
+
+# Janela (s) usada no cálculo de consultas por minuto de cada conta
+JANELA_VAZAO = 300
+
+
+class ContaIndisponivel(Exception):
+    """
+    O portal recusou a conta (limite de requisições ou sessão derrubada):
+    a conta entra em backoff e a consulta pode ser refeita em outra.
+    """
+
+    motivo = "indisponivel"
+
+
+class ContaLimitada(ContaIndisponivel):
+    motivo = "limitada"
+
+
+class ContaDeslogada(ContaIndisponivel):
+    motivo = "deslogada"
+
+
+def verificar_status(status):
+    """
+    Converte as respostas do portal que indicam problema na conta em ContaIndisponivel.
+    """
+    if status == 429:
+        raise ContaLimitada(f"Conta limitada pelo portal (HTTP {status})")
+    if status in (401, 419):
+        raise ContaDeslogada(f"Sessão da conta derrubada pelo portal (HTTP {status})")
+
+
+class Conta:
+    """
+    Credenciais de uma conta do portal e o seu estado no agendador.
+    `limite` é o número máximo de consultas simultâneas (0 = sem limite).
+    """
+
+    def __init__(self, nome, usuario, senha, limite=0):
+        self.nome = nome
+        self.usuario = usuario
+        self.senha = senha
+        self.limite = limite
+        self.em_uso = 0
+        self.ultimo_uso = 0.0
+        self.falhas = 0
+        self.pausada_ate = 0.0
+        self.motivo_pausa = ""
+        self.consultas = 0
+        self.erros = 0
+        self.tempo_total = 0.0
+        self._concluidas = deque()
+
+    def __repr__(self):
+        return f"Conta({self.nome!r})"
+
+    def disponivel(self, agora):
+        return self.pausada_ate <= agora and (not self.limite or self.em_uso < self.limite)
+
+    def carga(self):
+        return self.em_uso / self.limite if self.limite else self.em_uso
+
+    def as_dict(self, agora, desde):
+        while self._concluidas and self._concluidas[0] < agora - JANELA_VAZAO:
+            self._concluidas.popleft()
+        janela = min(JANELA_VAZAO, agora - desde)
+        return {
+            "nome": self.nome,
+            "usuario": self.usuario,
+            "limite": self.limite,
+            "em_uso": self.em_uso,
+            "consultas": self.consultas,
+            "erros": self.erros,
+            "tempo_medio_ms": round(self.tempo_total / self.consultas * 1000, 1) if self.consultas else None,
+            "consultas_por_minuto": round(len(self._concluidas) / janela * 60, 2) if janela > 0 else None,
+            "pausada_por_s": round(max(0.0, self.pausada_ate - agora), 1),
+            "motivo_pausa": self.motivo_pausa if self.pausada_ate > agora else "",
+        }
+
+
+def _nome_seguro(nome):
+    # O nome também identifica a pasta da sessão em cache
+    return re.sub(r"[^\w.-]", "_", nome)
+
+
+def carregar_contas():
+    """
+    Contas de PORTAL_ACCOUNTS, uma lista JSON de objetos com "usuario", "senha"
+    e, opcionalmente, "nome" e "limite". Sem ela, usa LOGIN_USER/LOGIN_PASSWORD.
+    O limite padrão de cada conta vem de PORTAL_ACCOUNT_CONCURRENCY.
+    """
+    limite_padrao = int(os.getenv("PORTAL_ACCOUNT_CONCURRENCY", "0"))
+    configuradas = os.getenv("PORTAL_ACCOUNTS", "").strip()
+    if not configuradas:
+        return [Conta("padrao", os.getenv("LOGIN_USER"), os.getenv("LOGIN_PASSWORD"), limite_padrao)]
+
+    try:
+        itens = json.loads(configuradas)
+    except ValueError as e:
+        raise ValueError(f"PORTAL_ACCOUNTS não é um JSON válido: {e}")
+
+    contas = []
+    for item in itens:
+        if not item.get("usuario") or not item.get("senha"):
+            raise ValueError("Cada conta de PORTAL_ACCOUNTS precisa de 'usuario' e 'senha'")
+        nome = _nome_seguro(str(item.get("nome") or item["usuario"]))
+        if any(conta.nome == nome for conta in contas):
+            raise ValueError(f"Conta '{nome}' repetida em PORTAL_ACCOUNTS")
+        contas.append(Conta(nome, item["usuario"], item["senha"], int(item.get("limite", limite_padrao))))
+    if not contas:
+        raise ValueError("PORTAL_ACCOUNTS não tem nenhuma conta")
+    return contas
+
+
+class Agendador:
+    """
+    Distribui as consultas entre as contas do portal, respeitando o limite de
+    cada uma, e tira de circulação por algum tempo (backoff exponencial) as
+    contas limitadas ou deslogadas pelo portal.
+
+    Estratégias: "menos_carregada" (menor ocupação em relação ao limite; no
+    empate, a usada há mais tempo) ou "rodizio" (a próxima conta livre da lista).
+
+    O estado é do processo: com vários workers do gunicorn, cada um aplica os
+    limites às suas próprias consultas.
+    """
+
+    def __init__(self, contas, estrategia=MENOS_CARREGADA, backoff_base=30, backoff_max=900, timeout=120):
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estratégia de contas desconhecida: {estrategia}")
+        self.contas = contas
+        self.estrategia = estrategia
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.desde = time.monotonic()
+        self._proxima = 0
+        self._condicao = threading.Condition()
+
+    def _escolher(self, agora):
+        if self.estrategia == RODIZIO:
+            for deslocamento in range(len(self.contas)):
+                indice = (self._proxima + deslocamento) % len(self.contas)
+                if self.contas[indice].disponivel(agora):
+                    self._proxima = indice + 1
+                    return self.contas[indice]
+            return None
+        livres = [conta for conta in self.contas if conta.disponivel(agora)]
+        return min(livres, key=lambda conta: (conta.carga(), conta.ultimo_uso), default=None)
+
+    def _adquirir(self, timeout=None):
+        limite = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._condicao:
+            while True:
+                agora = time.monotonic()
+                conta = self._escolher(agora)
+                if conta is not None:
+                    conta.em_uso += 1
+                    conta.ultimo_uso = agora
+                    return conta
+                if agora >= limite:
+                    raise TimeoutError("Nenhuma conta do portal disponível")
+                # Acorda quando uma conta for liberada ou quando a pausa mais curta terminar
+                fim_das_pausas = [conta.pausada_ate for conta in self.contas if conta.pausada_ate > agora]
+                self._condicao.wait(min([limite, *fim_das_pausas]) - agora)
+
+    def _liberar(self, conta):
+        with self._condicao:
+            conta.em_uso -= 1
+            self._condicao.notify_all()
+
+    @contextmanager
+    def reservar(self, timeout=None):
+        """
+        Reserva uma conta durante o bloco, esperando até `timeout` segundos
+        (padrão: PORTAL_ACCOUNT_TIMEOUT) por uma conta livre.
+        """
+        conta = self._adquirir(timeout)
+        try:
+            yield conta
+        except ContaIndisponivel as e:
+            self.penalizar(conta, e.motivo)
+            raise
+        finally:
+            self._liberar(conta)
+
+    @asynccontextmanager
+    async def reservar_async(self, timeout=None):
+        """
+        Versão assíncrona de `reservar`: a espera por uma conta livre roda em uma thread.
+        """
+        conta = await asyncio.to_thread(self._adquirir, timeout)
+        try:
+            yield conta
+        except ContaIndisponivel as e:
+            self.penalizar(conta, e.motivo)
+            raise
+        finally:
+            self._liberar(conta)
+
+    @contextmanager
+    def consulta(self, conta):
+        """
+        Contabiliza uma consulta feita com a conta (vazão, erros e tempo médio).
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self._registrar(conta, time.perf_counter() - inicio, sucesso=False)
+            raise
+        self._registrar(conta, time.perf_counter() - inicio, sucesso=True)
+
+    def executar(self, funcao):
+        """
+        Executa `funcao(conta)` com uma conta reservada e devolve (conta, resultado).
+        Se o portal recusar a conta, ela entra em backoff e a chamada é refeita
+        com outra, no máximo uma vez por conta configurada.
+        """
+        for tentativa in range(len(self.contas)):
+            try:
+                with self.reservar() as conta, self.consulta(conta):
+                    return conta, funcao(conta)
+            except ContaIndisponivel as e:
+                if tentativa == len(self.contas) - 1:
+                    raise
+                logger.info(f"{e}; refazendo com outra conta")
+
+    def _registrar(self, conta, duracao, sucesso):
+        with self._condicao:
+            if sucesso:
+                conta.consultas += 1
+                conta.tempo_total += duracao
+                conta.falhas = 0
+                conta._concluidas.append(time.monotonic())
+            else:
+                conta.erros += 1
+        metrics.CONTA_CONSULTAS.inc(conta=conta.nome, resultado="sucesso" if sucesso else "erro")
+
+    def penalizar(self, conta, motivo):
+        """
+        Pausa a conta por backoff_base * 2^(falhas seguidas - 1) segundos, até backoff_max.
+        """
+        with self._condicao:
+            conta.falhas += 1
+            pausa = min(self.backoff_base * 2 ** (conta.falhas - 1), self.backoff_max)
+            conta.pausada_ate = time.monotonic() + pausa
+            conta.motivo_pausa = motivo
+        metrics.CONTA_PAUSAS.inc(conta=conta.nome, motivo=motivo)
+        logger.warning(f"Conta '{conta.nome}' {motivo}: pausada por {pausa:.0f}s")
+
+    def situacao(self):
+        """
+        Estado e vazão de cada conta, na ordem da configuração.
+        """
+        with self._condicao:
+            agora = time.monotonic()
+            return [conta.as_dict(agora, self.desde) for conta in self.contas]
+
+
+_agendador = None
+_agendador_lock = threading.Lock()
+
+
+def get_agendador():
+    """
+    Retorna o agendador de contas do processo, criando-o na primeira chamada.
+    """
+    global _agendador
+    with _agendador_lock:
+        if _agendador is None:
+            _agendador = Agendador(
+                carregar_contas(),
+                estrategia=os.getenv("PORTAL_ACCOUNT_STRATEGY", MENOS_CARREGADA),
+                backoff_base=float(os.getenv("PORTAL_ACCOUNT_BACKOFF", "30")),
+                backoff_max=float(os.getenv("PORTAL_ACCOUNT_BACKOFF_MAX", "900")),
+                timeout=float(os.getenv("PORTAL_ACCOUNT_TIMEOUT", "120")),
+            )
+            logger.info(
+                f"{len(_agendador.contas)} conta(s) do portal, estratégia '{_agendador.estrategia}'"
+            )
+        return _agendador
+
+
+def contas_em_uso():
+    """
+    Consultas em andamento por conta, para a métrica; vazio antes do primeiro uso.
+    """
+    if _agendador is None:
+        return {}
+    return {(conta["nome"],): conta["em_uso"] for conta in _agendador.situacao()}
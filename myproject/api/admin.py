@@ -1,3 +1,16 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import Job, SyslogSession
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "tipo", "status", "criado_em", "concluido_em")
+    list_filter = ("tipo", "status")
+
+
+@admin.register(SyslogSession)
+class SyslogSessionAdmin(admin.ModelAdmin):
+    list_display = ("username", "ipv6", "inicio", "fim", "nas", "licenca")
+    list_filter = ("licenca", "nas")
+    search_fields = ("username", "ipv6", "sessao")
@@ -0,0 +1,139 @@
+import os
+import uuid
+import time
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ResultArtifact
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo (s) entre coletas de lixo automáticas no mesmo processo
+_INTERVALO_COLETA = 3600
+_ultima_coleta = 0
+_coleta_lock = threading.Lock()
+
+
+def results_dir():
+    """
+    Pasta onde os resultados ficam guardados, um arquivo por conteúdo (SHA-256).
+    """
+    pasta = Path(os.getenv("RESULTS_DIR", settings.DATABASE_DIR / "results"))
+    pasta.mkdir(parents=True, exist_ok=True)
+    return pasta
+
+
+def novo_temporario(sufixo=".xlsx"):
+    """
+    Caminho exclusivo para gravar um resultado antes de armazená-lo.
+    Fica no mesmo sistema de arquivos dos resultados, para que a movimentação seja atômica.
+    """
+    pasta = results_dir() / "tmp"
+    pasta.mkdir(exist_ok=True)
+    return str(pasta / f"{uuid.uuid4()}{sufixo}")
+
+
+def _sha256(caminho):
+    digest = hashlib.sha256()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+            digest.update(bloco)
+    return digest.hexdigest()
+
+
+def armazenar(caminho_temporario, tipo, job=None, origem=None):
+    """
+    Move o arquivo para o diretório de resultados e registra seus metadados.
+    Conteúdos idênticos compartilham o mesmo arquivo.
+    """
+    sha256 = _sha256(caminho_temporario)
+    sufixo = Path(caminho_temporario).suffix
+    destino = results_dir() / sha256[:2] / f"{sha256}{sufixo}"
+    destino.parent.mkdir(exist_ok=True)
+
+    if destino.exists():
+        os.remove(caminho_temporario)
+    else:
+        os.replace(caminho_temporario, destino)
+
+    artefato = ResultArtifact.objects.create(
+        tipo=tipo,
+        sha256=sha256,
+        caminho=str(destino),
+        tamanho=destino.stat().st_size,
+        job=job,
+        origem=origem,
+    )
+    _coletar_periodicamente()
+    return artefato
+
+
+def _remover(artefatos):
+    """
+    Apaga os registros e os arquivos que deixaram de ser referenciados.
+    """
+    removidos = 0
+    for artefato in artefatos:
+        artefato.delete()
+        if not ResultArtifact.objects.filter(sha256=artefato.sha256).exists():
+            try:
+                os.remove(artefato.caminho)
+            except FileNotFoundError:
+                pass
+        removidos += 1
+    return removidos
+
+
+def coletar_lixo(max_dias=None, max_mb=None):
+    """
+    Remove resultados mais antigos que `max_dias` e, se o total ainda passar
+    de `max_mb`, os mais antigos até ficar dentro do limite.
+    """
+    max_dias = max_dias if max_dias is not None else float(os.getenv("RESULTS_MAX_AGE_DAYS", "7"))
+    max_mb = max_mb if max_mb is not None else float(os.getenv("RESULTS_MAX_SIZE_MB", "1024"))
+
+    limite = timezone.now() - timedelta(days=max_dias)
+    removidos = _remover(ResultArtifact.objects.filter(criado_em__lt=limite))
+
+    # Arquivos com o mesmo conteúdo contam uma única vez no disco
+    max_bytes = max_mb * 1024 * 1024
+    total = sum(
+        grupo["tamanho"]
+        for grupo in ResultArtifact.objects.values("sha256").annotate(tamanho=Max("tamanho"))
+    )
+    if total > max_bytes:
+        for artefato in ResultArtifact.objects.order_by("criado_em").iterator():
+            if total <= max_bytes:
+                break
+            compartilhado = ResultArtifact.objects.filter(sha256=artefato.sha256).exclude(id=artefato.id).exists()
+            removidos += _remover([artefato])
+            if not compartilhado:
+                total -= artefato.tamanho
+
+    # Temporários abandonados por consultas que falharam no meio
+    for temporario in (results_dir() / "tmp").glob("*"):
+        if temporario.stat().st_mtime < limite.timestamp():
+            temporario.unlink(missing_ok=True)
+
+    if removidos:
+        logger.info(f"{removidos} resultado(s) antigo(s) removido(s)")
+    return removidos
+
+
+def _coletar_periodicamente():
+    global _ultima_coleta
+    with _coleta_lock:
+        if time.monotonic() - _ultima_coleta < _INTERVALO_COLETA and _ultima_coleta:
+            return
+        _ultima_coleta = time.monotonic()
+    try:
+        coletar_lixo()
+    except Exception as e:
+        logger.error(f"Erro ao remover resultados antigos: {e}")
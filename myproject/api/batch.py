@@ -0,0 +1,264 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from django.conf import settings
+
+from . import accounts, artifacts, engines, metrics, portal, query_cache, session_store
+from .browser_pool import get_browser_pool
+from .models import Job, QueryResult, ResultArtifact
+from .timing import TimingProfile
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressoLote:
+    """
+    Mantém o progresso por item do lote gravado no job, para acompanhamento via API.
+    """
+
+    def __init__(self, job_id, total):
+        self.job_id = job_id
+        self.dados = {"total": total, "concluidos": 0, "erros": 0, "itens": [None] * total}
+        self._lock = threading.Lock()
+        self._salvar()
+
+    def registrar(self, indice, status, tempo_ms, erro="", conta=""):
+        with self._lock:
+            self.dados["itens"][indice] = {"status": status, "tempo_ms": tempo_ms, "erro": erro, "conta": conta}
+            self.dados["concluidos" if status == Job.CONCLUIDO else "erros"] += 1
+            self._salvar()
+
+    def por_conta(self):
+        """
+        Consultas concluídas por conta do portal (as atendidas pelo cache não contam).
+        """
+        contagem = {}
+        for item in self.dados["itens"]:
+            if item and item["status"] == Job.CONCLUIDO and item["conta"]:
+                contagem[item["conta"]] = contagem.get(item["conta"], 0) + 1
+        return contagem
+
+    def _salvar(self):
+        Job.objects.filter(id=self.job_id).update(progresso=self.dados)
+
+
+def _tempo_ms(inicio):
+    return round((time.perf_counter() - inicio) * 1000, 1)
+
+
+def _consultar_item(item, consultar):
+    """
+    Linhas de um item do lote pelo cache de consultas. Sem cache, `consultar()`
+    devolve (conta, DataFrame) e o resultado é guardado; uma execução da mesma
+    consulta já em andamento (de outro lote ou de uma consulta avulsa) é aguardada.
+
+    Retorna (nome da conta, DataFrame); a conta fica vazia quando o portal não foi consultado.
+    """
+    chave_consulta = query_cache.chave(item)
+
+    def executar():
+        em_cache = query_cache.obter(chave_consulta)
+        if em_cache:
+            return query_cache.resultado_em_cache(em_cache)
+        conta, df = consultar()
+        resultado = query_cache.guardar(chave_consulta, item, df=df)
+        return {"message": "Consulta executada com sucesso!", "conta": conta.nome, "linhas": len(resultado.linhas)}
+
+    retorno = query_cache.executar_uma_vez(chave_consulta, executar)
+    if "error" in retorno:
+        raise RuntimeError(retorno["error"])
+    resultado = QueryResult.objects.get(chave=chave_consulta)
+    return retorno.get("conta", ""), pd.DataFrame(resultado.linhas)
+
+
+def _executar_http(fila_http, fila, linhas, progresso, perfil):
+    """
+    Executa os itens com engine HTTP, sem navegador. Como em engines.executar,
+    um item que falha pelo HTTP vai para a fila do navegador.
+    """
+    from .portal_http import get_portal_client
+
+    agendador = accounts.get_agendador()
+    while True:
+        try:
+            indice, item = fila_http.get_nowait()
+        except queue.Empty:
+            return
+        inicio = time.perf_counter()
+        try:
+            conta, linhas[indice] = _consultar_item(item, lambda: agendador.executar(
+                lambda conta: get_portal_client(conta).consultar(
+                    item["date"], item["time"], item["ipv6"], item["licenca"], perfil
+                )
+            ))
+        except Exception as e:
+            logger.warning(f"Item {indice} do lote falhou pelo HTTP, usando o navegador: {e}")
+            fila.put((indice, item))
+            continue
+        progresso.registrar(indice, Job.CONCLUIDO, _tempo_ms(inicio), conta=conta)
+
+
+def _descartar_fila(fila, progresso, erro):
+    """
+    Registra como erro os itens que ainda estavam na fila.
+    """
+    while True:
+        try:
+            indice, _ = fila.get_nowait()
+        except queue.Empty:
+            return
+        progresso.registrar(indice, Job.ERRO, 0, erro)
+
+
+def _executar_parte(fila, linhas, progresso, perfil):
+    """
+    Executa itens da fila do lote em um navegador do pool com uma conta do
+    portal, reaproveitando a mesma sessão autenticada entre os itens. Se o
+    portal recusar a conta, ela entra em backoff, o item volta para a fila e a
+    parte segue com outra conta. Se o navegador falhar (sem Chromium, sem
+    navegador livre, página travada), os itens restantes ficam com erro e o
+    lote segue com o que já foi concluído.
+    """
+    agendador = accounts.get_agendador()
+    tentativas = {}
+
+    def consulta(context, conta):
+        page = context.new_page()
+        metrics.BROWSER_PAGINAS_ATIVAS.inc(origem="pool")
+
+        def consultar_na_pagina(item):
+            with agendador.consulta(conta):
+                session_store.garantir_sessao(page, conta, perfil)
+                return conta, portal.consultar(
+                    page, item["date"], item["time"], item["ipv6"], item["licenca"], perfil=perfil
+                )
+
+        try:
+            while True:
+                try:
+                    indice, item = fila.get_nowait()
+                except queue.Empty:
+                    return
+                inicio = time.perf_counter()
+                try:
+                    nome_conta, linhas[indice] = _consultar_item(item, lambda: consultar_na_pagina(item))
+                    progresso.registrar(indice, Job.CONCLUIDO, _tempo_ms(inicio), conta=nome_conta)
+                except accounts.ContaIndisponivel as e:
+                    tentativas[indice] = tentativas.get(indice, 0) + 1
+                    if tentativas[indice] < len(agendador.contas):
+                        fila.put((indice, item))
+                    else:
+                        progresso.registrar(indice, Job.ERRO, _tempo_ms(inicio), str(e), conta.nome)
+                    raise
+                except Exception as e:
+                    logger.error(f"Erro no item {indice} do lote: {e}")
+                    progresso.registrar(indice, Job.ERRO, _tempo_ms(inicio), str(e), conta.nome)
+                    # A página pode ter ficado em um estado inconsistente
+                    page.close()
+                    page = context.new_page()
+        finally:
+            page.close()
+            metrics.BROWSER_PAGINAS_ATIVAS.dec(origem="pool")
+
+    while not fila.empty():
+        try:
+            with agendador.reservar() as conta:
+                get_browser_pool().executar(lambda context: consulta(context, conta), conta, lote=True)
+        except accounts.ContaIndisponivel as e:
+            logger.warning(f"Parte do lote trocando de conta: {e}")
+        except Exception as e:
+            logger.error(f"Parte do lote interrompida pelo navegador: {e}")
+            _descartar_fila(fila, progresso, str(e))
+            return
+
+
+def _mesclar(itens, linhas, saved_path):
+    """
+    Junta as linhas de cada item em uma única planilha, no mesmo formato
+    (cabeçalho na segunda linha) da exportação original do portal.
+    """
+    frames = []
+    for indice, item in itens:
+        if indice not in linhas:
+            continue
+        df = linhas[indice].copy()
+        df.insert(0, "IPv6 Consultado", item["ipv6"])
+        df.insert(1, "Data Consultada", item["date"])
+        df.insert(2, "Hora Consultada", item["time"])
+        frames.append(df)
+
+    df_lote = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df_lote.to_excel(saved_path, index=False, startrow=1)
+    return saved_path
+
+
+def executar_lote(job_id, itens):
+    """
+    Tarefa do job "lote": executa várias consultas e gera uma planilha única.
+    Os itens já em cache não vão ao portal; os com engine HTTP são consultados
+    sem navegador; os demais são divididos entre até BATCH_PARALLELISM
+    navegadores do pool, cada um com a conta do portal escolhida pelo
+    agendador. Um navegador do pool fica sempre fora dos lotes, para as
+    consultas avulsas.
+    """
+    inicio = time.perf_counter()
+    perfil = TimingProfile()
+    itens = list(enumerate(itens))
+    progresso = ProgressoLote(job_id, len(itens))
+
+    linhas = {}
+    fila_http = queue.Queue()
+    fila = queue.Queue()
+    for indice, item in itens:
+        em_cache = query_cache.obter(query_cache.chave(item))
+        if em_cache:
+            linhas[indice] = pd.DataFrame(em_cache.linhas)
+            progresso.registrar(indice, Job.CONCLUIDO, 0)
+        elif (item.get("engine") or settings.PORTAL_ENGINE) == engines.HTTP:
+            fila_http.put((indice, item))
+        else:
+            fila.put((indice, item))
+
+    paralelismo = max(1, min(int(os.getenv("BATCH_PARALLELISM", "2")), len(itens)))
+    if not fila_http.empty():
+        with ThreadPoolExecutor(max_workers=paralelismo) as executor:
+            for parte in [
+                executor.submit(_executar_http, fila_http, fila, linhas, progresso, perfil) for _ in range(paralelismo)
+            ]:
+                parte.result()
+
+    if not fila.empty():
+        # Só os itens do navegador precisam do pool (e do Chromium)
+        paralelismo = min(paralelismo, fila.qsize(), get_browser_pool().vagas_lote)
+        with ThreadPoolExecutor(max_workers=paralelismo) as executor:
+            for parte in [
+                executor.submit(_executar_parte, fila, linhas, progresso, perfil) for _ in range(paralelismo)
+            ]:
+                parte.result()
+
+    if not linhas:
+        return {"error": "Nenhuma consulta do lote foi concluída"}
+
+    artefato = artifacts.armazenar(
+        _mesclar(itens, linhas, artifacts.novo_temporario()),
+        ResultArtifact.EXPORTACAO,
+        job=Job.objects.get(id=job_id),
+    )
+
+    minutos = (time.perf_counter() - inicio) / 60
+    logger.info(f"Lote {job_id}: {len(linhas)}/{len(itens)} consultas em {minutos * 60:.1f} s")
+    return {
+        "message": "Lote executado com sucesso!",
+        "file": artefato.caminho,
+        "result_id": str(artefato.id),
+        "total": len(itens),
+        "concluidos": len(linhas),
+        "consultas_por_minuto": round(len(linhas) / minutos, 2) if minutos else None,
+        "por_conta": progresso.por_conta(),
+        "timing": perfil.as_dict(),
+    }
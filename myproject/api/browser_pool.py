@@ -0,0 +1,263 @@
+import os
+import queue
+import atexit
+import logging
+import threading
+from concurrent.futures import Future
+
+from playwright.sync_api import Error as PlaywrightError, TimeoutError as PlaywrightTimeoutError, sync_playwright
+
+from . import accounts, metrics, page_profile, session_store
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_mb(pid):
+    """
+    Lê o RSS (em MB) de um processo a partir de /proc. Retorna 0 fora do Linux.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for linha in status:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def _navegador_caiu(erro):
+    """
+    Erro do Playwright de navegador ou contexto encerrado (crash), e não de
+    uma página ou formulário, como o timeout de uma licença inexistente.
+    """
+    return (
+        isinstance(erro, PlaywrightError)
+        and not isinstance(erro, PlaywrightTimeoutError)
+        and "has been closed" in str(erro)
+    )
+
+
+class BrowserSlot:
+    """
+    Um Chromium já iniciado com um contexto autenticado no portal para cada
+    conta. O da conta padrão (a primeira do agendador) é criado a cada início
+    do navegador; os das demais, no primeiro uso da conta no slot.
+
+    A API síncrona do Playwright só pode ser usada na thread que a criou,
+    por isso cada slot possui uma thread dedicada que executa as tarefas
+    recebidas pela fila.
+    """
+
+    def __init__(self, nome, max_usos, max_memoria_mb):
+        self.nome = nome
+        self.max_usos = max_usos
+        self.max_memoria_mb = max_memoria_mb
+        self.usos = 0
+        self._tarefas = queue.Queue()
+        self._playwright = None
+        self._browser = None
+        self._contextos = {}
+        self._thread = threading.Thread(target=self._loop, name=nome, daemon=True)
+        self._thread.start()
+
+    def executar(self, funcao, conta, timeout=None):
+        """
+        Executa `funcao(context)` na thread do slot, com o contexto da conta, e devolve o resultado.
+        """
+        futuro = Future()
+        self._tarefas.put((funcao, conta, futuro))
+        return futuro.result(timeout=timeout)
+
+    def fechar(self):
+        self._tarefas.put(None)
+        self._thread.join(timeout=30)
+
+    def _loop(self):
+        self._playwright = sync_playwright().start()
+        try:
+            self._iniciar()
+        except Exception as e:
+            logger.error(f"[{self.nome}] Falha ao iniciar o navegador: {e}")
+
+        while True:
+            tarefa = self._tarefas.get()
+            if tarefa is None:
+                break
+            funcao, conta, futuro = tarefa
+            if not futuro.set_running_or_notify_cancel():
+                continue
+
+            falhou = False
+            try:
+                if not self._saudavel():
+                    logger.warning(f"[{self.nome}] Navegador não saudável, reiniciando")
+                    self._reiniciar()
+                futuro.set_result(funcao(self._contexto(conta)))
+            except accounts.ContaIndisponivel as e:
+                # Problema da conta, não do navegador: não há por que reiniciá-lo
+                futuro.set_exception(e)
+            except Exception as e:
+                # A página já foi fechada por quem a abriu: o navegador só é
+                # reiniciado se ele próprio caiu
+                falhou = not self._saudavel() or _navegador_caiu(e)
+                futuro.set_exception(e)
+
+            self.usos += 1
+            try:
+                if falhou or self._precisa_reciclar():
+                    self._reiniciar()
+            except Exception as e:
+                # A próxima tarefa tenta reiniciar de novo pela verificação de saúde
+                logger.error(f"[{self.nome}] Falha ao reiniciar o navegador: {e}")
+
+        self._encerrar()
+        self._playwright.stop()
+
+    def _iniciar(self):
+        self._browser = self._playwright.chromium.launch(**page_profile.launch_options())
+        metrics.BROWSER_LAUNCHES.inc(origem="pool")
+        self.usos = 0
+        logger.info(f"[{self.nome}] Navegador iniciado")
+        try:
+            # Já autenticado na conta padrão: a primeira consulta não paga o login
+            self._contexto(accounts.get_agendador().contas[0])
+        except Exception as e:
+            logger.warning(f"[{self.nome}] Falha ao autenticar a conta padrão: {e}")
+
+    def _contexto(self, conta):
+        """
+        Contexto do navegador com a sessão da conta, autenticado na criação.
+        """
+        if conta.nome not in self._contextos:
+            context = self._browser.new_context(
+                storage_state=session_store.storage_state(conta), **page_profile.context_options()
+            )
+            page_profile.politica_recursos().aplicar(context)
+            self._contextos[conta.nome] = context
+            page = context.new_page()
+            try:
+                session_store.garantir_sessao(page, conta)
+            except Exception:
+                # Sem sessão o contexto não serve: a próxima tarefa da conta cria outro
+                del self._contextos[conta.nome]
+                context.close()
+                raise
+            page.close()
+            logger.info(f"[{self.nome}] Contexto da conta '{conta.nome}' autenticado")
+        return self._contextos[conta.nome]
+
+    def _encerrar(self):
+        for recurso in (*self._contextos.values(), self._browser):
+            if recurso is None:
+                continue
+            try:
+                recurso.close()
+            except Exception as e:
+                logger.warning(f"[{self.nome}] Erro ao fechar o navegador: {e}")
+        self._contextos = {}
+        self._browser = None
+
+    def _reiniciar(self):
+        self._encerrar()
+        self._iniciar()
+
+    def _saudavel(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    def _memoria_mb(self):
+        """
+        Soma o RSS de todos os processos do Chromium deste slot.
+        """
+        try:
+            cdp = self._browser.new_browser_cdp_session()
+            try:
+                info = cdp.send("SystemInfo.getProcessInfo")
+            finally:
+                cdp.detach()
+        except Exception as e:
+            logger.warning(f"[{self.nome}] Não foi possível medir a memória: {e}")
+            return 0
+        return sum(_rss_mb(processo["id"]) for processo in info.get("processInfo", []))
+
+    def _precisa_reciclar(self):
+        if self.usos >= self.max_usos:
+            logger.info(f"[{self.nome}] Reciclando após {self.usos} usos")
+            return True
+        if self.max_memoria_mb:
+            memoria = self._memoria_mb()
+            if memoria > self.max_memoria_mb:
+                logger.info(f"[{self.nome}] Reciclando por memória ({memoria:.0f} MB)")
+                return True
+        return False
+
+
+class BrowserPool:
+    """
+    Pool de navegadores pré-iniciados e autenticados, reaproveitados entre requisições.
+    """
+
+    def __init__(self, tamanho, max_usos, max_memoria_mb, checkout_timeout):
+        self.checkout_timeout = checkout_timeout
+        self._livres = queue.Queue()
+        self._slots = [
+            BrowserSlot(f"browser-{i}", max_usos, max_memoria_mb) for i in range(tamanho)
+        ]
+        for slot in self._slots:
+            self._livres.put(slot)
+        # Os lotes, somados, usam no máximo tamanho - 1 navegadores: sobra um para as consultas avulsas
+        self.vagas_lote = max(1, tamanho - 1)
+        self._vagas_lote = threading.BoundedSemaphore(self.vagas_lote)
+        self._fechado = False
+
+    def executar(self, funcao, conta, lote=False):
+        """
+        Reserva um navegador livre, executa `funcao(context)` nele com o contexto
+        da conta e o devolve ao pool. Com `lote`, antes espera uma das
+        `vagas_lote`, sem limite de tempo (o lote é um job em segundo plano).
+        """
+        if self._fechado:
+            raise RuntimeError("Pool de navegadores encerrado")
+        if lote:
+            self._vagas_lote.acquire()
+        try:
+            try:
+                slot = self._livres.get(timeout=self.checkout_timeout)
+            except queue.Empty:
+                raise TimeoutError("Nenhum navegador livre no pool")
+            try:
+                return slot.executar(funcao, conta)
+            finally:
+                self._livres.put(slot)
+        finally:
+            if lote:
+                self._vagas_lote.release()
+
+    def fechar(self):
+        if self._fechado:
+            return
+        self._fechado = True
+        for slot in self._slots:
+            slot.fechar()
+        logger.info("Pool de navegadores encerrado")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """
+    Retorna o pool do processo, criando-o na primeira chamada.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(
+                tamanho=int(os.getenv("BROWSER_POOL_SIZE", "2")),
+                max_usos=int(os.getenv("BROWSER_POOL_MAX_USES", "50")),
+                max_memoria_mb=int(os.getenv("BROWSER_POOL_MAX_MEMORY_MB", "1024")),
+                checkout_timeout=float(os.getenv("BROWSER_POOL_CHECKOUT_TIMEOUT", "120")),
+            )
+            atexit.register(_pool.fechar)
+        return _pool
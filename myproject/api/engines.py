@@ -0,0 +1,109 @@
+import logging
+
+from django.conf import settings
+
+from . import accounts, metrics, page_profile, portal, session_store
+from .result_parser import salvar_como_exportacao
+from .timing import TimingProfile
+
+logger = logging.getLogger(__name__)
+
+BROWSER = "browser"
+HTTP = "http"
+ENGINES = (BROWSER, HTTP)
+
+
+def run_playwright_script(date: str, time: str, ipv6: str, licenca: str, saved_path: str = None):
+    """
+    Executa a consulta no portal usando um navegador do pool, com a conta
+    escolhida pelo agendador. Sem `saved_path`, as linhas vêm da resposta
+    interceptada e são retornadas em "dados".
+    """
+    # O Playwright só é importado quando o engine browser é usado pela primeira vez
+    from .browser_pool import get_browser_pool
+
+    perfil = TimingProfile()
+    rede = page_profile.MedidorRede()
+    agendador = accounts.get_agendador()
+
+    def consulta(context, conta):
+        page = context.new_page()
+        rede.observar(page)
+        try:
+            with metrics.BROWSER_PAGINAS_ATIVAS.em_uso(origem="pool"):
+                session_store.garantir_sessao(page, conta, perfil)
+                return portal.consultar(page, date, time, ipv6, licenca, saved_path, perfil)
+        finally:
+            page.close()
+
+    try:
+        conta, resultado = agendador.executar(
+            lambda conta: get_browser_pool().executar(lambda context: consulta(context, conta), conta)
+        )
+        retorno = {
+            "message": "Consulta executada com sucesso!", "conta": conta.nome,
+            "timing": perfil.as_dict(), "rede": rede.as_dict(),
+        }
+        if saved_path:
+            logger.info("Arquivo Excel salvo com sucesso!")
+            retorno["file"] = resultado
+        else:
+            logger.info(f"Consulta interpretada na página com {len(resultado)} linha(s)")
+            retorno["dados"] = resultado
+        logger.info(f"Tempos da consulta: {perfil.as_dict()}")
+        logger.info(f"Rede da consulta: {rede.as_dict()}")
+        return retorno
+
+    except Exception as e:
+        logger.error(f"Erro ao executar o script Playwright: {str(e)}")
+        return {"error": "Erro ao executar o script Playwright"}
+
+
+def run_http_script(date: str, time: str, ipv6: str, licenca: str, saved_path: str = None):
+    """
+    Executa a consulta diretamente no endpoint do portal, sem navegador.
+    O xlsx só é gerado quando `saved_path` é informado.
+    """
+    from .portal_http import get_portal_client
+
+    perfil = TimingProfile()
+    agendador = accounts.get_agendador()
+    try:
+        conta, df = agendador.executar(
+            lambda conta: get_portal_client(conta).consultar(date, time, ipv6, licenca, perfil)
+        )
+        retorno = {"message": "Consulta executada com sucesso!", "conta": conta.nome, "dados": df}
+        if saved_path:
+            with perfil.etapa("exportar"):
+                retorno["file"] = salvar_como_exportacao(df, saved_path)
+        logger.info(f"Consulta HTTP concluída com {len(df)} linha(s)")
+        logger.info(f"Tempos da consulta: {perfil.as_dict()}")
+        retorno["timing"] = perfil.as_dict()
+        return retorno
+
+    except Exception as e:
+        logger.error(f"Erro ao executar a consulta HTTP: {str(e)}")
+        return {"error": "Erro ao executar a consulta HTTP"}
+
+
+def executar(date: str, time: str, ipv6: str, licenca: str, saved_path: str = None, engine: str = None):
+    """
+    Executa a consulta com o engine escolhido (padrão: settings.PORTAL_ENGINE).
+    Se o engine HTTP falhar, a consulta é refeita pelo navegador. Em ambos,
+    uma conta limitada ou deslogada pelo portal entra em backoff e a consulta
+    é refeita com outra conta.
+
+    Com `saved_path` o retorno traz a exportação em "file"; as linhas já
+    interpretadas, quando disponíveis, vêm em "dados" (DataFrame).
+    """
+    engine = engine or settings.PORTAL_ENGINE
+    if engine == HTTP:
+        retorno = run_http_script(date, time, ipv6, licenca, saved_path)
+        if "error" not in retorno:
+            retorno["engine"] = HTTP
+            return retorno
+        logger.warning("Engine HTTP falhou, usando o navegador")
+
+    retorno = run_playwright_script(date, time, ipv6, licenca, saved_path)
+    retorno["engine"] = BROWSER
+    return retorno
@@ -0,0 +1,323 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metrics
+from .enrichment_cache import DESCONHECIDO, get_subscriber_cache
+
+logger = logging.getLogger(__name__)
+
+CONEXOES_QUERY = """
+query MyQuery($usernames: [String!]) {
+    mk01 {
+        mk_conexoes(where: {username: {_in: $usernames}}) {
+            username
+            mk_pessoa {
+                codpessoa
+                nome_razaosocial
+                cpf
+                email
+                fone01
+                fone02
+                cd_revenda
+                cep
+                numero
+                complementoendereco
+            }
+            mk_logradouros {
+                logradouro
+                mk_bairros {
+                    bairro
+                    mk_cidades {
+                        cidade
+                        mk_estado {
+                            siglaestado
+                        }
+                    }
+                }
+            }
+        }
+    }
+}
+"""
+
+# Campos da conexão (já achatados) e as colunas correspondentes no relatório
+COLUNAS_ASSINANTE = {
+    'username': 'Usuário',
+    'mk_pessoa.nome_razaosocial': 'Nome',
+    'mk_pessoa.cpf': 'CPF',
+    'mk_pessoa.email': 'Email',
+    'mk_pessoa.fone01': 'Telefone 1',
+    'mk_pessoa.fone02': 'Telefone 2',
+    'mk_pessoa.cep': 'CEP',
+    'mk_pessoa.numero': 'Número',
+    'mk_pessoa.complementoendereco': 'Complemento',
+    'mk_logradouros.logradouro': 'Logradouro',
+    'mk_logradouros.mk_bairros.bairro': 'Bairro',
+    'mk_logradouros.mk_bairros.mk_cidades.cidade': 'Cidade',
+    'mk_logradouros.mk_bairros.mk_cidades.mk_estado.siglaestado': 'Estado',
+}
+
+# Colunas adicionadas ao relatório com os dados do assinante
+NOVAS_COLUNAS = list(COLUNAS_ASSINANTE.values())[1:]
+
+
+class TokenBucket:
+    """
+    Limitador de taxa: libera até `taxa` requisições por segundo, com rajadas de até `capacidade`.
+    """
+
+    def __init__(self, taxa, capacidade=None):
+        self.taxa = taxa
+        self.capacidade = capacidade or max(1, int(taxa))
+        self._tokens = self.capacidade
+        self._atualizado_em = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        if not self.taxa:
+            return
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._atualizado_em) * self.taxa)
+                self._atualizado_em = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+
+class EnrichmentClient:
+    """
+    Cliente da API GraphQL com sessão keep-alive compartilhada, timeout,
+    retentativas com backoff exponencial (5xx/429) e limite de taxa.
+    """
+
+    def __init__(self, url, token, timeout=30, max_retries=3, concorrencia=4, taxa=10, rajada=None):
+        self.url = url
+        self.timeout = timeout
+        self.concorrencia = concorrencia
+        self.rate_limiter = TokenBucket(taxa, rajada)
+
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=None,  # A consulta GraphQL é idempotente, então o POST pode ser repetido
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concorrencia, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {token}',  # Se precisar de autenticação
+        })
+
+    def buscar(self, usernames):
+        """
+        Faz uma única requisição GraphQL para buscar as conexões de vários usuários.
+
+        :return: lista de conexões retornadas pela API, ou None em caso de falha
+        """
+        # A variável é [String!]: logins numéricos também vão como texto
+        data = {'query': CONEXOES_QUERY, 'variables': {'usernames': [str(username) for username in usernames]}}
+        self.rate_limiter.adquirir()
+        try:
+            with metrics.medir(metrics.ENRIQUECIMENTO_SEGUNDOS):
+                response = self.session.post(self.url, json=data, timeout=self.timeout)
+        except requests.RequestException as e:
+            metrics.ENRIQUECIMENTO_REQUISICOES.inc(status="erro")
+            logger.error(f"Falha na requisição para {len(usernames)} usuário(s): {e}")
+            return None
+        metrics.ENRIQUECIMENTO_REQUISICOES.inc(status=str(response.status_code))
+
+        if response.status_code == 200:
+            return response.json().get('data', {}).get('mk01', {}).get('mk_conexoes', [])
+        else:
+            logger.error(f"Falha na requisição para {len(usernames)} usuário(s). Status code: {response.status_code}")
+            logger.error(f"Erro: {response.text}")
+            return None
+
+    def buscar_em_lotes(self, lotes):
+        """
+        Executa os lotes em paralelo, limitado a `concorrencia` requisições
+        simultâneas, e devolve (lote, resultado) assim que cada um termina, sem
+        esperar os anteriores: um lote lento não segura os já concluídos.
+        """
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            futuros = {executor.submit(self.buscar, lote): lote for lote in lotes}
+            for futuro in as_completed(futuros):
+                yield futuros[futuro], futuro.result()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_enrichment_client():
+    """
+    Retorna o cliente do processo, criando-o na primeira chamada.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = EnrichmentClient(
+                url=os.getenv("API_URL"),
+                token=os.getenv("API_AUTH_TOKEN"),
+                timeout=float(os.getenv("ENRICHMENT_TIMEOUT", "30")),
+                max_retries=int(os.getenv("ENRICHMENT_MAX_RETRIES", "3")),
+                concorrencia=int(os.getenv("ENRICHMENT_CONCURRENCY", "4")),
+                taxa=float(os.getenv("ENRICHMENT_RATE_LIMIT", "10")),
+            )
+        return _client
+
+
+def fetch_data_batch(usernames):
+    """
+    Busca as conexões de vários usuários em uma única requisição.
+    """
+    return get_enrichment_client().buscar(usernames)
+
+
+def fetch_data(username):
+    """
+    Busca os dados de um usuário específico.
+    """
+    return fetch_data_batch([username])
+
+
+def fetch_conexoes(usernames, batch_size=None):
+    """
+    Resolve os usuários únicos e retorna um dict username -> conexão. Usuários em
+    cache não são consultados; os demais são buscados em lotes concorrentes, e
+    cada lote vai para o cache assim que volta: se o processo cair no meio, os
+    lotes concluídos não são buscados de novo, desde que ainda estejam no cache
+    (ENRICHMENT_CACHE_TTL; ver get_subscriber_cache).
+    """
+    batch_size = batch_size or int(os.getenv("ENRICHMENT_BATCH_SIZE", "500"))
+    usernames = list(usernames)
+    cache = get_subscriber_cache()
+
+    conexoes = {}
+    faltantes = []
+    em_cache = cache.obter_muitos(usernames)
+    for username in usernames:
+        if username not in em_cache:
+            faltantes.append(username)
+        elif em_cache[username] is not DESCONHECIDO:
+            conexoes[username] = em_cache[username]
+
+    lotes = [faltantes[inicio:inicio + batch_size] for inicio in range(0, len(faltantes), batch_size)]
+    for lote, resultado in get_enrichment_client().buscar_em_lotes(lotes):
+        if resultado is None:
+            logger.warning(f"Nenhum dado retornado da API para {len(lote)} usuário(s)")
+            continue
+        novas = {}
+        for connection_info in resultado:
+            # Mantém a primeira conexão encontrada para cada usuário
+            novas.setdefault(connection_info.get('username'), connection_info)
+        conexoes.update(novas)
+        cache.guardar_muitos(novas, desconhecidos=[username for username in lote if username not in novas])
+
+    logger.info(f"Cache de assinantes: {cache.estatisticas()}")
+    return conexoes
+
+
+def _frame_assinantes(conexoes):
+    """
+    Achata as conexões aninhadas (pessoa, logradouro, bairro, cidade, estado)
+    em um DataFrame colunar, com uma linha por usuário.
+    """
+    df = pd.json_normalize(list(conexoes.values()))
+    df = df.reindex(columns=list(COLUNAS_ASSINANTE)).rename(columns=COLUNAS_ASSINANTE)
+    # Texto em vez de object/float para preservar zeros à esquerda de CPF, CEP e telefones
+    return df.astype("string")
+
+
+def registrar_custo(df, duracao):
+    """
+    Registra o tempo e a memória do enriquecimento, normalizados por 10 mil linhas.
+    """
+    metrics.registrar_relatorio(len(df), duracao)
+    linhas = max(len(df), 1)
+    memoria_mb = df.memory_usage(deep=True).sum() / 1024 / 1024
+    logger.info(
+        f"Enriquecimento de {len(df)} linha(s): {duracao / linhas * 10000:.2f} s e "
+        f"{memoria_mb / linhas * 10000:.1f} MB por 10 mil linhas"
+    )
+
+
+def _usuarios_como_texto(usuarios):
+    """
+    Coluna de usuários como texto. Logins numéricos são lidos da planilha como
+    int (ou float, se houver células vazias), e a API e o merge usam texto.
+    """
+    if pd.api.types.is_float_dtype(usuarios) and (usuarios.dropna() % 1 == 0).all():
+        usuarios = usuarios.astype("Int64")
+    return usuarios.astype("string")
+
+
+def enriquecer(df_original):
+    """
+    Adiciona ao DataFrame as colunas com os dados de assinante de cada usuário.
+    """
+    df_original = df_original.assign(**{'Usuário': _usuarios_como_texto(df_original['Usuário'])})
+    # Cada usuário é consultado uma única vez, mesmo que apareça em várias linhas
+    usernames = df_original['Usuário'].dropna().unique()
+    logger.info(f"{len(df_original)} linha(s) com {len(usernames)} usuário(s) distinto(s)")
+    conexoes = fetch_conexoes(usernames)
+
+    nao_encontrados = len(usernames) - len(conexoes)
+    if nao_encontrados:
+        logger.warning(f"{nao_encontrados} usuário(s) não encontrado(s) na resposta da API")
+
+    # Juntar os dados dos assinantes ao DataFrame original em uma única operação
+    df_assinantes = _frame_assinantes(conexoes)
+    df_original = df_original.drop(columns=NOVAS_COLUNAS, errors='ignore').merge(df_assinantes, on='Usuário', how='left')
+    df_original[NOVAS_COLUNAS] = df_original[NOVAS_COLUNAS].fillna('')
+    return df_original
+
+
+def process_excel_file(file_path, output_file_path=None):
+    """
+    Processa o arquivo Excel gerado pela automação, busca os dados de cada usuário e salva o resultado em outro arquivo Excel.
+
+    :param file_path: Caminho para o arquivo Excel gerado
+    :param output_file_path: Caminho do arquivo processado (padrão: `<arquivo>_processed.xlsx`)
+    """
+    # Carregar o arquivo Excel com os dados originais
+    logger.info(f"Carregando o arquivo Excel: {file_path}")
+    df_original = pd.read_excel(file_path, header=1)
+    return process_dataframe(df_original, output_file_path or file_path.replace('.xlsx', '_processed.xlsx'))
+
+
+def process_dataframe(df_original, output_file_path):
+    """
+    Enriquece as linhas de uma consulta já em memória e salva o resultado em Excel.
+    """
+    inicio = time.perf_counter()
+    df_original = enriquecer(df_original)
+    logger.info(f"Colunas após processamento: {df_original.columns.tolist()}")
+    registrar_custo(df_original, time.perf_counter() - inicio)
+
+    # Salvar o arquivo
+    try:
+        df_original.to_excel(output_file_path, index=False)
+        logger.info(f"Arquivo Excel processado salvo em: {output_file_path}")
+    except Exception as e:
+        logger.error(f"Erro ao salvar o arquivo: {e}")
+        raise
+
+    return output_file_path
@@ -0,0 +1,141 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import metrics
+from .models import SubscriberProfile
+
+logger = logging.getLogger(__name__)
+
+# Marcador para usuários que a API não conhece (cache negativo)
+DESCONHECIDO = object()
+
+# Limite de parâmetros por consulta ao SQLite
+_LOTE_BANCO = 500
+
+# Abaixo deste TTL (s), um enriquecimento interrompido pode não encontrar no
+# cache os lotes já buscados e refaz tudo
+TTL_MINIMO_RETOMADA = 3600
+
+
+class SubscriberCache:
+    """
+    Cache de perfis de assinante em dois níveis: LRU em memória e tabela
+    SubscriberProfile no SQLite, ambos com expiração por entrada. É também o
+    que permite retomar um enriquecimento interrompido (ver fetch_conexoes).
+    """
+
+    def __init__(self, max_itens, ttl, ttl_negativo):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.contadores = {"hits_memoria": 0, "hits_banco": 0, "misses": 0, "negativos": 0}
+
+    def _guardar_memoria(self, username, dados, expira_em):
+        self._memoria[username] = (dados, expira_em)
+        self._memoria.move_to_end(username)
+        while len(self._memoria) > self.max_itens:
+            self._memoria.popitem(last=False)
+
+    def obter_muitos(self, usernames):
+        """
+        Retorna um dict username -> conexão (ou DESCONHECIDO) com as entradas válidas
+        em cache; os usuários ausentes do dict precisam ser buscados na API.
+        """
+        agora = timezone.now()
+        encontrados = {}
+        faltantes = []
+
+        with self._lock:
+            for username in usernames:
+                entrada = self._memoria.get(username)
+                if entrada and entrada[1] > agora:
+                    self._memoria.move_to_end(username)
+                    encontrados[username] = entrada[0]
+                    self.contadores["hits_memoria"] += 1
+                else:
+                    faltantes.append(username)
+
+        for inicio in range(0, len(faltantes), _LOTE_BANCO):
+            perfis = SubscriberProfile.objects.filter(
+                username__in=faltantes[inicio:inicio + _LOTE_BANCO], expira_em__gt=agora
+            ).values_list("username", "dados", "expira_em")
+            with self._lock:
+                for username, dados, expira_em in perfis:
+                    dados = DESCONHECIDO if dados is None else dados
+                    encontrados[username] = dados
+                    self._guardar_memoria(username, dados, expira_em)
+                    self.contadores["hits_banco"] += 1
+
+        metrics.CACHE_REQUISICOES.inc(len(encontrados), cache="assinantes", resultado="hit")
+        metrics.CACHE_REQUISICOES.inc(len(usernames) - len(encontrados), cache="assinantes", resultado="miss")
+        with self._lock:
+            self.contadores["misses"] += len(usernames) - len(encontrados)
+            self.contadores["negativos"] += sum(1 for dados in encontrados.values() if dados is DESCONHECIDO)
+        return encontrados
+
+    def guardar_muitos(self, conexoes, desconhecidos=()):
+        """
+        Grava as conexões encontradas e os usuários desconhecidos nos dois níveis.
+        """
+        agora = timezone.now()
+        expira_em = agora + timedelta(seconds=self.ttl)
+        expira_negativo = agora + timedelta(seconds=self.ttl_negativo)
+
+        perfis = [SubscriberProfile(username=u, dados=d, expira_em=expira_em) for u, d in conexoes.items()]
+        perfis += [SubscriberProfile(username=u, dados=None, expira_em=expira_negativo) for u in desconhecidos]
+        if not perfis:
+            return
+
+        SubscriberProfile.objects.bulk_create(
+            perfis,
+            batch_size=_LOTE_BANCO,
+            update_conflicts=True,
+            unique_fields=["username"],
+            update_fields=["dados", "expira_em", "atualizado_em"],
+        )
+        with self._lock:
+            for username, dados in conexoes.items():
+                self._guardar_memoria(username, dados, expira_em)
+            for username in desconhecidos:
+                self._guardar_memoria(username, DESCONHECIDO, expira_negativo)
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.contadores["hits_memoria"] + self.contadores["hits_banco"] + self.contadores["misses"]
+            hits = consultas - self.contadores["misses"]
+            return {
+                **self.contadores,
+                "itens_memoria": len(self._memoria),
+                "taxa_acerto": round(hits / consultas, 3) if consultas else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_subscriber_cache():
+    """
+    Retorna o cache do processo, criando-o na primeira chamada.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SubscriberCache(
+                max_itens=int(os.getenv("ENRICHMENT_CACHE_SIZE", "50000")),
+                ttl=int(os.getenv("ENRICHMENT_CACHE_TTL", "86400")),
+                ttl_negativo=int(os.getenv("ENRICHMENT_CACHE_NEGATIVE_TTL", "3600")),
+            )
+            if _cache.ttl < TTL_MINIMO_RETOMADA:
+                logger.warning(
+                    f"ENRICHMENT_CACHE_TTL de {_cache.ttl}s: enriquecimentos interrompidos "
+                    f"não retomam os lotes já buscados (use ao menos {TTL_MINIMO_RETOMADA}s)"
+                )
+        return _cache
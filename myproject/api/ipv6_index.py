@@ -0,0 +1,136 @@
+import time
+import logging
+import ipaddress
+from array import array
+from bisect import bisect_right
+
+logger = logging.getLogger(__name__)
+
+
+class IndicePrefixos:
+    """
+    Índice em memória de sessões por prefixo IPv6 e horário: dado um endereço e
+    um instante, encontra a sessão dona em O(log n).
+
+    Os prefixos delegados (CIDR) são intervalos de inteiros de 128 bits que nunca
+    se cruzam: ou são disjuntos ou um contém o outro. Ordenados pelo início (e,
+    no empate, do maior para o menor), o prefixo mais específico que pode conter
+    o endereço é achado com bisect, e os demais candidatos são os seus
+    ancestrais, guardados em `_pais`. Dentro de cada prefixo as sessões ficam
+    ordenadas pelo início, e o horário também é resolvido com bisect; o maior
+    fim acumulado (`_fins_max`) diz se alguma sessão anterior ainda estava ativa.
+
+    Uso: `adicionar` para cada sessão, `construir` uma vez e então `localizar`.
+    """
+
+    def __init__(self, janela_sem_fim=None):
+        if janela_sem_fim is None:
+            from . import sessions
+            janela_sem_fim = sessions.janela_sem_fim()
+        self.janela_sem_fim = janela_sem_fim.total_seconds()
+        self._pendentes = []
+        self._los = []
+        self._his = []
+        self._pais = array("q")
+        # Sessões do prefixo k: posições _faixas[k] até _faixas[k + 1] dos arrays abaixo
+        self._faixas = array("q")
+        self._inicios = array("d")
+        self._fins = array("d")
+        self._fins_max = array("d")
+        self._valores = []
+
+    def __len__(self):
+        return len(self._valores)
+
+    def adicionar(self, menor, maior, inicio, fim=None, valor=None):
+        """
+        Registra uma sessão: intervalo IPv6 (inteiros), início e fim (datetime
+        ou timestamp; sem fim vale a janela) e o valor devolvido na busca.
+        """
+        inicio = _timestamp(inicio)
+        fim = _timestamp(fim) if fim is not None else inicio + self.janela_sem_fim
+        self._pendentes.append((menor, -maior, inicio, fim, valor))
+
+    def construir(self):
+        """
+        Ordena as sessões registradas e monta os arrays do índice.
+        """
+        registros = self._pendentes
+        registros.extend(
+            (lo, -hi, self._inicios[i], self._fins[i], self._valores[i])
+            for k, (lo, hi) in enumerate(zip(self._los, self._his))
+            for i in range(self._faixas[k], self._faixas[k + 1])
+        )
+        registros.sort(key=lambda registro: registro[:3])
+        self._pendentes = []
+
+        self._los, self._his, self._valores = [], [], []
+        self._pais, self._faixas = array("q"), array("q")
+        self._inicios, self._fins, self._fins_max = array("d"), array("d"), array("d")
+        abertos = []
+        for menor, maior_negativo, inicio, fim, valor in registros:
+            maior = -maior_negativo
+            if not self._los or (self._los[-1], self._his[-1]) != (menor, maior):
+                # Novo prefixo: o pai é o prefixo aberto mais interno que ainda o contém
+                while abertos and self._his[abertos[-1]] < menor:
+                    abertos.pop()
+                self._pais.append(abertos[-1] if abertos else -1)
+                abertos.append(len(self._los))
+                self._los.append(menor)
+                self._his.append(maior)
+                self._faixas.append(len(self._valores))
+                fim_max = fim
+            else:
+                fim_max = max(fim_max, fim)
+            self._inicios.append(inicio)
+            self._fins.append(fim)
+            self._fins_max.append(fim_max)
+            self._valores.append(valor)
+        self._faixas.append(len(self._valores))
+        return self
+
+    def localizar(self, endereco, instante):
+        """
+        Valor da sessão do prefixo mais específico que contém `endereco`
+        (texto ou inteiro) e estava ativa em `instante`, ou None.
+        """
+        if isinstance(endereco, str):
+            endereco = int(ipaddress.IPv6Address(endereco.strip()))
+        instante = _timestamp(instante)
+
+        k = bisect_right(self._los, endereco) - 1
+        while k >= 0:
+            if self._his[k] >= endereco:
+                # Sessão mais recente do prefixo iniciada até o instante e ainda ativa
+                primeira = self._faixas[k]
+                i = bisect_right(self._inicios, instante, primeira, self._faixas[k + 1]) - 1
+                while i >= primeira and self._fins_max[i] >= instante:
+                    if self._fins[i] >= instante:
+                        return self._valores[i]
+                    i -= 1
+            k = self._pais[k]
+        return None
+
+    @classmethod
+    def do_banco(cls, sessoes=None, tamanho_lote=5000):
+        """
+        Monta o índice a partir das SyslogSession guardadas (valor = id da sessão).
+        """
+        from .models import SyslogSession
+
+        inicio = time.perf_counter()
+        indice = cls()
+        sessoes = SyslogSession.objects.all() if sessoes is None else sessoes
+        for id_, menor, maior, inicio_sessao, fim in (
+            sessoes.filter(inicio__isnull=False)
+            .values_list("id", "ipv6_inicio", "ipv6_fim", "inicio", "fim")
+            .iterator(chunk_size=tamanho_lote)
+        ):
+            indice.adicionar(int(menor, 16), int(maior, 16), inicio_sessao, fim, id_)
+        indice.construir()
+        logger.info(f"Índice IPv6 montado com {len(indice)} sessão(ões) em {time.perf_counter() - inicio:.2f}s")
+        return indice
+
+
+def _timestamp(valor):
+    return valor if isinstance(valor, (int, float)) else valor.timestamp()
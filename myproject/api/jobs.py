@@ -0,0 +1,166 @@
+import os
+import time
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Função executada para cada tipo de job; recebe os parâmetros do job e retorna um dict
+TAREFAS = {
+    "consulta": "api.views.executar_consulta",
+    "lote": "api.batch.executar_lote",
+}
+
+# Intervalo (s) entre as varreduras de jobs travados feitas pelos workers
+INTERVALO_VARREDURA = 60
+
+_novo_job = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_proxima_varredura = 0.0
+
+
+def enfileirar(tipo, parametros, chave=""):
+    """
+    Registra o job no banco e acorda os workers locais.
+    """
+    job = Job.objects.create(tipo=tipo, parametros=parametros, chave=chave)
+    iniciar_workers()
+    _novo_job.set()
+    logger.info(f"Job {job.id} ({tipo}) enfileirado")
+    return job
+
+
+def _reservar_proximo():
+    """
+    Reserva o job pendente mais antigo. O UPDATE condicional garante que dois
+    workers (mesmo em processos diferentes) não peguem o mesmo job.
+    """
+    for job_id in Job.objects.filter(status=Job.PENDENTE).values_list("id", flat=True)[:10]:
+        agora = timezone.now()
+        reservado = Job.objects.filter(id=job_id, status=Job.PENDENTE).update(
+            status=Job.EXECUTANDO, iniciado_em=agora, batimento_em=agora
+        )
+        if reservado:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def _stale_seconds():
+    return int(os.getenv("JOB_STALE_SECONDS", "900"))
+
+
+def _liberar_travados():
+    """
+    Devolve para a fila jobs que ficaram em execução após a queda de um worker:
+    os que estão há mais de JOB_STALE_SECONDS sem batimento (ver _batimentos).
+    """
+    limite = timezone.now() - timedelta(seconds=_stale_seconds())
+    # Jobs reservados antes do batimento existir só têm o iniciado_em
+    sem_batimento = Q(batimento_em__lt=limite) | Q(batimento_em__isnull=True, iniciado_em__lt=limite)
+    liberados = Job.objects.filter(sem_batimento, status=Job.EXECUTANDO).update(
+        status=Job.PENDENTE, iniciado_em=None, batimento_em=None
+    )
+    if liberados:
+        logger.warning(f"{liberados} job(s) travado(s) devolvido(s) para a fila")
+
+
+def _varrer_travados():
+    """
+    Executa _liberar_travados no máximo uma vez a cada INTERVALO_VARREDURA
+    segundos por processo, a partir de qualquer worker.
+    """
+    global _proxima_varredura
+    with _workers_lock:
+        if time.monotonic() < _proxima_varredura:
+            return
+        _proxima_varredura = time.monotonic() + INTERVALO_VARREDURA
+    try:
+        _liberar_travados()
+    except Exception as e:
+        logger.error(f"Erro ao liberar jobs travados: {e}")
+
+
+def _batimentos(job_id, parar):
+    """
+    Renova o batimento_em do job enquanto ele roda, para que um job longo (um
+    lote grande, por exemplo) não seja tomado por travado e executado de novo.
+    """
+    try:
+        while not parar.wait(_stale_seconds() / 3):
+            try:
+                Job.objects.filter(id=job_id, status=Job.EXECUTANDO).update(batimento_em=timezone.now())
+            except Exception as e:
+                logger.warning(f"Falha ao registrar o batimento do job {job_id}: {e}")
+    finally:
+        connection.close()
+
+
+def executar_job(job):
+    parar = threading.Event()
+    threading.Thread(target=_batimentos, args=(job.id, parar), name=f"job-heartbeat-{job.id}", daemon=True).start()
+    try:
+        tarefa = import_string(TAREFAS[job.tipo])
+        resultado = tarefa(job.id, **job.parametros)
+    except Exception as e:
+        logger.error(f"Erro ao executar o job {job.id}: {e}")
+        resultado = {"error": str(e)}
+    finally:
+        parar.set()
+
+    if "error" in resultado:
+        job.status = Job.ERRO
+        job.erro = resultado["error"]
+    else:
+        job.status = Job.CONCLUIDO
+        job.arquivo = resultado.get("file", "")
+    job.resultado = resultado
+    job.concluido_em = timezone.now()
+    job.save(update_fields=["status", "erro", "arquivo", "resultado", "concluido_em"])
+    logger.info(f"Job {job.id} finalizado com status {job.status}")
+
+
+def _worker_loop():
+    while True:
+        close_old_connections()
+        _varrer_travados()
+        try:
+            job = _reservar_proximo()
+        except Exception as e:
+            logger.error(f"Erro ao buscar jobs: {e}")
+            job = None
+
+        if job is None:
+            # Também verifica periodicamente jobs criados por outros processos
+            _novo_job.wait(timeout=5)
+            _novo_job.clear()
+            continue
+
+        executar_job(job)
+
+
+def iniciar_workers():
+    """
+    Inicia (uma única vez por processo) as threads que executam os jobs.
+    A concorrência padrão acompanha o tamanho do pool de navegadores.
+
+    É chamada na partida do worker (myproject/wsgi.py e asgi.py), para que jobs
+    pendentes de antes de um restart sejam retomados sem esperar um novo job.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        quantidade = int(os.getenv("JOB_WORKERS", os.getenv("BROWSER_POOL_SIZE", "2")))
+        for i in range(quantidade):
+            worker = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+        logger.info(f"{quantidade} worker(s) de jobs iniciado(s)")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.artifacts import coletar_lixo
+
+
+class Command(BaseCommand):
+    help = "Remove resultados antigos do diretório de resultados, por idade e tamanho total."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-dias", type=float, help="Idade máxima dos resultados (padrão: RESULTS_MAX_AGE_DAYS)")
+        parser.add_argument("--max-mb", type=float, help="Tamanho total máximo em MB (padrão: RESULTS_MAX_SIZE_MB)")
+
+    def handle(self, *args, **options):
+        removidos = coletar_lixo(max_dias=options["max_dias"], max_mb=options["max_mb"])
+        self.stdout.write(self.style.SUCCESS(f"{removidos} resultado(s) removido(s)"))
@@ -0,0 +1,442 @@
+import os
+import json
+import time
+import atexit
+import inspect
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+# Com METRICS_ENABLED=false todas as operações viram no-op e os decoradores
+# devolvem a própria função, sem custo no caminho quente
+ATIVO = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Com vários processos (workers do gunicorn), cada um grava as suas métricas
+# em METRICS_DIR e a coleta soma as de todos; sem a variável, cada processo
+# expõe só as suas
+DIRETORIO = os.getenv("METRICS_DIR")
+
+# Agregação entre processos: SOMA (contadores e histogramas, inclusive de
+# processos já encerrados), SOMA_VIVOS (gauges dos processos ativos), ULTIMO
+# (o valor gravado mais recentemente) e LOCAL (calculado na coleta, como os
+# valores lidos do banco)
+SOMA = "soma"
+SOMA_VIVOS = "soma_vivos"
+ULTIMO = "ultimo"
+LOCAL = "local"
+
+logger = logging.getLogger(__name__)
+
+_NULO = nullcontext()
+_registro = []
+_coleta = threading.local()
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes, valores, extra=None):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatar_numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+    agregacao = SOMA
+
+    def __init__(self, nome, descricao, rotulos=()):
+        self.nome = nome
+        self.descricao = descricao
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+        self.atualizado_em = 0.0
+        _registro.append(self)
+
+    def _chave(self, rotulos):
+        return tuple(rotulos.get(nome, "") for nome in self.rotulos)
+
+    def _amostras(self):
+        raise NotImplementedError
+
+    def expor(self, processos=None):
+        """
+        Texto da métrica. Com `processos` (ver _ler_processos), as amostras
+        gravadas por todos os processos são agregadas.
+        """
+        amostras = self._amostras() if processos is None or self.agregacao == LOCAL else self._agregar(processos)
+        linhas = [f"# HELP {self.nome} {self.descricao}", f"# TYPE {self.nome} {self.tipo}"]
+        linhas += [f"{nome}{rotulos} {_formatar_numero(valor)}" for nome, rotulos, valor in amostras]
+        return "\n".join(linhas)
+
+    def _agregar(self, processos):
+        gravadas = [
+            (estado["metricas"][self.nome], vivo) for estado, vivo in processos if self.nome in estado["metricas"]
+        ]
+        if self.agregacao == ULTIMO:
+            gravadas = sorted(gravadas, key=lambda gravada: gravada[0]["atualizado_em"])[-1:]
+        elif self.agregacao == SOMA_VIVOS:
+            gravadas = [gravada for gravada in gravadas if gravada[1]]
+
+        totais = {}
+        for gravada, _ in gravadas:
+            for nome, rotulos, valor in gravada["amostras"]:
+                totais[(nome, rotulos)] = totais.get((nome, rotulos), 0) + valor
+        return [(nome, rotulos, valor) for (nome, rotulos), valor in totais.items()]
+
+
+class Counter(_Metrica):
+    """
+    Contador monotônico, opcionalmente com rótulos.
+    """
+
+    tipo = "counter"
+
+    def inc(self, valor=1, **rotulos):
+        if not ATIVO:
+            return
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def valor(self, **rotulos):
+        """
+        Valor do contador; durante uma coleta agregada, somado entre os processos.
+        """
+        agregados = getattr(_coleta, "amostras", None)
+        if agregados is not None:
+            return agregados.get((self.nome, _formatar_rotulos(self.rotulos, self._chave(rotulos))), 0)
+        with self._lock:
+            return self._valores.get(self._chave(rotulos), 0)
+
+    def _amostras(self):
+        with self._lock:
+            itens = list(self._valores.items())
+        return [(self.nome, _formatar_rotulos(self.rotulos, chave), valor) for chave, valor in itens]
+
+
+class Gauge(_Metrica):
+    """
+    Valor instantâneo. Com `funcao`, o valor é calculado no momento da coleta
+    (a função retorna um número ou um dict tupla-de-rótulos -> número).
+    """
+
+    tipo = "gauge"
+
+    def __init__(self, nome, descricao, rotulos=(), funcao=None, agregacao=SOMA_VIVOS):
+        super().__init__(nome, descricao, rotulos)
+        self.funcao = funcao
+        self.agregacao = agregacao
+
+    def set(self, valor, **rotulos):
+        if not ATIVO:
+            return
+        with self._lock:
+            self._valores[self._chave(rotulos)] = valor
+            self.atualizado_em = time.time()
+
+    def inc(self, valor=1, **rotulos):
+        if not ATIVO:
+            return
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def dec(self, valor=1, **rotulos):
+        self.inc(-valor, **rotulos)
+
+    @contextmanager
+    def em_uso(self, **rotulos):
+        """
+        Incrementa durante o bloco (ex.: páginas abertas).
+        """
+        self.inc(**rotulos)
+        try:
+            yield
+        finally:
+            self.dec(**rotulos)
+
+    def _amostras(self):
+        if self.funcao is not None:
+            valores = self.funcao()
+            itens = valores.items() if isinstance(valores, dict) else [((), valores)]
+        else:
+            with self._lock:
+                itens = list(self._valores.items())
+        return [
+            (self.nome, _formatar_rotulos(self.rotulos, chave), valor) for chave, valor in itens if valor is not None
+        ]
+
+
+class Histogram(_Metrica):
+    """
+    Histograma com buckets cumulativos, soma e contagem por combinação de rótulos.
+    """
+
+    tipo = "histogram"
+
+    def __init__(self, nome, descricao, rotulos=(), buckets=BUCKETS_PADRAO):
+        super().__init__(nome, descricao, rotulos)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, valor, **rotulos):
+        if not ATIVO:
+            return
+        chave = self._chave(rotulos)
+        indice = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._valores.get(chave)
+            if serie is None:
+                # Contagem por bucket (não cumulativa), +Inf, soma
+                serie = self._valores[chave] = [0] * (len(self.buckets) + 1) + [0.0]
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def contagem(self, **rotulos):
+        with self._lock:
+            serie = self._valores.get(self._chave(rotulos))
+            return sum(serie[:-1]) if serie else 0
+
+    def _amostras(self):
+        with self._lock:
+            itens = [(chave, list(serie)) for chave, serie in self._valores.items()]
+        amostras = []
+        for chave, serie in itens:
+            acumulado = 0
+            for limite, quantidade in zip(self.buckets + (float("inf"),), serie[:-1]):
+                acumulado += quantidade
+                le = f'le="{_formatar_numero(float(limite))}"'
+                amostras.append((f"{self.nome}_bucket", _formatar_rotulos(self.rotulos, chave, le), acumulado))
+            amostras.append((f"{self.nome}_sum", _formatar_rotulos(self.rotulos, chave), serie[-1]))
+            amostras.append((f"{self.nome}_count", _formatar_rotulos(self.rotulos, chave), acumulado))
+        return amostras
+
+
+class _Cronometro:
+    __slots__ = ("histograma", "rotulos", "inicio")
+
+    def __init__(self, histograma, rotulos):
+        self.histograma = histograma
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observe(time.perf_counter() - self.inicio, **self.rotulos)
+
+
+def medir(histograma, **rotulos):
+    """
+    Context manager que observa a duração do bloco (em segundos) no histograma.
+    """
+    if not ATIVO:
+        return _NULO
+    return _Cronometro(histograma, rotulos)
+
+
+def cronometrado(histograma, **rotulos):
+    """
+    Decorador equivalente a `medir`, para funções síncronas ou assíncronas.
+    Desativado, devolve a função original.
+    """
+    def decorador(funcao):
+        if not ATIVO:
+            return funcao
+        if inspect.iscoroutinefunction(funcao):
+            @wraps(funcao)
+            async def envolvida_async(*args, **kwargs):
+                with _Cronometro(histograma, rotulos):
+                    return await funcao(*args, **kwargs)
+            return envolvida_async
+
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with _Cronometro(histograma, rotulos):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+
+def _caminho_do_processo(pid=None):
+    return os.path.join(DIRETORIO, f"{pid or os.getpid()}.json")
+
+
+def gravar():
+    """
+    Grava em METRICS_DIR as amostras deste processo (exceto as LOCAL).
+    """
+    estado = {
+        "pid": os.getpid(),
+        "metricas": {
+            metrica.nome: {"atualizado_em": metrica.atualizado_em, "amostras": metrica._amostras()}
+            for metrica in _registro
+            if metrica.agregacao != LOCAL
+        },
+    }
+    os.makedirs(DIRETORIO, exist_ok=True)
+    temporario = f"{_caminho_do_processo()}.tmp"
+    with open(temporario, "w") as arquivo:
+        json.dump(estado, arquivo)
+    os.replace(temporario, _caminho_do_processo())
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _ler_processos():
+    """
+    Estados gravados por todos os processos, com a indicação se cada um ainda está ativo.
+    """
+    processos = []
+    for nome in os.listdir(DIRETORIO):
+        if not nome.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(DIRETORIO, nome)) as arquivo:
+                estado = json.load(arquivo)
+        except (OSError, ValueError):
+            continue
+        processos.append((estado, estado["pid"] == os.getpid() or _vivo(estado["pid"])))
+    return processos
+
+
+def _gravar_periodicamente():
+    intervalo = float(os.getenv("METRICS_SYNC_SECONDS", "5"))
+    while True:
+        time.sleep(intervalo)
+        try:
+            gravar()
+        except Exception as e:
+            logger.warning(f"Falha ao gravar as métricas do processo: {e}")
+
+
+def expor():
+    """
+    Todas as métricas no formato texto do Prometheus (0.0.4). Com METRICS_DIR,
+    agregadas entre todos os processos que gravam no diretório.
+    """
+    if not DIRETORIO:
+        return "\n".join(metrica.expor() for metrica in _registro) + "\n"
+
+    gravar()
+    processos = _ler_processos()
+    # Métricas LOCAL derivadas de outras (taxa de acerto) leem os contadores já somados
+    _coleta.amostras = {
+        (nome, rotulos): valor
+        for metrica in _registro if metrica.agregacao != LOCAL
+        for nome, rotulos, valor in metrica._agregar(processos)
+    }
+    try:
+        return "\n".join(metrica.expor(processos) for metrica in _registro) + "\n"
+    finally:
+        _coleta.amostras = None
+
+
+def _jobs_por_status():
+    from django.db.models import Count
+
+    from .models import Job
+
+    # order_by() vazio: a ordenação padrão do Job quebraria o agrupamento
+    contagem = dict(
+        Job.objects.filter(status__in=[Job.PENDENTE, Job.EXECUTANDO])
+        .order_by().values_list("status").annotate(total=Count("id"))
+    )
+    return {(status,): contagem.get(status, 0) for status in (Job.PENDENTE, Job.EXECUTANDO)}
+
+
+def _taxa_acerto():
+    taxas = {}
+    for cache in ("assinantes", "consultas"):
+        hits = CACHE_REQUISICOES.valor(cache=cache, resultado="hit")
+        total = hits + CACHE_REQUISICOES.valor(cache=cache, resultado="miss")
+        taxas[(cache,)] = round(hits / total, 4) if total else None
+    return taxas
+
+
+def _contas_em_uso():
+    from .accounts import contas_em_uso
+
+    return contas_em_uso()
+
+
+BROWSER_LAUNCHES = Counter(
+    "browser_launches_total", "Navegadores Chromium iniciados", ["origem"]
+)
+BROWSER_PAGINAS_ATIVAS = Gauge(
+    "browser_active_pages", "Páginas do Playwright abertas no momento", ["origem"]
+)
+LOGIN_SEGUNDOS = Histogram(
+    "portal_login_seconds", "Duração do login no portal", ["engine"]
+)
+CONTA_CONSULTAS = Counter(
+    "portal_account_queries_total", "Consultas ao portal por conta e resultado", ["conta", "resultado"]
+)
+CONTA_PAUSAS = Counter(
+    "portal_account_backoffs_total", "Pausas de contas limitadas ou deslogadas pelo portal", ["conta", "motivo"]
+)
+CONTA_EM_USO = Gauge(
+    "portal_account_in_use", "Consultas em andamento por conta do portal", ["conta"], funcao=_contas_em_uso
+)
+ETAPA_SEGUNDOS = Histogram(
+    "portal_step_seconds", "Duração de cada etapa da consulta no portal", ["etapa"]
+)
+JOBS = Gauge(
+    "job_queue_depth", "Jobs pendentes e em execução", ["status"], funcao=_jobs_por_status, agregacao=LOCAL
+)
+ENRIQUECIMENTO_SEGUNDOS = Histogram(
+    "enrichment_request_seconds", "Duração das requisições à API GraphQL de assinantes"
+)
+ENRIQUECIMENTO_REQUISICOES = Counter(
+    "enrichment_requests_total", "Requisições à API GraphQL por status HTTP (ou 'erro' de conexão)", ["status"]
+)
+CACHE_REQUISICOES = Counter(
+    "cache_requests_total", "Consultas aos caches de assinantes e de consultas", ["cache", "resultado"]
+)
+CACHE_TAXA_ACERTO = Gauge(
+    "cache_hit_ratio", "Fração de acertos de cada cache desde o início do serviço", ["cache"], funcao=_taxa_acerto,
+    agregacao=LOCAL,
+)
+RELATORIO_LINHAS = Counter(
+    "report_rows_total", "Linhas enriquecidas nos relatórios"
+)
+RELATORIO_SEGUNDOS = Histogram(
+    "report_enrichment_seconds", "Duração do enriquecimento de cada relatório"
+)
+RELATORIO_LINHAS_POR_SEGUNDO = Gauge(
+    "report_rows_per_second", "Linhas por segundo do último relatório processado", agregacao=ULTIMO
+)
+
+
+def registrar_relatorio(linhas, duracao):
+    RELATORIO_LINHAS.inc(linhas)
+    RELATORIO_SEGUNDOS.observe(duracao)
+    if duracao:
+        RELATORIO_LINHAS_POR_SEGUNDO.set(round(linhas / duracao, 1))
+
+
+if ATIVO and DIRETORIO:
+    threading.Thread(target=_gravar_periodicamente, name="metrics-sync", daemon=True).start()
+    atexit.register(gravar)
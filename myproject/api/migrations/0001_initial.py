@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:01
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(max_length=50)),
+                ('parametros', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('arquivo', models.CharField(blank=True, max_length=500)),
+                ('erro', models.TextField(blank=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='api_job_status_aba942_idx')],
+            },
+        ),
+    ]
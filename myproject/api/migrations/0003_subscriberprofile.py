@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_job_progresso'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubscriberProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(max_length=255, unique=True)),
+                ('dados', models.JSONField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:06
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_subscriberprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultArtifact',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('exportacao', 'Exportação do portal'), ('relatorio', 'Relatório processado')], max_length=20)),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('caminho', models.CharField(max_length=500)),
+                ('tamanho', models.BigIntegerField()),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='artefatos', to='api.job')),
+                ('origem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='derivados', to='api.resultartifact')),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_resultartifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='chave',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.CreateModel(
+            name='QueryResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=64, unique=True)),
+                ('parametros', models.JSONField(default=dict)),
+                ('linhas', models.JSONField(default=list)),
+                ('criado_em', models.DateTimeField(auto_now=True)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('artefato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consultas', to='api.resultartifact')),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_query_cache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='queryresult',
+            name='artefato',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='consultas', to='api.resultartifact'),
+        ),
+    ]
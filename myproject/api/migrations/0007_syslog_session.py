@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_query_result_sem_exportacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyslogSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('username', models.CharField(blank=True, max_length=255)),
+                ('ipv6', models.CharField(max_length=64)),
+                ('ipv6_inicio', models.CharField(max_length=32)),
+                ('ipv6_fim', models.CharField(max_length=32)),
+                ('inicio', models.DateTimeField(blank=True, null=True)),
+                ('fim', models.DateTimeField(blank=True, null=True)),
+                ('nas', models.CharField(blank=True, max_length=255)),
+                ('sessao', models.CharField(blank=True, max_length=255)),
+                ('licenca', models.CharField(blank=True, max_length=100)),
+                ('dados', models.JSONField(default=dict)),
+                ('hash', models.CharField(max_length=64, unique=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ipv6_inicio', 'ipv6_fim'], name='api_syslogs_ipv6_in_78eaea_idx'), models.Index(fields=['username', 'inicio'], name='api_syslogs_usernam_e2695f_idx'), models.Index(fields=['inicio', 'fim'], name='api_syslogs_inicio_f64624_idx')],
+            },
+        ),
+    ]
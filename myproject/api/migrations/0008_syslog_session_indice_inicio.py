@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_syslog_session'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='syslogsession',
+            name='api_syslogs_ipv6_in_78eaea_idx',
+        ),
+        migrations.AddIndex(
+            model_name='syslogsession',
+            index=models.Index(fields=['ipv6_inicio', 'ipv6_fim', 'inicio'], name='api_syslogs_ipv6_in_66bf4a_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_syslog_session_indice_inicio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='batimento_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
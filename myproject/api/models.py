@@ -1,3 +1,136 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class Job(models.Model):
+    """
+    Consulta enfileirada para execução pelos workers locais.
+    """
+
+    PENDENTE = "pendente"
+    EXECUTANDO = "executando"
+    CONCLUIDO = "concluido"
+    ERRO = "erro"
+    STATUS_CHOICES = [
+        (PENDENTE, "Pendente"),
+        (EXECUTANDO, "Executando"),
+        (CONCLUIDO, "Concluído"),
+        (ERRO, "Erro"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict)
+    # Identifica consultas equivalentes, para aproveitar jobs já em andamento
+    chave = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDENTE)
+    resultado = models.JSONField(null=True, blank=True)
+    progresso = models.JSONField(default=dict, blank=True)
+    arquivo = models.CharField(max_length=500, blank=True)
+    erro = models.TextField(blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    # Renovado pelo worker enquanto o job roda; um job sem batimento recente é tomado por travado
+    batimento_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["criado_em"]
+        indexes = [models.Index(fields=["status", "criado_em"])]
+
+    def __str__(self):
+        return f"{self.tipo} {self.id} ({self.status})"
+
+
+class ResultArtifact(models.Model):
+    """
+    Arquivo de resultado guardado no diretório de resultados, endereçado pelo SHA-256 do conteúdo.
+    """
+
+    EXPORTACAO = "exportacao"
+    RELATORIO = "relatorio"
+    TIPO_CHOICES = [
+        (EXPORTACAO, "Exportação do portal"),
+        (RELATORIO, "Relatório processado"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    caminho = models.CharField(max_length=500)
+    tamanho = models.BigIntegerField()
+    job = models.ForeignKey(Job, null=True, blank=True, on_delete=models.SET_NULL, related_name="artefatos")
+    origem = models.ForeignKey("self", null=True, blank=True, on_delete=models.SET_NULL, related_name="derivados")
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.tipo} {self.id}"
+
+
+class QueryResult(models.Model):
+    """
+    Resultado em cache de uma consulta ao portal, identificada pelos parâmetros normalizados.
+    """
+
+    chave = models.CharField(max_length=64, unique=True)
+    parametros = models.JSONField(default=dict)
+    # Vazio quando a consulta foi interpretada na página, sem exportação em Excel
+    artefato = models.ForeignKey(
+        ResultArtifact, null=True, blank=True, on_delete=models.CASCADE, related_name="consultas"
+    )
+    linhas = models.JSONField(default=list)
+    criado_em = models.DateTimeField(auto_now=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.parametros} ({self.chave[:8]})"
+
+
+class SubscriberProfile(models.Model):
+    """
+    Cache persistente dos dados de assinante retornados pela API GraphQL.
+    `dados` vazio indica um usuário desconhecido (cache negativo).
+    """
+
+    username = models.CharField(max_length=255, unique=True)
+    dados = models.JSONField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+    expira_em = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.username
+
+
+class SyslogSession(models.Model):
+    """
+    Sessão de autenticação (linha do resultado do NC Syslog) guardada para busca local.
+
+    O endereço/prefixo IPv6 é guardado também como intervalo de inteiros de
+    128 bits em hexadecimal de largura fixa, que ordena igual ao número e
+    permite buscas por faixa usando o índice.
+    """
+
+    username = models.CharField(max_length=255, blank=True)
+    ipv6 = models.CharField(max_length=64)
+    ipv6_inicio = models.CharField(max_length=32)
+    ipv6_fim = models.CharField(max_length=32)
+    inicio = models.DateTimeField(null=True, blank=True)
+    fim = models.DateTimeField(null=True, blank=True)
+    nas = models.CharField(max_length=255, blank=True)
+    sessao = models.CharField(max_length=255, blank=True)
+    licenca = models.CharField(max_length=100, blank=True)
+    dados = models.JSONField(default=dict)
+    # Hash da linha, para que a mesma sessão trazida por consultas diferentes seja guardada uma vez
+    hash = models.CharField(max_length=64, unique=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ipv6_inicio", "ipv6_fim", "inicio"]),
+            models.Index(fields=["username", "inicio"]),
+            models.Index(fields=["inicio", "fim"]),
+        ]
+
+    def __str__(self):
+        return f"{self.username} {self.ipv6} ({self.inicio})"
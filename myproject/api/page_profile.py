@@ -0,0 +1,182 @@
+import os
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from . import portal
+
+logger = logging.getLogger(__name__)
+
+# Flags que desligam recursos do Chromium que a automação não usa
+LAUNCH_ARGS_ENXUTOS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-sync",
+    "--disable-translate",
+    "--disable-default-apps",
+    "--metrics-recording-only",
+    "--mute-audio",
+    "--no-first-run",
+]
+
+# Código de erro usado no `route.abort`, para distinguir bloqueios de falhas reais
+ERRO_BLOQUEIO = "blockedbyclient"
+
+
+def _lista(valor):
+    return {item.strip().lower() for item in valor.split(",") if item.strip()}
+
+
+def _verdadeiro(valor):
+    return valor.strip().lower() in ("1", "true", "yes", "sim")
+
+
+class PoliticaRecursos:
+    """
+    Decide quais requisições do contexto são bloqueadas: tipos de recurso
+    desnecessários (imagens, fontes etc.) e hosts de terceiros (analytics, widgets).
+    """
+
+    def __init__(self, tipos_bloqueados, bloquear_terceiros, hosts_permitidos):
+        self.tipos_bloqueados = tipos_bloqueados
+        self.bloquear_terceiros = bloquear_terceiros
+        self.hosts_permitidos = hosts_permitidos
+
+    def deve_bloquear(self, request):
+        if request.resource_type in self.tipos_bloqueados:
+            return True
+        if self.bloquear_terceiros:
+            host = (urlsplit(request.url).hostname or "").lower()
+            if host and not any(host == h or host.endswith("." + h) for h in self.hosts_permitidos):
+                return True
+        return False
+
+    def _rotear(self, route):
+        if self.deve_bloquear(route.request):
+            return route.abort(ERRO_BLOQUEIO)
+        return route.continue_()
+
+    def aplicar(self, context):
+        """
+        Instala a política em um contexto da API síncrona do Playwright.
+        """
+        if self.tipos_bloqueados or self.bloquear_terceiros:
+            context.route("**/*", self._rotear)
+
+    async def _rotear_async(self, route):
+        await self._rotear(route)
+
+    async def aplicar_async(self, context):
+        """
+        Instala a política em um contexto da API assíncrona do Playwright.
+        """
+        if self.tipos_bloqueados or self.bloquear_terceiros:
+            await context.route("**/*", self._rotear_async)
+
+
+class MedidorRede:
+    """
+    Contadores de rede de uma execução: requisições feitas, bloqueadas e bytes recebidos.
+    """
+
+    def __init__(self):
+        self.requisicoes = 0
+        self.bloqueadas = 0
+        self.falhas = 0
+        self.bytes_recebidos = 0
+        self._lock = threading.Lock()
+
+    def _requisicao(self, request):
+        with self._lock:
+            self.requisicoes += 1
+
+    def _falha(self, request):
+        with self._lock:
+            if ERRO_BLOQUEIO in (request.failure or "").lower().replace("_", ""):
+                self.bloqueadas += 1
+            else:
+                self.falhas += 1
+
+    def _somar_bytes(self, tamanhos):
+        with self._lock:
+            self.bytes_recebidos += max(tamanhos.get("responseBodySize", 0), 0)
+            self.bytes_recebidos += max(tamanhos.get("responseHeadersSize", 0), 0)
+
+    def _finalizada(self, request):
+        self._somar_bytes(request.sizes())
+
+    async def _finalizada_async(self, request):
+        self._somar_bytes(await request.sizes())
+
+    def observar(self, page):
+        """
+        Passa a contar as requisições de uma página da API síncrona.
+        """
+        page.on("request", self._requisicao)
+        page.on("requestfailed", self._falha)
+        page.on("requestfinished", self._finalizada)
+        return self
+
+    def observar_async(self, page):
+        """
+        Passa a contar as requisições de uma página da API assíncrona.
+        """
+        page.on("request", self._requisicao)
+        page.on("requestfailed", self._falha)
+        page.on("requestfinished", self._finalizada_async)
+        return self
+
+    def as_dict(self):
+        return {
+            "requisicoes": self.requisicoes,
+            "bloqueadas": self.bloqueadas,
+            "falhas": self.falhas,
+            "bytes_recebidos": self.bytes_recebidos,
+        }
+
+
+def launch_options():
+    """
+    Opções de `chromium.launch`, com as flags enxutas quando PAGE_LEAN_LAUNCH está ativo.
+    """
+    opcoes = {"headless": True}
+    if _verdadeiro(os.getenv("PAGE_LEAN_LAUNCH", "true")):
+        opcoes["args"] = LAUNCH_ARGS_ENXUTOS
+    return opcoes
+
+
+def context_options():
+    """
+    Opções de `browser.new_context`: viewport reduzida e sem service workers.
+    """
+    largura, altura = os.getenv("PAGE_VIEWPORT", "1280x720").lower().split("x")
+    return {
+        "viewport": {"width": int(largura), "height": int(altura)},
+        "device_scale_factor": 1,
+        "service_workers": "block",
+        "reduced_motion": "reduce",
+    }
+
+
+def politica_recursos():
+    """
+    Política de bloqueio configurada por PAGE_BLOCK_RESOURCE_TYPES, PAGE_BLOCK_THIRD_PARTY
+    e PAGE_ALLOWED_HOSTS. O host do portal e o do login são sempre permitidos.
+
+    O bloqueio de terceiros vem desligado: o formulário do portal depende de
+    scripts de CDN (jQuery, select2). Ao ligá-lo, liste esses hosts em PAGE_ALLOWED_HOSTS.
+    """
+    hosts = _lista(os.getenv("PAGE_ALLOWED_HOSTS", ""))
+    for url in (portal.DASHBOARD_URL, os.getenv("LOGIN_URL") or ""):
+        host = urlsplit(url).hostname
+        if host:
+            hosts.add(host.lower())
+    return PoliticaRecursos(
+        tipos_bloqueados=_lista(os.getenv("PAGE_BLOCK_RESOURCE_TYPES", "image,media,font")),
+        bloquear_terceiros=_verdadeiro(os.getenv("PAGE_BLOCK_THIRD_PARTY", "false")),
+        hosts_permitidos=hosts,
+    )
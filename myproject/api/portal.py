@@ -0,0 +1,95 @@
+import os
+import logging
+
+from . import accounts, metrics
+from .result_parser import parse_consulta
+from .timing import etapa
+
+logger = logging.getLogger(__name__)
+
+PORTAL_URL = os.getenv("PORTAL_URL", "https://tjsolutions.com.br/painel").rstrip("/")
+DASHBOARD_URL = f"{PORTAL_URL}/dashboard"
+CONSULTAR_URL = f"{PORTAL_URL}/ncsyslog_v6/consultar"
+
+# Timeout (ms) da consulta no portal, que pode demorar em períodos grandes
+CONSULTA_TIMEOUT = 120000
+
+
+@metrics.cronometrado(metrics.LOGIN_SEGUNDOS, engine="browser")
+def login(page, conta):
+    """
+    Realiza o login no portal com a conta e aguarda o carregamento do dashboard.
+    Se o portal não aceitar as credenciais (a página continua no login ou o
+    dashboard não abre), levanta ContaDeslogada para a conta entrar em backoff.
+    """
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    login_url = os.getenv("LOGIN_URL")
+    page.goto(login_url)
+
+    # Preencher o formulário de login
+    page.get_by_placeholder("Seu usuário").fill(conta.usuario)
+    page.get_by_placeholder("Sua senha").fill(conta.senha)
+
+    # Submeter o formulário e esperar sair da página de login
+    page.get_by_role("button", name="Log In").click()
+    try:
+        page.wait_for_url(lambda url: url != login_url)
+        page.goto(DASHBOARD_URL)
+        page.wait_for_url(DASHBOARD_URL)
+    except PlaywrightTimeoutError:
+        raise falha_de_login(conta, page.url)
+
+
+def falha_de_login(conta, url):
+    """
+    ContaDeslogada para um login que não chegou ao dashboard (credenciais recusadas ou revogadas).
+    """
+    return accounts.ContaDeslogada(f"Falha no login do portal (conta '{conta.nome}', parou em {url})")
+
+
+def consultar(page, date: str, time: str, ipv6: str, licenca: str, saved_path: str = None, perfil=None):
+    """
+    Executa a consulta no NC Syslog a partir de uma página já autenticada
+    no dashboard e salva a exportação em Excel em `saved_path`. Sem `saved_path`,
+    as linhas são lidas da própria resposta de `consultar` e retornadas como
+    DataFrame, sem baixar nem reler o xlsx.
+
+    As esperas são feitas pelos próprios elementos/respostas, sem pausas fixas.
+    """
+    # Navegar para a página desejada após o login
+    with etapa(perfil, "navegar_nc_syslog"):
+        page.get_by_role("link", name=" NC Syslog ").click()
+        page.get_by_role("link", name="Consultar Autenticação").click()
+        page.get_by_label("Data: *").wait_for()
+
+    with etapa(perfil, "preencher_formulario"):
+        page.get_by_label("Data: *").fill(date)
+        page.get_by_label("Hora:*").click()
+        page.get_by_label("Hora:*").fill(time)
+        page.get_by_label("IPv6:").click()
+        page.get_by_label("IPv6:").fill(ipv6)
+        page.get_by_role("textbox", name=f"Radius {licenca}").click()
+        page.get_by_role("option", name=f"Radius {licenca}").click()
+
+    # Clica no botão "Localizar Registro" e espera a resposta da consulta
+    with etapa(perfil, "consultar"):
+        with page.expect_response(CONSULTAR_URL, timeout=CONSULTA_TIMEOUT) as response_info:
+            page.get_by_role("button", name="Localizar Registro").click(timeout=CONSULTA_TIMEOUT)
+        response = response_info.value
+        logger.info(f"Response: {response}")
+        accounts.verificar_status(response.status)
+
+    if saved_path is None:
+        with etapa(perfil, "interpretar_resposta"):
+            return parse_consulta(response.body(), response.headers.get("content-type", ""))
+
+    # Espera o botão " Excel" aparecer após a consulta
+    with etapa(perfil, "exportar"):
+        excel = page.get_by_role("button", name=" Excel")
+        excel.wait_for(timeout=CONSULTA_TIMEOUT)
+        with page.expect_download() as download_info:
+            excel.click()
+        download = download_info.value
+        download.save_as(saved_path)
+    return saved_path
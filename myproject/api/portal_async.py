@@ -0,0 +1,191 @@
+import os
+import asyncio
+import logging
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
+
+from . import accounts, metrics, page_profile, portal, session_store
+from .result_parser import parse_consulta
+from .timing import TimingProfile, etapa
+
+logger = logging.getLogger(__name__)
+
+
+@metrics.cronometrado(metrics.LOGIN_SEGUNDOS, engine="async")
+async def login(page, conta):
+    """
+    Versão assíncrona de `portal.login`.
+    """
+    login_url = os.getenv("LOGIN_URL")
+    await page.goto(login_url)
+
+    # Preencher o formulário de login
+    await page.get_by_placeholder("Seu usuário").fill(conta.usuario)
+    await page.get_by_placeholder("Sua senha").fill(conta.senha)
+
+    # Submeter o formulário e esperar sair da página de login
+    await page.get_by_role("button", name="Log In").click()
+    try:
+        await page.wait_for_url(lambda url: url != login_url)
+        await page.goto(portal.DASHBOARD_URL)
+        await page.wait_for_url(portal.DASHBOARD_URL)
+    except PlaywrightTimeoutError:
+        raise portal.falha_de_login(conta, page.url)
+
+
+async def _autenticado(page):
+    await page.goto(portal.DASHBOARD_URL)
+    return page.url.startswith(portal.DASHBOARD_URL)
+
+
+async def garantir_sessao(page, conta, perfil=None):
+    """
+    Versão assíncrona de `session_store.garantir_sessao`.
+    """
+    with etapa(perfil, "login"):
+        if await _autenticado(page):
+            return
+
+        logger.info(f"Sessão do portal expirada (conta '{conta.nome}')")
+        async with session_store.login_lock_async(conta):
+            # Outro worker pode ter renovado a sessão enquanto aguardávamos o lock
+            await page.context.add_cookies(session_store.carregar_cookies(conta))
+            if await _autenticado(page):
+                return
+
+            await login(page, conta)
+            destino = session_store.storage_state_path(conta)
+            temporario = destino.with_suffix(".tmp")
+            await page.context.storage_state(path=str(temporario))
+            os.replace(temporario, destino)
+            logger.info(f"Nova sessão do portal salva em cache (conta '{conta.nome}')")
+
+
+async def consultar(page, date: str, time: str, ipv6: str, licenca: str, saved_path: str = None, perfil=None):
+    """
+    Versão assíncrona de `portal.consultar`.
+    """
+    with etapa(perfil, "navegar_nc_syslog"):
+        await page.get_by_role("link", name=" NC Syslog ").click()
+        await page.get_by_role("link", name="Consultar Autenticação").click()
+        await page.get_by_label("Data: *").wait_for()
+
+    with etapa(perfil, "preencher_formulario"):
+        await page.get_by_label("Data: *").fill(date)
+        await page.get_by_label("Hora:*").click()
+        await page.get_by_label("Hora:*").fill(time)
+        await page.get_by_label("IPv6:").click()
+        await page.get_by_label("IPv6:").fill(ipv6)
+        await page.get_by_role("textbox", name=f"Radius {licenca}").click()
+        await page.get_by_role("option", name=f"Radius {licenca}").click()
+
+    with etapa(perfil, "consultar"):
+        async with page.expect_response(portal.CONSULTAR_URL, timeout=portal.CONSULTA_TIMEOUT) as response_info:
+            await page.get_by_role("button", name="Localizar Registro").click(timeout=portal.CONSULTA_TIMEOUT)
+        response = await response_info.value
+        logger.info(f"Response: {response}")
+        accounts.verificar_status(response.status)
+
+    if saved_path is None:
+        with etapa(perfil, "interpretar_resposta"):
+            return parse_consulta(await response.body(), response.headers.get("content-type", ""))
+
+    with etapa(perfil, "exportar"):
+        excel = page.get_by_role("button", name=" Excel")
+        await excel.wait_for(timeout=portal.CONSULTA_TIMEOUT)
+        async with page.expect_download() as download_info:
+            await excel.click()
+        download = await download_info.value
+        await download.save_as(saved_path)
+    return saved_path
+
+
+class AsyncBrowserEngine:
+    """
+    Um único Chromium por event loop, com várias páginas simultâneas e um
+    contexto autenticado por conta do portal. O semáforo limita o número de
+    páginas abertas; a conta de cada consulta vem do agendador de contas.
+    """
+
+    def __init__(self, max_paginas):
+        self._semaforo = asyncio.Semaphore(max_paginas)
+        self._iniciar_lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+        self._contextos = {}
+        self.paginas_abertas = 0
+
+    async def _garantir_navegador(self):
+        async with self._iniciar_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(**page_profile.launch_options())
+            self._contextos = {}
+            metrics.BROWSER_LAUNCHES.inc(origem="async")
+            logger.info("Navegador assíncrono iniciado")
+
+    async def _contexto(self, conta):
+        async with self._iniciar_lock:
+            if conta.nome not in self._contextos:
+                context = await self._browser.new_context(
+                    storage_state=session_store.storage_state(conta), **page_profile.context_options()
+                )
+                await page_profile.politica_recursos().aplicar_async(context)
+                self._contextos[conta.nome] = context
+            return self._contextos[conta.nome]
+
+    async def consultar(self, date: str, time: str, ipv6: str, licenca: str, saved_path: str = None):
+        """
+        Executa a consulta em uma nova página. Com `saved_path` o retorno traz o
+        arquivo exportado; sem ele, traz as linhas em "dados" (DataFrame).
+        """
+        perfil = TimingProfile()
+        rede = page_profile.MedidorRede()
+        agendador = accounts.get_agendador()
+        async with agendador.reservar_async() as conta, self._semaforo:
+            await self._garantir_navegador()
+            page = await (await self._contexto(conta)).new_page()
+            rede.observar_async(page)
+            self.paginas_abertas += 1
+            metrics.BROWSER_PAGINAS_ATIVAS.inc(origem="async")
+            try:
+                with agendador.consulta(conta):
+                    await garantir_sessao(page, conta, perfil)
+                    resultado = await consultar(page, date, time, ipv6, licenca, saved_path, perfil)
+            finally:
+                self.paginas_abertas -= 1
+                metrics.BROWSER_PAGINAS_ATIVAS.dec(origem="async")
+                await page.close()
+        logger.info(f"Tempos da consulta: {perfil.as_dict()}")
+        logger.info(f"Rede da consulta: {rede.as_dict()}")
+        retorno = {
+            "message": "Consulta executada com sucesso!", "conta": conta.nome,
+            "timing": perfil.as_dict(), "rede": rede.as_dict(),
+        }
+        retorno["file" if saved_path else "dados"] = resultado
+        return retorno
+
+    async def fechar(self):
+        if self._browser is not None:
+            await self._browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+
+_engines = {}
+
+
+def get_async_engine():
+    """
+    Retorna o engine do event loop atual (o Playwright assíncrono fica preso ao loop que o criou).
+    Sob ASGI há um único loop por worker; engines de loops já encerrados são descartados.
+    """
+    loop = asyncio.get_running_loop()
+    for encerrado in [outro for outro in _engines if outro.is_closed()]:
+        logger.warning("Descartando o engine assíncrono de um event loop encerrado")
+        del _engines[encerrado]
+    if loop not in _engines:
+        _engines[loop] = AsyncBrowserEngine(int(os.getenv("ASYNC_MAX_PAGES", "20")))
+    return _engines[loop]
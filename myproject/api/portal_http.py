@@ -0,0 +1,226 @@
+import os
+import logging
+import threading
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import accounts, metrics, portal, session_store
+from .result_parser import parse_consulta
+from .timing import etapa
+
+logger = logging.getLogger(__name__)
+
+
+def _normalizar_rotulo(texto):
+    return "".join(caractere for caractere in texto.lower() if caractere.isalnum())
+
+
+class _FormParser(HTMLParser):
+    """
+    Lê os formulários da página: campos, selects (com as opções) e rótulos.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.forms = []
+        self.csrf_token = None
+        self._label_for = None
+        self._label_texto = []
+        self._select = None
+        self._option = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta" and attrs.get("name") == "csrf-token":
+            self.csrf_token = attrs.get("content")
+        elif tag == "form":
+            self.forms.append({"action": attrs.get("action", ""), "inputs": [], "selects": [], "labels": {}})
+        elif not self.forms:
+            return
+        elif tag == "input" and attrs.get("name"):
+            self.forms[-1]["inputs"].append(attrs)
+        elif tag == "select" and attrs.get("name"):
+            self._select = {"name": attrs["name"], "id": attrs.get("id"), "options": []}
+            self.forms[-1]["selects"].append(self._select)
+        elif tag == "option" and self._select is not None:
+            self._option = {"value": attrs.get("value"), "texto": ""}
+            self._select["options"].append(self._option)
+        elif tag == "label":
+            self._label_for = attrs.get("for")
+            self._label_texto = []
+
+    def handle_endtag(self, tag):
+        if tag == "label" and self._label_for and self.forms:
+            self.forms[-1]["labels"][_normalizar_rotulo("".join(self._label_texto))] = self._label_for
+            self._label_for = None
+        elif tag == "select":
+            self._select = None
+        elif tag == "option":
+            self._option = None
+
+    def handle_data(self, data):
+        if self._label_for:
+            self._label_texto.append(data)
+        if self._option is not None:
+            self._option["texto"] += data
+
+
+def _ler_pagina(resposta):
+    # Sem charset no Content-Type o requests assume ISO-8859-1 e estraga os acentos dos rótulos
+    if "charset" not in resposta.headers.get("Content-Type", "").lower():
+        resposta.encoding = resposta.apparent_encoding
+    parser = _FormParser()
+    parser.feed(resposta.text)
+    return parser
+
+
+def _valores_padrao(form):
+    """
+    Valores já preenchidos no formulário (tokens, campos ocultos etc.).
+    """
+    return {
+        campo["name"]: campo.get("value", "")
+        for campo in form["inputs"]
+        if campo.get("type", "text") not in ("submit", "button", "checkbox", "radio") or campo.get("checked") is not None
+    }
+
+
+def _campo_por_rotulo(form, rotulo):
+    campo_id = form["labels"].get(_normalizar_rotulo(rotulo))
+    for campo in form["inputs"] + form["selects"]:
+        if campo_id and campo.get("id") == campo_id:
+            return campo["name"]
+    raise ValueError(f"Campo '{rotulo}' não encontrado no formulário de consulta")
+
+
+class PortalHttpClient:
+    """
+    Consulta o endpoint `ncsyslog_v6/consultar` diretamente por HTTP, sem navegador.
+
+    Os nomes dos campos são descobertos nos formulários do portal pelos mesmos
+    rótulos/placeholders usados pela automação com Playwright. Cada conta do
+    portal tem o seu cliente, e a sessão (cookies) é compartilhada com o cache
+    de storage_state do navegador da mesma conta.
+    """
+
+    def __init__(self, conta, pool_maxsize=10, timeout=120):
+        self.conta = conta
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._lock = threading.Lock()
+        self._carregar_cookies()
+
+    def _carregar_cookies(self):
+        for cookie in session_store.carregar_cookies(self.conta):
+            self.session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/")
+            )
+
+    def _autenticado(self):
+        resposta = self.session.get(portal.DASHBOARD_URL, timeout=self.timeout)
+        return resposta.url.startswith(portal.DASHBOARD_URL)
+
+    @metrics.cronometrado(metrics.LOGIN_SEGUNDOS, engine="http")
+    def login(self):
+        login_url = os.getenv("LOGIN_URL")
+        resposta = self.session.get(login_url, timeout=self.timeout)
+        pagina = _ler_pagina(resposta)
+
+        for form in pagina.forms:
+            placeholders = {campo.get("placeholder"): campo["name"] for campo in form["inputs"]}
+            if "Seu usuário" in placeholders and "Sua senha" in placeholders:
+                break
+        else:
+            raise ValueError("Formulário de login não encontrado")
+
+        dados = _valores_padrao(form)
+        dados[placeholders["Seu usuário"]] = self.conta.usuario
+        dados[placeholders["Sua senha"]] = self.conta.senha
+        self.session.post(urljoin(resposta.url, form["action"] or resposta.url), data=dados, timeout=self.timeout)
+
+        if not self._autenticado():
+            raise accounts.ContaDeslogada(f"Falha no login do portal (conta '{self.conta.nome}')")
+        session_store.salvar_cookies(
+            self.conta,
+            [
+                {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "expires": c.expires or -1,
+                 "httpOnly": False, "secure": c.secure, "sameSite": "Lax"}
+                for c in self.session.cookies
+            ]
+        )
+        logger.info(f"Login HTTP no portal realizado (conta '{self.conta.nome}')")
+
+    def garantir_sessao(self):
+        if self._autenticado():
+            return
+        with self._lock, session_store.login_lock(self.conta):
+            # Outro worker pode ter renovado a sessão enquanto aguardávamos o lock
+            self._carregar_cookies()
+            if not self._autenticado():
+                self.login()
+
+    def consultar(self, date: str, time: str, ipv6: str, licenca: str, perfil=None):
+        """
+        Executa a consulta e retorna as linhas do resultado como DataFrame.
+        """
+        with etapa(perfil, "login"):
+            self.garantir_sessao()
+
+        with etapa(perfil, "navegar_nc_syslog"):
+            resposta = self.session.get(consulta_page_url(), timeout=self.timeout)
+            pagina = _ler_pagina(resposta)
+            form = next((f for f in pagina.forms if _normalizar_rotulo("IPv6:") in f["labels"]), None)
+            if form is None:
+                raise ValueError("Formulário de consulta não encontrado")
+
+        with etapa(perfil, "preencher_formulario"):
+            dados = _valores_padrao(form)
+            dados[_campo_por_rotulo(form, "Data: *")] = date
+            dados[_campo_por_rotulo(form, "Hora:*")] = time
+            dados[_campo_por_rotulo(form, "IPv6:")] = ipv6
+            for select in form["selects"]:
+                opcao = next((o for o in select["options"] if o["texto"].strip() == f"Radius {licenca}"), None)
+                if opcao:
+                    dados[select["name"]] = opcao["value"]
+                    break
+            else:
+                raise ValueError(f"Licença 'Radius {licenca}' não encontrada")
+
+        with etapa(perfil, "consultar"):
+            headers = {"X-Requested-With": "XMLHttpRequest", "Referer": resposta.url}
+            if pagina.csrf_token:
+                headers["X-CSRF-TOKEN"] = pagina.csrf_token
+            resultado = self.session.post(portal.CONSULTAR_URL, data=dados, headers=headers, timeout=self.timeout)
+            accounts.verificar_status(resultado.status_code)
+            resultado.raise_for_status()
+
+        with etapa(perfil, "interpretar_resposta"):
+            return parse_consulta(resultado.content, resultado.headers.get("Content-Type", ""))
+
+
+def consulta_page_url():
+    return os.getenv("PORTAL_CONSULTA_PAGE_URL", urljoin(portal.DASHBOARD_URL, "ncsyslog_v6"))
+
+
+_clients = {}
+_client_lock = threading.Lock()
+
+
+def get_portal_client(conta):
+    """
+    Retorna o cliente HTTP da conta neste processo, criando-o na primeira chamada.
+    """
+    with _client_lock:
+        if conta.nome not in _clients:
+            _clients[conta.nome] = PortalHttpClient(
+                conta,
+                pool_maxsize=int(os.getenv("PORTAL_HTTP_POOL_SIZE", "10")),
+                timeout=portal.CONSULTA_TIMEOUT / 1000,
+            )
+        return _clients[conta.nome]
@@ -0,0 +1,43 @@
+import os
+import time
+import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+# Módulos de cada grupo aceito em WEB_PRELOAD; "urls" carrega o ROOT_URLCONF (views e serializers)
+GRUPOS = {
+    "urls": (),
+    "dados": ("pandas", "openpyxl", "api.export", "api.enrichment"),
+    "browser": ("api.browser_pool", "api.portal_async", "api.batch"),
+    "http": ("api.portal_http",),
+}
+
+
+def precarregar(grupos=None):
+    """
+    Importa na partida do worker os grupos de módulos pedidos (por padrão os de
+    WEB_PRELOAD, separados por vírgula), para que a primeira requisição que usa
+    cada engine não pague o import. O grupo "browser" também cria o pool de
+    navegadores. Sem a variável, só as URLs são carregadas.
+    """
+    if grupos is None:
+        grupos = [grupo.strip() for grupo in os.getenv("WEB_PRELOAD", "urls").split(",") if grupo.strip()]
+
+    for grupo in grupos:
+        if grupo not in GRUPOS:
+            logger.warning(f"Grupo de pré-carregamento desconhecido: {grupo}")
+            continue
+        inicio = time.perf_counter()
+        if grupo == "urls":
+            from django.urls import get_resolver
+
+            get_resolver().url_patterns
+        for modulo in GRUPOS[grupo]:
+            importlib.import_module(modulo)
+        if grupo == "browser":
+            # Inicia os navegadores do pool (e o login da conta padrão) em segundo plano
+            from .browser_pool import get_browser_pool
+
+            get_browser_pool()
+        logger.info(f"Pré-carregamento '{grupo}' em {time.perf_counter() - inicio:.2f}s")
@@ -0,0 +1,170 @@
+import os
+import json
+import hashlib
+import logging
+import ipaddress
+import threading
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import artifacts, jobs, metrics, sessions
+from .models import Job, QueryResult, ResultArtifact
+from .result_parser import salvar_como_exportacao
+
+logger = logging.getLogger(__name__)
+
+_em_andamento = {}
+_em_andamento_lock = threading.Lock()
+
+
+def normalizar_ipv6(ipv6):
+    """
+    Forma canônica comprimida do IPv6 (ou do prefixo), para que grafias equivalentes coincidam.
+    """
+    valor = ipv6.strip()
+    try:
+        if "/" in valor:
+            return ipaddress.ip_interface(valor).with_prefixlen
+        return ipaddress.ip_address(valor).compressed
+    except ValueError:
+        return valor.lower()
+
+
+def normalizar(date, time, ipv6, licenca, **_):
+    return {
+        "date": date.strip(),
+        "time": time.strip(),
+        "ipv6": normalizar_ipv6(ipv6),
+        "licenca": licenca.strip(),
+    }
+
+
+def chave(parametros):
+    """
+    Chave da consulta: hash dos parâmetros normalizados. O engine não faz parte
+    da chave, pois ambos produzem o mesmo resultado.
+    """
+    normalizados = normalizar(**parametros)
+    return hashlib.sha256(json.dumps(normalizados, sort_keys=True).encode()).hexdigest()
+
+
+def obter(chave_consulta):
+    """
+    Resultado ainda válido da consulta, ou None.
+    """
+    resultado = (
+        QueryResult.objects.select_related("artefato")
+        .filter(chave=chave_consulta, expira_em__gt=timezone.now())
+        .first()
+    )
+    metrics.CACHE_REQUISICOES.inc(cache="consultas", resultado="hit" if resultado else "miss")
+    return resultado
+
+
+def guardar(chave_consulta, parametros, artefato=None, df=None):
+    """
+    Guarda as linhas da consulta e, quando houver, a exportação. Sem o
+    DataFrame já interpretado, as linhas são lidas da exportação.
+    """
+    if df is None:
+        import pandas as pd
+
+        df = pd.read_excel(artefato.caminho, header=1)
+    linhas = json.loads(df.to_json(orient="records", date_format="iso", force_ascii=False))
+    sessions.ingerir_com_seguranca(df, parametros)
+    ttl = int(os.getenv("QUERY_CACHE_TTL", "600"))
+    resultado, _ = QueryResult.objects.update_or_create(
+        chave=chave_consulta,
+        defaults={
+            "parametros": normalizar(**parametros),
+            "artefato": artefato,
+            "linhas": linhas,
+            "expira_em": timezone.now() + timedelta(seconds=ttl),
+        },
+    )
+    return resultado
+
+
+def exportacao(resultado, job=None):
+    """
+    Exportação em xlsx do resultado, gerada a partir das linhas quando a
+    consulta foi feita sem Excel.
+    """
+    if resultado.artefato is None:
+        import pandas as pd
+
+        destino = salvar_como_exportacao(pd.DataFrame(resultado.linhas), artifacts.novo_temporario())
+        resultado.artefato = artifacts.armazenar(destino, ResultArtifact.EXPORTACAO, job=job)
+        resultado.save(update_fields=["artefato"])
+    return resultado.artefato
+
+
+def resultado_em_cache(resultado):
+    retorno = {"message": "Consulta obtida do cache", "linhas": len(resultado.linhas), "cache": True}
+    if resultado.artefato is not None:
+        retorno.update({"file": resultado.artefato.caminho, "result_id": str(resultado.artefato.id)})
+    return retorno
+
+
+def executar_uma_vez(chave_consulta, funcao):
+    """
+    Single-flight: chamadas simultâneas com a mesma chave aguardam a execução
+    já em andamento neste processo em vez de abrir outro navegador.
+    """
+    with _em_andamento_lock:
+        futuro = _em_andamento.get(chave_consulta)
+        dono = futuro is None
+        if dono:
+            futuro = Future()
+            _em_andamento[chave_consulta] = futuro
+
+    if not dono:
+        logger.info(f"Consulta {chave_consulta[:8]} já em andamento, aguardando o resultado")
+        return futuro.result()
+
+    try:
+        futuro.set_result(funcao())
+    except Exception as e:
+        futuro.set_exception(e)
+    finally:
+        with _em_andamento_lock:
+            _em_andamento.pop(chave_consulta, None)
+    return futuro.result()
+
+
+def enfileirar_consulta(parametros):
+    """
+    Enfileira a consulta, a menos que ela já esteja em cache (o job é criado já
+    concluído) ou que um job idêntico esteja pendente/em execução (o mesmo job é
+    devolvido, desde que gere o Excel quando `excel` foi pedido).
+    """
+    chave_consulta = chave(parametros)
+
+    em_cache = obter(chave_consulta)
+    if em_cache:
+        logger.info(f"Consulta {chave_consulta[:8]} atendida pelo cache")
+        if parametros.get("excel", settings.PORTAL_EXPORT_EXCEL):
+            exportacao(em_cache)
+        return Job.objects.create(
+            tipo="consulta",
+            parametros=parametros,
+            chave=chave_consulta,
+            status=Job.CONCLUIDO,
+            resultado=resultado_em_cache(em_cache),
+            arquivo=em_cache.artefato.caminho if em_cache.artefato else "",
+            iniciado_em=timezone.now(),
+            concluido_em=timezone.now(),
+        )
+
+    excel = parametros.get("excel", settings.PORTAL_EXPORT_EXCEL)
+    for em_andamento in Job.objects.filter(chave=chave_consulta, status__in=[Job.PENDENTE, Job.EXECUTANDO]):
+        # Um job sem Excel não atende quem pediu a exportação (o contrário atende)
+        if excel and not em_andamento.parametros.get("excel", settings.PORTAL_EXPORT_EXCEL):
+            continue
+        logger.info(f"Consulta {chave_consulta[:8]} agrupada ao job {em_andamento.id}")
+        return em_andamento
+
+    return jobs.enfileirar("consulta", parametros, chave=chave_consulta)
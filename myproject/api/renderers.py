@@ -0,0 +1,24 @@
+import json
+
+from rest_framework import renderers
+
+
+class _ArquivoRenderer(renderers.BaseRenderer):
+    """
+    Permite escolher o formato do relatório com ?format= ou pelo cabeçalho Accept.
+    O relatório é enviado diretamente pela view; este renderer só serializa as respostas de erro.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode()
+
+
+class CSVRenderer(_ArquivoRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class XLSXRenderer(_ArquivoRenderer):
+    media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    format = 'xlsx'
+    charset = None
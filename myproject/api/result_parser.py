@@ -0,0 +1,121 @@
+import json
+import logging
+from html.parser import HTMLParser
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalho da exportação em Excel do portal para os campos de sessions.COLUNAS
+CABECALHOS_EXPORTACAO = {"username": "Usuário", "ipv6": "IPv6", "nas": "NAS", "sessao": "Sessão"}
+
+
+class _TabelaParser(HTMLParser):
+    """
+    Extrai cabeçalho e linhas da primeira tabela com dados do HTML.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.tabelas = []
+        self._linha = None
+        self._celula = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.tabelas.append([])
+        elif tag == "tr" and self.tabelas:
+            self._linha = []
+        elif tag in ("td", "th") and self._linha is not None:
+            self._celula = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._celula is not None:
+            self._linha.append(" ".join("".join(self._celula).split()))
+            self._celula = None
+        elif tag == "tr" and self._linha is not None:
+            if self._linha:
+                self.tabelas[-1].append(self._linha)
+            self._linha = None
+
+    def handle_data(self, data):
+        if self._celula is not None:
+            self._celula.append(data)
+
+
+def _registros_json(dados):
+    """
+    Encontra a lista de registros no JSON da consulta, esteja ela na raiz
+    ou dentro de uma chave como "data" ou "registros".
+    """
+    if isinstance(dados, list):
+        return dados
+    # Alguns endpoints devolvem o HTML da tabela dentro do JSON
+    if isinstance(dados, str):
+        return parse_html(dados) if "<table" in dados else None
+    if isinstance(dados, dict):
+        for valor in dados.values():
+            if isinstance(valor, list) and (not valor or isinstance(valor[0], dict)):
+                return valor
+        for valor in dados.values():
+            registros = _registros_json(valor) if isinstance(valor, (dict, str)) else None
+            if registros is not None:
+                return registros
+    return None
+
+
+def parse_html(html):
+    """
+    Converte a tabela de resultados do HTML em uma lista de registros.
+    """
+    parser = _TabelaParser()
+    parser.feed(html)
+    for tabela in parser.tabelas:
+        if tabela:
+            cabecalho, *linhas = tabela
+            return [dict(zip(cabecalho, linha)) for linha in linhas]
+    return []
+
+
+def parse_consulta(conteudo, content_type=""):
+    """
+    Converte a resposta do endpoint `ncsyslog_v6/consultar` (JSON ou HTML) em um DataFrame.
+    """
+    if isinstance(conteudo, bytes):
+        conteudo = conteudo.decode("utf-8", errors="replace")
+
+    registros = None
+    if "json" in content_type or conteudo.lstrip()[:1] in ("{", "["):
+        try:
+            registros = _registros_json(json.loads(conteudo))
+        except ValueError:
+            logger.warning("Resposta da consulta não é um JSON válido, tentando como HTML")
+    if registros is None:
+        registros = parse_html(conteudo)
+
+    if registros and not isinstance(registros[0], dict):
+        raise ValueError("Formato de resposta da consulta não reconhecido")
+
+    import pandas as pd
+
+    return padronizar_colunas(pd.DataFrame(registros))
+
+
+def padronizar_colunas(df):
+    """
+    Renomeia as colunas da resposta (por exemplo "username" ou "login") para
+    os cabeçalhos da exportação em Excel, que o enriquecimento espera.
+    """
+    from .sessions import mapear_colunas
+
+    mapa = mapear_colunas(df.columns)
+    return df.rename(columns={
+        mapa[campo]: cabecalho for campo, cabecalho in CABECALHOS_EXPORTACAO.items() if campo in mapa
+    })
+
+
+def salvar_como_exportacao(df, saved_path):
+    """
+    Grava o DataFrame no mesmo formato da exportação " Excel" do portal
+    (título na primeira linha e cabeçalho na segunda), lido com `header=1`.
+    """
+    df.to_excel(saved_path, index=False, startrow=1)
+    return saved_path
@@ -1,5 +1,10 @@
+import ipaddress
+
 from rest_framework import serializers
 
+from .engines import ENGINES
+from .models import Job, SyslogSession
+
 class HelloWorldSerializer(serializers.Serializer):
     nome = serializers.CharField(max_length=100, required=True)
     
@@ -7,4 +12,50 @@ class ConsultarIpv6Serializer(serializers.Serializer):
     date = serializers.CharField(required=True)
     time = serializers.CharField(required=True)
     ipv6 = serializers.CharField(required=True)
-    licenca = serializers.CharField(required=True)
\ No newline at end of file
+    licenca = serializers.CharField(required=True)
+    engine = serializers.ChoiceField(choices=ENGINES, required=False)
+    excel = serializers.BooleanField(required=False)
+
+class ItemLoteSerializer(ConsultarIpv6Serializer):
+    # O lote sempre gera uma única planilha com todos os itens
+    excel = None
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict) and "excel" in data:
+            raise serializers.ValidationError({"excel": "Não suportado em lotes: o lote sempre gera uma planilha única."})
+        return super().to_internal_value(data)
+
+class ConsultarIpv6BatchSerializer(serializers.Serializer):
+    itens = ItemLoteSerializer(many=True, allow_empty=False)
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'tipo', 'status', 'parametros', 'resultado', 'progresso', 'erro', 'criado_em', 'iniciado_em', 'concluido_em']
+
+class SyslogSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SyslogSession
+        fields = ['username', 'ipv6', 'inicio', 'fim', 'nas', 'sessao', 'licenca', 'dados']
+
+class BuscaSessoesSerializer(serializers.Serializer):
+    ipv6 = serializers.CharField(required=False)
+    username = serializers.CharField(required=False)
+    licenca = serializers.CharField(required=False)
+    date = serializers.CharField(required=False)
+    time = serializers.CharField(required=False)
+    inicio = serializers.DateTimeField(required=False)
+    fim = serializers.DateTimeField(required=False)
+    limite = serializers.IntegerField(required=False, min_value=1, max_value=1000, default=100)
+
+    def validate_ipv6(self, valor):
+        try:
+            ipaddress.IPv6Network(valor.strip(), strict=False)
+        except ValueError:
+            raise serializers.ValidationError("IPv6 ou prefixo IPv6 inválido.")
+        return valor.strip()
+
+    def validate(self, dados):
+        if bool(dados.get("date")) != bool(dados.get("time")):
+            raise serializers.ValidationError("Informe date e time juntos.")
+        return dados
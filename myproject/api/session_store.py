@@ -0,0 +1,141 @@
+import os
+import json
+import fcntl
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+from . import portal
+from .timing import etapa
+
+logger = logging.getLogger(__name__)
+
+# Serializam os logins de cada conta entre threads do mesmo processo; o flock cuida dos outros workers
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def session_dir(conta):
+    """
+    Pasta compartilhada onde o storage_state do Playwright da conta é persistido.
+    """
+    pasta = Path(os.getenv("SESSION_CACHE_DIR", settings.DATABASE_DIR / "sessions")) / conta.nome
+    pasta.mkdir(parents=True, exist_ok=True)
+    return pasta
+
+
+def storage_state_path(conta):
+    return session_dir(conta) / "storage_state.json"
+
+
+def storage_state(conta):
+    """
+    Caminho do storage_state salvo, ou None se ainda não houver sessão em cache.
+    """
+    caminho = storage_state_path(conta)
+    return str(caminho) if caminho.exists() else None
+
+
+def _versao(conta):
+    try:
+        return storage_state_path(conta).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _thread_lock(conta):
+    with _thread_locks_lock:
+        return _thread_locks.setdefault(conta.nome, threading.Lock())
+
+
+@contextmanager
+def login_lock(conta):
+    """
+    Garante que apenas um worker por vez faça login no portal com a conta.
+    """
+    with _thread_lock(conta):
+        with open(session_dir(conta) / "login.lock", "w") as arquivo_lock:
+            fcntl.flock(arquivo_lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(arquivo_lock, fcntl.LOCK_UN)
+
+
+@asynccontextmanager
+async def login_lock_async(conta):
+    """
+    Versão assíncrona de `login_lock`: espera o flock em uma thread, sem bloquear o event loop.
+    """
+    with open(session_dir(conta) / "login.lock", "w") as arquivo_lock:
+        await asyncio.to_thread(fcntl.flock, arquivo_lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(arquivo_lock, fcntl.LOCK_UN)
+
+
+def carregar_cookies(conta):
+    """
+    Cookies da sessão em cache, no formato do storage_state do Playwright.
+    """
+    caminho = storage_state(conta)
+    if not caminho:
+        return []
+    with open(caminho) as arquivo:
+        return json.load(arquivo).get("cookies", [])
+
+
+def salvar_cookies(conta, cookies):
+    """
+    Grava cookies obtidos fora do navegador (ex.: login HTTP) como storage_state,
+    para que os navegadores do pool também possam reaproveitá-los.
+    """
+    destino = storage_state_path(conta)
+    temporario = destino.with_suffix(".tmp")
+    with open(temporario, "w") as arquivo:
+        json.dump({"cookies": cookies, "origins": []}, arquivo)
+    os.replace(temporario, destino)
+
+
+def _autenticado(page):
+    page.goto(portal.DASHBOARD_URL)
+    return page.url.startswith(portal.DASHBOARD_URL)
+
+
+def _salvar(context, conta):
+    destino = storage_state_path(conta)
+    temporario = destino.with_suffix(".tmp")
+    context.storage_state(path=str(temporario))
+    os.replace(temporario, destino)
+
+
+def garantir_sessao(page, conta, perfil=None):
+    """
+    Deixa a página autenticada no dashboard com a conta, fazendo login apenas se a sessão expirou.
+    """
+    with etapa(perfil, "login"):
+        _garantir_sessao(page, conta)
+
+
+def _garantir_sessao(page, conta):
+    versao = _versao(conta)
+    if _autenticado(page):
+        return
+
+    logger.info(f"Sessão do portal expirada (conta '{conta.nome}')")
+    with login_lock(conta):
+        # Outro worker pode ter renovado a sessão enquanto aguardávamos o lock
+        if versao != _versao(conta) and storage_state(conta):
+            page.context.add_cookies(carregar_cookies(conta))
+            if _autenticado(page):
+                logger.info("Sessão renovada por outro worker reaproveitada")
+                return
+
+        portal.login(page, conta)
+        _salvar(page.context, conta)
+        logger.info(f"Nova sessão do portal salva em cache (conta '{conta.nome}')")
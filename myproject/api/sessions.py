@@ -0,0 +1,247 @@
+import os
+import json
+import hashlib
+import logging
+import ipaddress
+import unicodedata
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from django.db.models import Q
+
+from .models import SyslogSession
+
+logger = logging.getLogger(__name__)
+
+# Nomes aceitos (já normalizados) para cada campo nas colunas do resultado do portal
+COLUNAS = {
+    "username": ("usuario", "username", "login", "user"),
+    "ipv6": ("ipv6", "enderecoipv6", "prefixoipv6", "ipv6prefixo", "ipv6delegado", "delegatedipv6prefix", "framedipv6prefix"),
+    "inicio": ("inicio", "datainicio", "datahorainicio", "inicioconexao", "iniciosessao", "datahora", "data"),
+    "hora": ("hora", "horainicio"),
+    "fim": ("fim", "datafim", "datahorafim", "fimconexao", "fimsessao", "termino"),
+    "nas": ("nas", "nasip", "nasipaddress", "concentrador", "bng"),
+    "sessao": ("sessao", "sessionid", "acctsessionid", "idsessao"),
+}
+
+FORMATOS_INSTANTE = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+_LOTE_BANCO = 500
+
+
+def _normalizar_coluna(nome):
+    texto = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode()
+    return "".join(caractere for caractere in texto.lower() if caractere.isalnum())
+
+
+def fuso_syslog():
+    """
+    Fuso dos horários exibidos pelo portal (SYSLOG_TIMEZONE).
+    """
+    return ZoneInfo(os.getenv("SYSLOG_TIMEZONE", "America/Sao_Paulo"))
+
+
+def janela_sem_fim():
+    """
+    Por quanto tempo após o início uma sessão sem horário de fim é considerada
+    ativa (SYSLOG_SESSION_MAX_HOURS), para não responder indefinidamente.
+    """
+    return timedelta(hours=float(os.getenv("SYSLOG_SESSION_MAX_HOURS", "24")))
+
+
+def intervalo_ipv6(valor):
+    """
+    Primeiro e último endereço (inteiros de 128 bits) do IPv6 ou prefixo informado.
+    """
+    rede = ipaddress.IPv6Network(valor.strip(), strict=False)
+    return int(rede.network_address), int(rede.broadcast_address)
+
+
+def hex128(numero):
+    """
+    Inteiro de 128 bits em hexadecimal de largura fixa, que ordena como o número.
+    """
+    return f"{numero:032x}"
+
+
+def inicios_dos_prefixos_que_contem(menor, maior):
+    """
+    Início (hex128) de cada prefixo CIDR que contém o intervalo [menor, maior],
+    do /0 até o próprio intervalo. Como todo intervalo guardado é um prefixo,
+    quem contém o intervalo tem um destes inícios, e a busca vira igualdade no índice.
+    """
+    comprimento = 128 - ((maior - menor + 1).bit_length() - 1)
+    mascara_total = (1 << 128) - 1
+    return sorted({
+        hex128(menor & (mascara_total ^ ((1 << (128 - tamanho)) - 1))) for tamanho in range(comprimento + 1)
+    })
+
+
+def instante_da_consulta(date, time):
+    """
+    Converte a data/hora informadas na consulta (formato do portal) em datetime com fuso.
+    """
+    texto = f"{date.strip()} {time.strip()}"
+    for formato in FORMATOS_INSTANTE:
+        try:
+            return datetime.strptime(texto, formato).replace(tzinfo=fuso_syslog())
+        except ValueError:
+            continue
+    raise ValueError(f"Data/hora '{texto}' em formato não reconhecido")
+
+
+def mapear_colunas(colunas):
+    """
+    Coluna do resultado correspondente a cada campo de COLUNAS, ignorando
+    acentos, maiúsculas e pontuação nos nomes.
+    """
+    normalizadas = {_normalizar_coluna(coluna): coluna for coluna in colunas}
+    mapa = {}
+    for campo, nomes in COLUNAS.items():
+        for nome in nomes:
+            if nome in normalizadas and normalizadas[nome] not in mapa.values():
+                mapa[campo] = normalizadas[nome]
+                break
+    return mapa
+
+
+def _instantes(df, coluna, coluna_hora=None):
+    import pandas as pd
+
+    valores = df[coluna].astype("string")
+    if coluna_hora:
+        valores = valores.str.cat(df[coluna_hora].astype("string"), sep=" ", na_rep="")
+    instantes = pd.to_datetime(valores, dayfirst=True, errors="coerce")
+    if instantes.dt.tz is None:
+        instantes = instantes.dt.tz_localize(fuso_syslog(), ambiguous="NaT", nonexistent="NaT")
+    return [None if pd.isna(instante) else instante.to_pydatetime() for instante in instantes]
+
+
+def _texto(valor):
+    return "" if valor is None else str(valor).strip()
+
+
+def _json(valor):
+    return valor if valor is None or isinstance(valor, (int, float, bool, str)) else str(valor)
+
+
+def _instante(instantes, indice, padrao=None):
+    if instantes is None or instantes[indice] is None:
+        return padrao
+    return instantes[indice]
+
+
+def ingerir(df, parametros):
+    """
+    Guarda as linhas de uma consulta ao portal como SyslogSession, em lotes com
+    bulk_create. Linhas sem IPv6 próprio usam o IPv6 consultado, e linhas sem
+    horário usam a data/hora da consulta. Retorna o número de linhas processadas.
+    """
+    if df is None or df.empty:
+        return 0
+
+    mapa = mapear_colunas(df.columns)
+    inicio = _instantes(df, mapa["inicio"], mapa.get("hora")) if "inicio" in mapa else None
+    fim = _instantes(df, mapa["fim"]) if "fim" in mapa else None
+    try:
+        instante_consulta = instante_da_consulta(parametros["date"], parametros["time"])
+    except (KeyError, ValueError):
+        instante_consulta = None
+
+    sessoes = []
+    for indice, linha in enumerate(df.astype(object).where(df.notna(), None).to_dict("records")):
+        ipv6 = str(linha.get(mapa.get("ipv6")) or parametros.get("ipv6", "")).strip()
+        try:
+            menor, maior = intervalo_ipv6(ipv6)
+        except ValueError:
+            logger.warning(f"Linha com IPv6 inválido ignorada: {ipv6!r}")
+            continue
+
+        sessao = SyslogSession(
+            username=_texto(linha.get(mapa.get("username"))),
+            ipv6=ipv6,
+            ipv6_inicio=hex128(menor),
+            ipv6_fim=hex128(maior),
+            inicio=_instante(inicio, indice, instante_consulta),
+            fim=_instante(fim, indice),
+            nas=_texto(linha.get(mapa.get("nas"))),
+            sessao=_texto(linha.get(mapa.get("sessao"))),
+            licenca=parametros.get("licenca", ""),
+            dados={str(chave): _json(valor) for chave, valor in linha.items()},
+        )
+        identidade = [sessao.licenca, sessao.username, sessao.ipv6, sessao.inicio and sessao.inicio.isoformat(),
+                      sessao.nas, sessao.sessao]
+        sessao.hash = hashlib.sha256(json.dumps(identidade).encode()).hexdigest()
+        sessoes.append(sessao)
+
+    SyslogSession.objects.bulk_create(sessoes, batch_size=_LOTE_BANCO, ignore_conflicts=True)
+    logger.info(f"{len(sessoes)} sessão(ões) do syslog guardada(s) para busca local")
+    return len(sessoes)
+
+
+def ingerir_com_seguranca(df, parametros):
+    """
+    `ingerir` para os caminhos de consulta: uma falha ao guardar as sessões
+    fica no log e nunca derruba a consulta.
+    """
+    try:
+        return ingerir(df, parametros)
+    except Exception as e:
+        logger.warning(f"Falha ao guardar sessões do syslog: {e}")
+        return 0
+
+
+def buscar(ipv6=None, username=None, licenca=None, instante=None, inicio=None, fim=None, limite=100):
+    """
+    Busca sessões guardadas. `ipv6` aceita endereço ou prefixo (sessões cujo
+    intervalo se sobrepõe ao informado); `instante` restringe às sessões ativas
+    naquele momento e `inicio`/`fim` às que se sobrepõem à janela. Sessões sem
+    fim valem até `janela_sem_fim()` depois do início.
+    """
+    janela = janela_sem_fim()
+    sessoes = SyslogSession.objects.all()
+    if ipv6:
+        sessoes = sessoes.filter(_sobrepoe(ipv6))
+    if username:
+        sessoes = sessoes.filter(username=username)
+    if licenca:
+        sessoes = sessoes.filter(licenca=licenca)
+    if instante:
+        sessoes = sessoes.filter(inicio__lte=instante).filter(
+            Q(fim__gte=instante) | Q(fim__isnull=True, inicio__gte=instante - janela)
+        )
+    if inicio:
+        sessoes = sessoes.filter(Q(fim__gte=inicio) | Q(fim__isnull=True, inicio__gte=inicio - janela))
+    if fim:
+        sessoes = sessoes.filter(inicio__lte=fim)
+    return list(sessoes.order_by("-inicio")[:limite])
+
+
+def _sobrepoe(ipv6):
+    # Prefixos se sobrepõem quando um contém o outro: os que contêm o informado
+    # (inícios conhecidos, ver inicios_dos_prefixos_que_contem) ou os contidos
+    # nele (início dentro da faixa). Ambos são buscas no índice por ipv6_inicio,
+    # ao contrário de "ipv6_inicio <= maior AND ipv6_fim >= menor", que varre a tabela
+    menor, maior = intervalo_ipv6(ipv6)
+    return (
+        Q(ipv6_inicio__in=inicios_dos_prefixos_que_contem(menor, maior), ipv6_fim__gte=hex128(maior))
+        | Q(ipv6_inicio__gte=hex128(menor), ipv6_inicio__lte=hex128(maior))
+    )
+
+
+def localizar(endereco, instante, licenca=None):
+    """
+    Sessão dona de `endereco` em `instante`: a do prefixo mais específico que o
+    contém e estava ativa naquele momento, ou None. Equivalente, no banco, ao
+    IndicePrefixos (ipv6_index) em memória.
+    """
+    menor, maior = intervalo_ipv6(endereco)
+    janela = janela_sem_fim()
+    sessoes = SyslogSession.objects.filter(
+        ipv6_inicio__in=inicios_dos_prefixos_que_contem(menor, maior),
+        ipv6_fim__gte=hex128(maior),
+        inicio__lte=instante,
+    ).filter(Q(fim__gte=instante) | Q(fim__isnull=True, inicio__gte=instante - janela))
+    if licenca:
+        sessoes = sessoes.filter(licenca=licenca)
+    return sessoes.order_by("-ipv6_inicio", "ipv6_fim", "-inicio").first()
@@ -1,3 +1,1006 @@
-from django.test import TestCase
+import os
+import csv
+import json
+import asyncio
+import time
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmarks.stubs import COLUNAS_CONSULTA, FakePortal, StubGraphQL
+
+from . import (
+    accounts, artifacts, batch, browser_pool, enrichment, enrichment_cache, export, jobs, metrics, portal, portal_async, portal_http,
+    page_profile, preload, query_cache, result_parser, session_store, sessions,
+)
+from .accounts import RODIZIO, Agendador, Conta, ContaDeslogada, ContaLimitada
+from .ipv6_index import IndicePrefixos
+from .models import Job, QueryResult, ResultArtifact, SubscriberProfile, SyslogSession
+from .serializers import ConsultarIpv6BatchSerializer
+
+
+def tarefa_lenta(job_id, segundos):
+    """
+    Tarefa de job usada nos testes: dorme e devolve o batimento_em visto no fim.
+    """
+    time.sleep(segundos)
+    return {"batimento_em": Job.objects.get(id=job_id).batimento_em.isoformat()}
+
+
+def tarefa_com_erro(job_id):
+    raise RuntimeError("falhou")
+
+
+class FilaDeJobsTests(TestCase):
+    def test_reserva_o_pendente_mais_antigo_uma_unica_vez(self):
+        primeiro = Job.objects.create(tipo="consulta")
+        segundo = Job.objects.create(tipo="consulta")
+
+        reservado = jobs._reservar_proximo()
+        self.assertEqual(reservado.id, primeiro.id)
+        self.assertEqual(reservado.status, Job.EXECUTANDO)
+        self.assertIsNotNone(reservado.iniciado_em)
+        self.assertEqual(jobs._reservar_proximo().id, segundo.id)
+        self.assertIsNone(jobs._reservar_proximo())
+
+    def test_devolve_para_a_fila_so_os_travados(self):
+        antigo = timezone.now() - timedelta(seconds=1000)
+        travado = Job.objects.create(tipo="consulta", status=Job.EXECUTANDO, iniciado_em=antigo)
+        vivo = Job.objects.create(tipo="consulta", status=Job.EXECUTANDO, iniciado_em=timezone.now())
+
+        with mock.patch.dict("os.environ", {"JOB_STALE_SECONDS": "900"}):
+            jobs._liberar_travados()
+
+        travado.refresh_from_db()
+        vivo.refresh_from_db()
+        self.assertEqual(travado.status, Job.PENDENTE)
+        self.assertIsNone(travado.iniciado_em)
+        self.assertEqual(vivo.status, Job.EXECUTANDO)
+        self.assertEqual(jobs._reservar_proximo().id, travado.id)
+
+    def test_job_antigo_com_batimento_recente_nao_e_travado(self):
+        antigo = timezone.now() - timedelta(seconds=1000)
+        longo = Job.objects.create(
+            tipo="lote", status=Job.EXECUTANDO, iniciado_em=antigo, batimento_em=timezone.now()
+        )
+
+        with mock.patch.dict("os.environ", {"JOB_STALE_SECONDS": "900"}):
+            jobs._liberar_travados()
+
+        longo.refresh_from_db()
+        self.assertEqual(longo.status, Job.EXECUTANDO)
+        self.assertEqual(longo.iniciado_em, antigo)
+
+    def test_varredura_periodica_respeita_o_intervalo(self):
+        with mock.patch.object(jobs, "_proxima_varredura", 0.0), \
+                mock.patch.object(jobs, "_liberar_travados") as liberar:
+            jobs._varrer_travados()
+            jobs._varrer_travados()
+        self.assertEqual(liberar.call_count, 1)
+
+    def test_erro_da_tarefa_fica_no_job(self):
+        job = Job.objects.create(tipo="teste", status=Job.EXECUTANDO, iniciado_em=timezone.now())
+        with mock.patch.dict(jobs.TAREFAS, {"teste": "api.tests.tarefa_com_erro"}):
+            jobs.executar_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.ERRO)
+        self.assertEqual(job.erro, "falhou")
+        self.assertIsNotNone(job.concluido_em)
+
+
+class BatimentoDeJobsTests(TransactionTestCase):
+    def test_job_longo_renova_o_batimento_e_mantem_o_inicio(self):
+        Job.objects.create(tipo="teste", parametros={"segundos": 1.2})
+        job = jobs._reservar_proximo()
+        reservado_em = job.iniciado_em
+
+        with mock.patch.dict(jobs.TAREFAS, {"teste": "api.tests.tarefa_lenta"}), \
+                mock.patch.dict("os.environ", {"JOB_STALE_SECONDS": "1"}):
+            jobs.executar_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.CONCLUIDO)
+        self.assertEqual(job.iniciado_em, reservado_em)
+        self.assertGreater(job.resultado["batimento_em"], reservado_em.isoformat())
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_chamadas_simultaneas_executam_uma_vez(self):
+        liberar = threading.Event()
+        chamadas = []
+
+        def consulta():
+            chamadas.append(1)
+            liberar.wait(5)
+            return {"linhas": 3}
+
+        resultados = []
+        threads = [
+            threading.Thread(target=lambda: resultados.append(query_cache.executar_uma_vez("chave", consulta)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        liberar.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(chamadas), 1)
+        self.assertEqual(resultados, [{"linhas": 3}] * 5)
+        self.assertNotIn("chave", query_cache._em_andamento)
+
+    def test_erro_chega_a_todos_e_libera_a_chave(self):
+        def consulta():
+            raise ValueError("portal fora do ar")
+
+        with self.assertRaises(ValueError):
+            query_cache.executar_uma_vez("chave", consulta)
+        self.assertEqual(query_cache.executar_uma_vez("chave", lambda: "ok"), "ok")
+
+
+class AgrupamentoDeConsultasTests(TestCase):
+    PARAMETROS = {"date": "01/01/2024", "time": "10:00", "ipv6": "2001:DB8:0:0::1", "licenca": "acme", "excel": False}
+
+    @mock.patch.object(jobs, "iniciar_workers")
+    def test_consultas_equivalentes_usam_o_mesmo_job(self, _):
+        primeiro = query_cache.enfileirar_consulta(self.PARAMETROS)
+        segundo = query_cache.enfileirar_consulta({**self.PARAMETROS, "ipv6": " 2001:db8::1 "})
+
+        self.assertEqual(primeiro.id, segundo.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    @mock.patch.object(jobs, "iniciar_workers")
+    def test_pedido_de_excel_nao_e_agrupado_a_job_sem_excel(self, _):
+        sem_excel = query_cache.enfileirar_consulta(self.PARAMETROS)
+        com_excel = query_cache.enfileirar_consulta({**self.PARAMETROS, "excel": True})
+
+        self.assertNotEqual(sem_excel.id, com_excel.id)
+        self.assertEqual(query_cache.enfileirar_consulta(self.PARAMETROS).id, sem_excel.id)
+        Job.objects.filter(id=sem_excel.id).update(status=Job.CONCLUIDO)
+        self.assertEqual(query_cache.enfileirar_consulta(self.PARAMETROS).id, com_excel.id)
+
+    @mock.patch.object(jobs, "iniciar_workers")
+    def test_consulta_em_cache_gera_job_concluido(self, _):
+        QueryResult.objects.create(
+            chave=query_cache.chave(self.PARAMETROS),
+            linhas=[{"Usuário": "cliente1"}],
+            expira_em=timezone.now() + timedelta(minutes=5),
+        )
+        job = query_cache.enfileirar_consulta(self.PARAMETROS)
+
+        self.assertEqual(job.status, Job.CONCLUIDO)
+        self.assertTrue(job.resultado["cache"])
+
+
+class EnrichmentClientTests(SimpleTestCase):
+    def setUp(self):
+        self.graphql = StubGraphQL(latencia=0, desconhecidos=0).iniciar()
+        self.addCleanup(self.graphql.encerrar)
+
+    def cliente(self, **opcoes):
+        return enrichment.EnrichmentClient(self.graphql.url, "teste", **{"taxa": 0, **opcoes})
+
+    def test_retenta_429_e_5xx(self):
+        self.graphql.erros = [429, 503]
+        conexoes = self.cliente(max_retries=3).buscar(["cliente1", "cliente2"])
+
+        self.assertEqual(sorted(conexao["username"] for conexao in conexoes), ["cliente1", "cliente2"])
+        self.assertEqual(self.graphql.requisicoes, 3)
+
+    def test_desiste_depois_das_retentativas(self):
+        self.graphql.erros = [503, 503, 503]
+
+        self.assertIsNone(self.cliente(max_retries=1).buscar(["cliente1"]))
+        self.assertEqual(self.graphql.requisicoes, 2)
+
+    def test_respeita_o_limite_de_taxa(self):
+        cliente = self.cliente(taxa=20, rajada=1, concorrencia=4)
+        inicio = time.perf_counter()
+        resultados = [resultado for _, resultado in cliente.buscar_em_lotes([[f"cliente{i}"] for i in range(5)])]
+
+        # Um token na partida e mais quatro, a 20 por segundo
+        self.assertGreaterEqual(time.perf_counter() - inicio, 0.19)
+        self.assertEqual(len(resultados), 5)
+        self.assertTrue(all(resultados))
+
+    def test_devolve_cada_lote_assim_que_termina(self):
+        cliente = self.cliente(concorrencia=2)
+        buscar = cliente.buscar
+
+        def buscar_com_um_lento(usernames):
+            if usernames == ["lento"]:
+                time.sleep(0.5)
+            return buscar(usernames)
+
+        cliente.buscar = buscar_com_um_lento
+        resultados = list(cliente.buscar_em_lotes([["lento"], ["cliente1"], ["cliente2"]]))
+
+        self.assertEqual([lote for lote, _ in resultados], [["cliente1"], ["cliente2"], ["lento"]])
+        self.assertTrue(all(resultado[0]["username"] == lote[0] for lote, resultado in resultados))
+
+
+class CacheDeAssinantesTests(TestCase):
+    def setUp(self):
+        self.agora = timezone.now()
+        patcher = mock.patch.object(enrichment_cache.timezone, "now", lambda: self.agora)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_entradas_expiram_pelo_ttl_e_as_negativas_antes(self):
+        cache = enrichment_cache.SubscriberCache(max_itens=10, ttl=60, ttl_negativo=10)
+        cache.guardar_muitos({"cliente1": {"plano": "fibra"}}, desconhecidos=["fantasma"])
+
+        self.assertEqual(
+            cache.obter_muitos(["cliente1", "fantasma", "novo"]),
+            {"cliente1": {"plano": "fibra"}, "fantasma": enrichment_cache.DESCONHECIDO},
+        )
+
+        self.agora += timedelta(seconds=30)
+        self.assertEqual(cache.obter_muitos(["cliente1", "fantasma"]), {"cliente1": {"plano": "fibra"}})
+
+        self.agora += timedelta(seconds=31)
+        self.assertEqual(cache.obter_muitos(["cliente1", "fantasma"]), {})
+        self.assertEqual(cache.estatisticas()["negativos"], 1)
+
+    def test_memoria_descarta_o_menos_usado_e_o_banco_repoe(self):
+        cache = enrichment_cache.SubscriberCache(max_itens=2, ttl=60, ttl_negativo=10)
+        cache.guardar_muitos({"a": {"n": 1}, "b": {"n": 2}})
+        cache.obter_muitos(["a"])
+        cache.guardar_muitos({"c": {"n": 3}})
+
+        self.assertEqual(list(cache._memoria), ["a", "c"])
+
+        self.assertEqual(cache.obter_muitos(["b"]), {"b": {"n": 2}})
+        self.assertEqual(list(cache._memoria), ["c", "b"])
+        self.assertEqual(cache.contadores["hits_banco"], 1)
+
+    def test_entrada_do_banco_sobe_para_a_memoria(self):
+        enrichment_cache.SubscriberCache(max_itens=10, ttl=60, ttl_negativo=10).guardar_muitos(
+            {"cliente1": {"plano": "fibra"}}, desconhecidos=["fantasma"]
+        )
+        # Outro processo: memória vazia, mesmo banco
+        cache = enrichment_cache.SubscriberCache(max_itens=10, ttl=60, ttl_negativo=10)
+
+        cache.obter_muitos(["cliente1", "fantasma"])
+        cache.obter_muitos(["cliente1", "fantasma"])
+
+        self.assertEqual(cache.contadores["hits_banco"], 2)
+        self.assertEqual(cache.contadores["hits_memoria"], 2)
+        self.assertIs(cache._memoria["fantasma"][0], enrichment_cache.DESCONHECIDO)
+
+
+class EnriquecimentoTestCase(TestCase):
+    """
+    Cliente GraphQL e cache de assinantes novos, apontados para o stub local.
+    """
+
+    ambiente = {}
+
+    def setUp(self):
+        self.graphql = StubGraphQL(latencia=0, desconhecidos=0).iniciar()
+        self.addCleanup(self.graphql.encerrar)
+        for patcher in (
+            mock.patch.dict("os.environ", {
+                "API_URL": self.graphql.url, "API_AUTH_TOKEN": "teste", "ENRICHMENT_RATE_LIMIT": "0",
+                "ENRICHMENT_MAX_RETRIES": "0", **self.ambiente,
+            }),
+            mock.patch.object(enrichment, "_client", None),
+            mock.patch.object(enrichment_cache, "_cache", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class EnriquecerTests(EnriquecimentoTestCase):
+    def test_logins_numericos(self):
+        df = pd.DataFrame({"Usuário": [12345, 678, 12345], "IPv6": ["2001:db8::1", "2001:db8::2", "2001:db8::3"]})
+
+        enriquecido = enrichment.enriquecer(df)
+
+        self.assertEqual(enriquecido["Nome"].tolist(), ["Assinante 12345", "Assinante 678", "Assinante 12345"])
+
+    def test_logins_numericos_com_celulas_vazias(self):
+        df = pd.DataFrame({"Usuário": [12345.0, None, 99.0]})
+
+        enriquecido = enrichment.enriquecer(df)
+
+        self.assertEqual(enriquecido["Nome"].tolist(), ["Assinante 12345", "", "Assinante 99"])
+
+
+class LotesDeEnriquecimentoTests(EnriquecimentoTestCase):
+    ambiente = {"ENRICHMENT_BATCH_SIZE": "1", "ENRICHMENT_CONCURRENCY": "1"}
+
+    def test_lote_que_falhou_e_buscado_de_novo(self):
+        self.graphql.erros = [500]
+        df = pd.DataFrame({"Usuário": ["cliente1"]})
+
+        self.assertEqual(enrichment.enriquecer(df)["Nome"].tolist(), [""])
+        self.assertEqual(enrichment.enriquecer(df)["Nome"].tolist(), ["Assinante cliente1"])
+        self.assertEqual(self.graphql.requisicoes, 2)
+
+    def test_lote_lento_nao_segura_os_ja_concluidos(self):
+        cliente = enrichment.get_enrichment_client()
+        cliente.concorrencia = 2
+
+        def buscar(usernames):
+            if usernames == ["cliente1"]:
+                time.sleep(0.5)
+                raise RuntimeError("processo interrompido")
+            return enrichment.EnrichmentClient.buscar(cliente, usernames)
+
+        with mock.patch.object(cliente, "buscar", buscar), self.assertRaises(RuntimeError):
+            enrichment.enriquecer(pd.DataFrame({"Usuário": ["cliente1", "cliente2", "cliente3"]}))
+
+        self.assertEqual(
+            sorted(SubscriberProfile.objects.values_list("username", flat=True)), ["cliente2", "cliente3"]
+        )
+
+    def test_lotes_concluidos_ficam_no_cache(self):
+        self.graphql.erros = [0, 0, 500]
+        df = pd.DataFrame({"Usuário": ["cliente1", "cliente2", "cliente3"]})
+
+        enrichment.enriquecer(df)
+
+        self.assertEqual(
+            sorted(SubscriberProfile.objects.values_list("username", flat=True)), ["cliente1", "cliente2"]
+        )
+        enriquecido = enrichment.enriquecer(df)
+        self.assertEqual(enriquecido["Nome"].tolist(), [f"Assinante cliente{i}" for i in (1, 2, 3)])
+        self.assertEqual(self.graphql.requisicoes, 4)
+
+
+class ExportacaoEmBlocosTests(EnriquecimentoTestCase):
+    ambiente = {"EXPORT_CHUNK_SIZE": "2"}
+
+    def exportacao(self, quantidade):
+        """
+        Planilha no formato da exportação do portal: título, cabeçalho e as linhas.
+        """
+        workbook = Workbook(write_only=True)
+        planilha = workbook.create_sheet()
+        planilha.append(["Consulta de autenticação"])
+        planilha.append(COLUNAS_CONSULTA)
+        for i in range(quantidade):
+            planilha.append(["01/01/2024", "10:00:00", f"cliente{i}", "2804:14c::1", "nas1", str(i)])
+        caminho = os.path.join(tempfile.mkdtemp(), "consulta.xlsx")
+        self.addCleanup(os.remove, caminho)
+        workbook.save(caminho)
+        return caminho
+
+    def linhas_do_csv(self, origem):
+        conteudo = "".join(export.stream_csv(origem))
+        self.assertTrue(conteudo.startswith("\ufeff"))
+        return list(csv.reader(conteudo[1:].splitlines()))
+
+    def test_csv_tem_um_cabecalho_e_todas_as_linhas_dos_blocos(self):
+        linhas = self.linhas_do_csv(self.exportacao(5))
+
+        self.assertEqual(linhas[0], COLUNAS_CONSULTA + enrichment.NOVAS_COLUNAS)
+        self.assertEqual([linha[2] for linha in linhas[1:]], [f"cliente{i}" for i in range(5)])
+        self.assertTrue(all(linha[len(COLUNAS_CONSULTA)] for linha in linhas[1:]))
+
+    def test_xlsx_tem_um_cabecalho_e_todas_as_linhas_dos_blocos(self):
+        with export.write_xlsx(self.exportacao(5)) as arquivo:
+            linhas = list(load_workbook(arquivo, read_only=True).active.iter_rows(values_only=True))
+
+        self.assertEqual(list(linhas[0]), COLUNAS_CONSULTA + enrichment.NOVAS_COLUNAS)
+        self.assertEqual([linha[2] for linha in linhas[1:]], [f"cliente{i}" for i in range(5)])
+
+    def test_exportacao_vazia_ainda_tem_cabecalho(self):
+        cabecalho = COLUNAS_CONSULTA + enrichment.NOVAS_COLUNAS
+
+        self.assertEqual(self.linhas_do_csv(self.exportacao(0)), [cabecalho])
+        self.assertEqual(self.linhas_do_csv(pd.DataFrame(columns=COLUNAS_CONSULTA)), [cabecalho])
+        with export.write_xlsx(self.exportacao(0)) as arquivo:
+            linhas = list(load_workbook(arquivo, read_only=True).active.iter_rows(values_only=True))
+        self.assertEqual([list(linha) for linha in linhas], [cabecalho])
+
+
+def usar_portal_falso(caso, **opcoes):
+    """
+    Inicia um FakePortal e aponta para ele as URLs do portal e a pasta de sessões até o fim do teste.
+    """
+    falso = FakePortal(latencia=0, **opcoes).iniciar()
+    caso.addCleanup(falso.encerrar)
+    sessoes = tempfile.TemporaryDirectory()
+    caso.addCleanup(sessoes.cleanup)
+    for patcher in (
+        mock.patch.dict("os.environ", {"LOGIN_URL": falso.login_url, "SESSION_CACHE_DIR": sessoes.name}),
+        mock.patch.object(portal, "DASHBOARD_URL", f"{falso.base_url}/dashboard"),
+        mock.patch.object(portal, "CONSULTAR_URL", f"{falso.base_url}/ncsyslog_v6/consultar"),
+    ):
+        patcher.start()
+        caso.addCleanup(patcher.stop)
+    return falso
+
+
+class PortalHttpTests(SimpleTestCase):
+    def setUp(self):
+        self.portal = usar_portal_falso(self, por_conta=1, rejeitar_excedentes=True)
+
+    def cliente(self, senha="bench"):
+        return portal_http.PortalHttpClient(Conta("teste", "bench", senha))
+
+    def test_descobre_o_formulario_e_le_o_resultado(self):
+        cliente = self.cliente()
+        df = cliente.consultar("01/01/2024", "10:00", "2001:db8::1", "acme")
+
+        registros = self.portal.registros("01/01/2024", "10:00", "2001:db8::1")
+        self.assertEqual(len(df), 20)
+        self.assertEqual(df["Usuário"].tolist(), [registro["Usuário"] for registro in registros])
+        cliente.consultar("01/01/2024", "10:05", "2001:db8::1", "acme")
+        self.assertEqual(self.portal.logins, 1)
+        self.assertEqual(self.portal.consultas, 2)
+
+    def test_senha_errada_desloga_a_conta(self):
+        with self.assertRaises(ContaDeslogada):
+            self.cliente(senha="errada").consultar("01/01/2024", "10:00", "2001:db8::1", "acme")
+
+    def test_consulta_excedente_limita_a_conta(self):
+        self.portal._semaforos["bench"].acquire()
+        self.addCleanup(self.portal._semaforos["bench"].release)
+
+        with self.assertRaises(ContaLimitada):
+            self.cliente().consultar("01/01/2024", "10:00", "2001:db8::1", "acme")
+
+    def test_licenca_desconhecida(self):
+        with self.assertRaisesMessage(ValueError, "Radius outra"):
+            self.cliente().consultar("01/01/2024", "10:00", "2001:db8::1", "outra")
+
+
+class ColunasDaConsultaTests(SimpleTestCase):
+    def test_resposta_json_ganha_os_cabecalhos_da_exportacao(self):
+        conteudo = b'{"data": [{"username": "cliente1", "framed_ipv6_prefix": "2001:db8::/56", "nas_ip": "10.0.0.1"}]}'
+
+        df = result_parser.parse_consulta(conteudo, "application/json")
+
+        self.assertEqual(df.columns.tolist(), ["Usuário", "IPv6", "NAS"])
+
+    def test_tabela_html_com_login(self):
+        conteudo = "<table><tr><th>Login</th><th>Sessão</th></tr><tr><td>cliente1</td><td>abc</td></tr></table>"
+
+        df = result_parser.parse_consulta(conteudo, "text/html")
+
+        self.assertEqual(df.to_dict("records"), [{"Usuário": "cliente1", "Sessão": "abc"}])
+
+
+class RelatorioDeConsultaSemExcelTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("teste"))
+
+    def relatorio(self, linhas):
+        job = Job.objects.create(tipo="consulta", status=Job.CONCLUIDO, chave="chave", resultado={"linhas": len(linhas)})
+        QueryResult.objects.create(chave="chave", linhas=linhas, expira_em=timezone.now() + timedelta(minutes=5))
+        return self.client.get(reverse("relatorio_ipv6"), {"job_id": str(job.id)})
+
+    def test_linhas_sem_coluna_de_usuario(self):
+        resposta = self.relatorio([{"IPv6": "2001:db8::1", "NAS": "bng-0"}])
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn("job_id", resposta.json())
+
+    def test_consulta_sem_linhas(self):
+        self.assertEqual(self.relatorio([]).status_code, 404)
+
+    def test_sem_identificador_nao_devolve_a_exportacao_mais_recente(self):
+        ResultArtifact.objects.create(tipo=ResultArtifact.EXPORTACAO, caminho=__file__, tamanho=1, sha256="0" * 64)
+
+        resposta = self.client.get(reverse("relatorio_ipv6"))
+
+        self.assertEqual(resposta.status_code, 400)
+        self.assertIn("job_id", resposta.json())
+
+
+class ColetaDeResultadosTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        for patcher in (
+            mock.patch.dict("os.environ", {"RESULTS_DIR": pasta.name}),
+            # Sem coleta automática durante o armazenamento
+            mock.patch.object(artifacts, "_ultima_coleta", time.monotonic()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def armazenar(self, conteudo, dias_atras=0):
+        caminho = artifacts.novo_temporario()
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(conteudo)
+        artefato = artifacts.armazenar(caminho, ResultArtifact.EXPORTACAO)
+        ResultArtifact.objects.filter(id=artefato.id).update(criado_em=timezone.now() - timedelta(days=dias_atras))
+        return artefato
+
+    def test_arquivo_compartilhado_so_sai_com_o_ultimo_registro(self):
+        antigo = self.armazenar(b"mesmo conteudo", dias_atras=10)
+        recente = self.armazenar(b"mesmo conteudo")
+        self.assertEqual(antigo.caminho, recente.caminho)
+
+        self.assertEqual(artifacts.coletar_lixo(max_dias=7, max_mb=100), 1)
+        self.assertTrue(os.path.exists(recente.caminho))
+
+        ResultArtifact.objects.filter(id=recente.id).update(criado_em=timezone.now() - timedelta(days=10))
+        self.assertEqual(artifacts.coletar_lixo(max_dias=7, max_mb=100), 1)
+        self.assertFalse(os.path.exists(recente.caminho))
+
+    def test_limite_de_tamanho_remove_os_mais_antigos(self):
+        artefatos = [self.armazenar(bytes([i]) * 1000, dias_atras=3 - i) for i in range(3)]
+
+        # Cabem dois arquivos de 1000 bytes em 0,002 MB
+        self.assertEqual(artifacts.coletar_lixo(max_dias=7, max_mb=0.002), 1)
+
+        self.assertEqual(set(ResultArtifact.objects.values_list("id", flat=True)), {a.id for a in artefatos[1:]})
+        self.assertFalse(os.path.exists(artefatos[0].caminho))
+        self.assertTrue(all(os.path.exists(a.caminho) for a in artefatos[1:]))
+
+    def test_comando_limpar_resultados(self):
+        self.armazenar(b"antigo", dias_atras=10)
+        self.armazenar(b"recente")
+        abandonado = artifacts.novo_temporario()
+        Path(abandonado).touch()
+        dez_dias_atras = time.time() - 10 * 86400
+        os.utime(abandonado, (dez_dias_atras, dez_dias_atras))
+
+        saida = StringIO()
+        call_command("limpar_resultados", max_dias=7, stdout=saida)
+
+        self.assertIn("1 resultado(s) removido(s)", saida.getvalue())
+        self.assertEqual(ResultArtifact.objects.count(), 1)
+        self.assertFalse(os.path.exists(abandonado))
+
+
+class ContextoFalso:
+    def __init__(self):
+        self.cookies = []
+
+    def add_cookies(self, cookies):
+        self.cookies += cookies
+
+    def storage_state(self, path):
+        with open(path, "w") as arquivo:
+            json.dump({"cookies": self.cookies, "origins": []}, arquivo)
+
+
+class PaginaFalsa:
+    """
+    Página que só chega ao dashboard com o cookie de sessão no contexto.
+    """
+
+    def __init__(self, barreira=None):
+        self.context = ContextoFalso()
+        self.url = ""
+        self.barreira = barreira
+
+    def goto(self, url):
+        if self.barreira:
+            # Os dois workers encontram a sessão expirada antes de qualquer login
+            self.barreira.wait()
+            self.barreira = None
+        autenticada = any(cookie["name"] == "sessao" for cookie in self.context.cookies)
+        self.url = url if autenticada else "https://portal.test/login"
+
+
+class SessaoEmCacheTests(SimpleTestCase):
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.conta = Conta("teste", "bench", "bench")
+        self.login = mock.Mock(side_effect=self.logar)
+        for patcher in (
+            mock.patch.dict("os.environ", {"SESSION_CACHE_DIR": pasta.name}),
+            mock.patch.object(portal, "DASHBOARD_URL", "https://portal.test/dashboard"),
+            mock.patch.object(portal, "login", self.login),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def logar(page, conta):
+        time.sleep(0.2)
+        page.context.add_cookies([{"name": "sessao", "value": conta.nome}])
+        page.url = portal.DASHBOARD_URL
+
+    def test_sessao_valida_nao_faz_login(self):
+        page = PaginaFalsa()
+        page.context.add_cookies([{"name": "sessao", "value": "teste"}])
+
+        session_store.garantir_sessao(page, self.conta)
+
+        self.login.assert_not_called()
+        self.assertIsNone(session_store.storage_state(self.conta))
+
+    def test_login_salva_o_storage_state_para_os_proximos_contextos(self):
+        session_store.garantir_sessao(PaginaFalsa(), self.conta)
+
+        self.login.assert_called_once()
+        self.assertEqual(session_store.carregar_cookies(self.conta), [{"name": "sessao", "value": "teste"}])
+
+    def test_workers_concorrentes_fazem_um_unico_login(self):
+        barreira = threading.Barrier(2)
+        paginas = [PaginaFalsa(barreira), PaginaFalsa(barreira)]
+        threads = [threading.Thread(target=session_store.garantir_sessao, args=(page, self.conta)) for page in paginas]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # O segundo worker espera o login_lock e reaproveita a sessão salva pelo primeiro
+        self.login.assert_called_once()
+        self.assertTrue(all(page.url == portal.DASHBOARD_URL for page in paginas))
+
+
+class LoginRecusadoTests(SimpleTestCase):
+    def test_login_no_navegador_que_nao_sai_da_pagina_de_login(self):
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        page = mock.Mock(url="https://portal.example/login")
+        page.wait_for_url.side_effect = PlaywrightTimeoutError("Timeout 30000ms exceeded")
+
+        with self.assertRaises(ContaDeslogada):
+            portal.login(page, Conta("teste", "bench", "errada"))
+
+    def test_agendador_refaz_com_outra_conta_e_pausa_a_deslogada(self):
+        primeira, segunda = Conta("primeira", "a", "a"), Conta("segunda", "b", "b")
+        agendador = Agendador([primeira, segunda], estrategia=RODIZIO)
+
+        def consulta(conta):
+            if conta is primeira:
+                raise portal.falha_de_login(conta, "https://portal.example/login")
+            return "ok"
+
+        self.assertEqual(agendador.executar(consulta), (segunda, "ok"))
+        self.assertFalse(primeira.disponivel(time.monotonic()))
+        self.assertEqual(primeira.motivo_pausa, "deslogada")
+
+
+class ConsultaAssincronaTests(TestCase):
+    def test_fora_do_asgi_responde_501(self):
+        resposta = self.client.post(reverse("consultar_ipv6_async"), {})
+
+        self.assertEqual(resposta.status_code, 501)
+
+    @mock.patch.object(portal_async, "AsyncBrowserEngine")
+    def test_descarta_engines_de_loops_encerrados(self, engine):
+        encerrado = asyncio.new_event_loop()
+        encerrado.close()
+
+        with mock.patch.dict(portal_async._engines, {encerrado: mock.Mock()}, clear=True):
+            asyncio.run(self._obter_engine())
+            self.assertNotIn(encerrado, portal_async._engines)
+            self.assertEqual(len(portal_async._engines), 1)
+
+    async def _obter_engine(self):
+        portal_async.get_async_engine()
+
+
+class SlotFalso:
+    def __init__(self, nome, max_usos, max_memoria_mb):
+        self.nome = nome
+
+    def executar(self, funcao, conta):
+        return funcao(self.nome)
+
+    def fechar(self):
+        pass
+
+
+@mock.patch.object(browser_pool, "BrowserSlot", SlotFalso)
+class PoolDeNavegadoresTests(SimpleTestCase):
+    def test_lotes_deixam_um_navegador_para_consultas_avulsas(self):
+        pool = browser_pool.BrowserPool(tamanho=2, max_usos=50, max_memoria_mb=1024, checkout_timeout=1)
+        liberar = threading.Event()
+        executados = []
+
+        def consulta_de_lote(slot):
+            executados.append(slot)
+            liberar.wait(5)
+
+        lotes = [
+            threading.Thread(target=pool.executar, args=(consulta_de_lote, None), kwargs={"lote": True})
+            for _ in range(2)
+        ]
+        for thread in lotes:
+            thread.start()
+        time.sleep(0.2)
+
+        # O segundo lote espera a vaga, e a consulta avulsa usa o navegador que sobrou
+        self.assertEqual(len(executados), 1)
+        self.assertEqual(pool.executar(lambda slot: slot, None), "browser-1")
+
+        liberar.set()
+        for thread in lotes:
+            thread.join(5)
+        self.assertEqual(len(executados), 2)
+
+
+class LoteTests(TransactionTestCase):
+    ITEM = {"date": "01/01/2024", "time": "10:00", "licenca": "acme", "engine": "http"}
+
+    def setUp(self):
+        self.portal = usar_portal_falso(self)
+        resultados = tempfile.TemporaryDirectory()
+        self.addCleanup(resultados.cleanup)
+        self.pool = mock.Mock(vagas_lote=1)
+        self.pool.executar.side_effect = RuntimeError("Executable doesn't exist")
+        for patcher in (
+            mock.patch.dict("os.environ", {"RESULTS_DIR": resultados.name}),
+            mock.patch.object(accounts, "_agendador", Agendador([Conta("teste", "bench", "bench")])),
+            mock.patch.dict(portal_http._clients, clear=True),
+            mock.patch.object(batch, "get_browser_pool", return_value=self.pool),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_falha_do_navegador_nao_descarta_os_itens_concluidos(self):
+        itens = [
+            {**self.ITEM, "ipv6": "2001:db8::1"},
+            {**self.ITEM, "ipv6": "2001:db8::2", "licenca": "outra"},  # O HTTP falha e o item vai para o navegador
+            {**self.ITEM, "ipv6": "2001:db8::3"},
+        ]
+        job = Job.objects.create(tipo="lote", status=Job.EXECUTANDO)
+
+        resultado = batch.executar_lote(job.id, itens)
+
+        job.refresh_from_db()
+        self.assertEqual(resultado["concluidos"], 2)
+        self.assertEqual([item["status"] for item in job.progresso["itens"]], [Job.CONCLUIDO, Job.ERRO, Job.CONCLUIDO])
+        self.assertIn("Executable doesn't exist", job.progresso["itens"][1]["erro"])
+        planilha = pd.read_excel(resultado["file"], header=1)
+        self.assertEqual(len(planilha), 2 * self.portal.linhas)
+        self.assertEqual(set(planilha["IPv6 Consultado"]), {"2001:db8::1", "2001:db8::3"})
+
+    def test_itens_em_cache_nao_vao_ao_portal(self):
+        item = {**self.ITEM, "ipv6": "2001:db8::1"}
+        primeiro = Job.objects.create(tipo="lote", status=Job.EXECUTANDO)
+        segundo = Job.objects.create(tipo="lote", status=Job.EXECUTANDO)
+
+        batch.executar_lote(primeiro.id, [item])
+        resultado = batch.executar_lote(segundo.id, [item, item])
+
+        self.assertEqual(resultado["concluidos"], 2)
+        self.assertEqual(self.portal.consultas, 1)
+        self.assertEqual(resultado["por_conta"], {})
+        self.pool.executar.assert_not_called()
+
+    def test_excel_por_item_e_recusado(self):
+        serializer = ConsultarIpv6BatchSerializer(data={"itens": [{**self.ITEM, "ipv6": "2001:db8::1", "excel": True}]})
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("excel", serializer.errors["itens"][0])
+
+
+class SessoesDoSyslogTests(TestCase):
+    parametros = {"date": "01/01/2024", "time": "10:00", "ipv6": "2001:db8:99::1", "licenca": "acme"}
+
+    def test_ingerir_mapeia_as_colunas_do_portal_e_nao_duplica(self):
+        df = pd.DataFrame([
+            ["01/01/2024", "08:30:00", "cliente1", "2001:db8:1::/64", "nas1", "s1"],
+            ["01/01/2024", "09:00:00", "cliente2", "2001:db8:2::/64", "nas2", "s2"],
+            ["01/01/2024", "09:30:00", "cliente3", "invalido", "nas3", "s3"],
+        ], columns=COLUNAS_CONSULTA)
+
+        self.assertEqual(sessions.ingerir(df, self.parametros), 2)
+        self.assertEqual(sessions.ingerir(df, self.parametros), 2)
+
+        self.assertEqual(SyslogSession.objects.count(), 2)
+        sessao = SyslogSession.objects.get(username="cliente1")
+        self.assertEqual(sessao.inicio, sessions.instante_da_consulta("01/01/2024", "08:30"))
+        self.assertEqual((sessao.nas, sessao.sessao, sessao.licenca), ("nas1", "s1", "acme"))
+        self.assertEqual(sessao.dados["IPv6"], "2001:db8:1::/64")
+
+    def test_linha_sem_ipv6_e_sem_horario_usa_os_da_consulta(self):
+        sessions.ingerir(pd.DataFrame([{"Usuário": "cliente1"}]), self.parametros)
+
+        sessao = SyslogSession.objects.get()
+        self.assertEqual(sessao.ipv6, "2001:db8:99::1")
+        self.assertEqual(sessao.inicio, sessions.instante_da_consulta("01/01/2024", "10:00"))
+
+    def test_buscar_filtra_por_prefixo_usuario_licenca_e_horario(self):
+        sessions.ingerir(pd.DataFrame([
+            {"Usuário": "empresa", "IPv6": "2001:db8:10::/48", "Início": "01/01/2024 08:00", "Fim": "01/01/2024 18:00"},
+            {"Usuário": "filial", "IPv6": "2001:db8:10:100::/56", "Início": "01/01/2024 09:00", "Fim": "01/01/2024 12:00"},
+            {"Usuário": "outro", "IPv6": "2001:db8:20::/64", "Início": "01/01/2024 08:00", "Fim": "01/01/2024 09:00"},
+        ]), self.parametros)
+        sessions.ingerir(pd.DataFrame([
+            {"Usuário": "empresa", "IPv6": "2001:db8:10::/48", "Início": "01/01/2024 08:00", "Fim": "01/01/2024 18:00"},
+        ]), {**self.parametros, "licenca": "outra"})
+
+        def usuarios(**filtros):
+            return sorted(sessao.username for sessao in sessions.buscar(**filtros))
+
+        instante = sessions.instante_da_consulta
+
+        # Sobreposição: o /48 contém o endereço e o /56 está contido no /48
+        self.assertEqual(usuarios(ipv6="2001:db8:10:1ab::1", licenca="acme"), ["empresa", "filial"])
+        self.assertEqual(usuarios(ipv6="2001:db8:10::/48", licenca="acme"), ["empresa", "filial"])
+        self.assertEqual(usuarios(ipv6="2001:db8:10::/48"), ["empresa", "empresa", "filial"])
+        self.assertEqual(usuarios(username="filial"), ["filial"])
+        self.assertEqual(usuarios(licenca="acme", instante=instante("01/01/2024", "13:00")), ["empresa"])
+        self.assertEqual(
+            usuarios(licenca="acme", inicio=instante("01/01/2024", "08:30"), fim=instante("01/01/2024", "08:45")),
+            ["empresa", "outro"],
+        )
+        self.assertEqual(len(sessions.buscar(limite=2)), 2)
+
+
+class LocalizarSessaoTests(TestCase):
+    def setUp(self):
+        sessions.ingerir(pd.DataFrame([
+            {"Usuário": "empresa", "IPv6": "2001:db8:10::/48", "Início": "01/01/2024 08:00", "Fim": "01/01/2024 18:00"},
+            {"Usuário": "filial", "IPv6": "2001:db8:10:100::/56", "Início": "01/01/2024 09:00", "Fim": "01/01/2024 12:00"},
+            {"Usuário": "vizinho1", "IPv6": "2001:db8:20::/64", "Início": "01/01/2024 08:00", "Fim": "01/01/2024 18:00"},
+            {"Usuário": "vizinho2", "IPv6": "2001:db8:20:2::/64", "Início": "01/01/2024 08:00", "Fim": "01/01/2024 18:00"},
+            {"Usuário": "sem_fim", "IPv6": "2001:db8:30::/64", "Início": "01/01/2024 08:00", "Fim": None},
+        ]), {"date": "01/01/2024", "time": "08:00", "licenca": "acme"})
+        self.indice = IndicePrefixos.do_banco()
+
+    def dona(self, endereco, date, time):
+        instante = sessions.instante_da_consulta(date, time)
+        sessao = sessions.localizar(endereco, instante)
+        # O índice em memória tem de concordar com a busca no banco
+        self.assertEqual(self.indice.localizar(endereco, instante), sessao and sessao.id)
+        return sessao and sessao.username
+
+    def test_prefixos_aninhados(self):
+        self.assertEqual(self.dona("2001:db8:10:1ab::1", "01/01/2024", "10:00"), "filial")
+        self.assertEqual(self.dona("2001:db8:10:200::1", "01/01/2024", "10:00"), "empresa")
+        # Fora do horário do /56, o /48 que o contém é o dono
+        self.assertEqual(self.dona("2001:db8:10:1ab::1", "01/01/2024", "13:00"), "empresa")
+
+    def test_endereco_entre_prefixos_irmaos(self):
+        self.assertEqual(self.dona("2001:db8:20:1::1", "01/01/2024", "10:00"), None)
+        self.assertEqual(self.dona("2001:db8:20:2::1", "01/01/2024", "10:00"), "vizinho2")
+
+    def test_sessao_sem_fim_vale_pela_janela(self):
+        with mock.patch.dict("os.environ", {"SYSLOG_SESSION_MAX_HOURS": "6"}):
+            self.indice = IndicePrefixos.do_banco()
+            self.assertEqual(self.dona("2001:db8:30::1", "01/01/2024", "13:59"), "sem_fim")
+            self.assertEqual(self.dona("2001:db8:30::1", "01/01/2024", "14:01"), None)
+            self.assertEqual(self.dona("2001:db8:30::1", "01/01/2024", "07:59"), None)
+
+    def test_busca_por_endereco_e_horario_devolve_so_a_dona(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("teste"))
+
+        resposta = client.get(reverse("sessoes"), {"ipv6": "2001:db8:10:1ab::1", "date": "01/01/2024", "time": "10:00"})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual([sessao["username"] for sessao in resposta.json()["sessoes"]], ["filial"])
+
+
+class SlotDeNavegadorTests(SimpleTestCase):
+    def setUp(self):
+        self.playwright = mock.Mock()
+        self.navegador = self.playwright.chromium.launch.return_value
+        self.navegador.is_connected.return_value = True
+        for patcher in (
+            mock.patch.object(browser_pool, "sync_playwright", return_value=mock.Mock(start=lambda: self.playwright)),
+            mock.patch.object(accounts, "_agendador", Agendador([Conta("padrao", "bench", "bench")])),
+            mock.patch.object(browser_pool.session_store, "storage_state", return_value=None),
+            mock.patch.object(browser_pool.session_store, "garantir_sessao"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.slot = browser_pool.BrowserSlot("browser-0", max_usos=50, max_memoria_mb=0)
+        self.addCleanup(self.slot.fechar)
+
+    def falhar_com(self, erro):
+        def funcao(context):
+            raise erro
+
+        with self.assertRaises(type(erro)):
+            self.slot.executar(funcao, accounts._agendador.contas[0], timeout=5)
+        # A próxima tarefa só roda depois do eventual reinício
+        self.slot.executar(lambda context: None, accounts._agendador.contas[0], timeout=5)
+
+    def test_conta_padrao_ja_autenticada_na_partida(self):
+        self.slot.executar(lambda context: None, accounts._agendador.contas[0], timeout=5)
+
+        self.navegador.new_context.assert_called_once()
+        browser_pool.session_store.garantir_sessao.assert_called_once()
+
+    def test_timeout_do_formulario_nao_reinicia_o_navegador(self):
+        from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+        self.falhar_com(PlaywrightTimeoutError("Timeout 30000ms exceeded"))
+        self.falhar_com(ValueError("Licença 'Radius outra' não encontrada"))
+
+        self.assertEqual(self.playwright.chromium.launch.call_count, 1)
+
+    def test_navegador_encerrado_e_reiniciado(self):
+        from playwright.sync_api import Error as PlaywrightError
+
+        self.falhar_com(PlaywrightError("Target page, context or browser has been closed"))
+
+        self.assertEqual(self.playwright.chromium.launch.call_count, 2)
+
+    @mock.patch("api.browser_pool.get_browser_pool")
+    def test_preload_do_browser_cria_o_pool(self, get_browser_pool):
+        preload.precarregar(["browser"])
+
+        get_browser_pool.assert_called_once()
+
+
+class MetricasTests(TestCase):
+    def test_soma_as_metricas_dos_workers(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+
+        def gravado_por(pid, consultas, paginas):
+            with open(os.path.join(pasta.name, f"{pid}.json"), "w") as arquivo:
+                json.dump({"pid": pid, "metricas": {
+                    "consultas_total": {"atualizado_em": 0, "amostras": [["consultas_total", '{engine="http"}', consultas]]},
+                    "paginas_abertas": {"atualizado_em": 0, "amostras": [["paginas_abertas", "", paginas]]},
+                }}, arquivo)
+
+        with mock.patch.object(metrics, "_registro", []), mock.patch.object(metrics, "DIRETORIO", pasta.name):
+            consultas = metrics.Counter("consultas_total", "Consultas", ["engine"])
+            paginas = metrics.Gauge("paginas_abertas", "Páginas abertas")
+            consultas.inc(engine="http")
+            paginas.set(2)
+            gravado_por(os.getppid(), consultas=4, paginas=7)
+            # Worker já encerrado: o contador continua somando, o gauge não
+            gravado_por(2 ** 30, consultas=3, paginas=5)
+
+            texto = metrics.expor()
+
+        self.assertIn('consultas_total{engine="http"} 8', texto)
+        self.assertIn("paginas_abertas 9", texto)
+
+    def test_sem_token_so_atende_localhost(self):
+        with mock.patch.dict("os.environ", {"METRICS_TOKEN": ""}):
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 200)
+            self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.5").status_code, 403)
+
+    def test_com_token_exige_o_cabecalho(self):
+        with mock.patch.dict("os.environ", {"METRICS_TOKEN": "segredo"}):
+            self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.5").status_code, 401)
+            resposta = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.5", HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn(b"job_queue_depth", resposta.content)
+
+
+class PoliticaDeRecursosTests(SimpleTestCase):
+    PORTAL = "https://tjsolutions.com.br/painel"
+
+    def bloqueadas(self, ambiente):
+        requisicoes = {
+            "portal_script": ("script", f"{self.PORTAL}/js/app.js"),
+            "portal_xhr": ("xhr", f"{self.PORTAL}/ncsyslog_v6/consultar"),
+            "login": ("document", "https://login.tjsolutions.com.br/login"),
+            "imagem": ("image", f"{self.PORTAL}/img/logo.png"),
+            "fonte": ("font", "https://fonts.gstatic.com/s/roboto.woff2"),
+            "jquery_cdn": ("script", "https://code.jquery.com/jquery-3.7.1.min.js"),
+            "select2_cdn": ("script", "https://cdn.jsdelivr.net/npm/select2/dist/js/select2.min.js"),
+            "analytics": ("script", "https://www.googletagmanager.com/gtag/js"),
+        }
+        with mock.patch.dict("os.environ", {"LOGIN_URL": "https://login.tjsolutions.com.br/login", **ambiente}), \
+                mock.patch.object(portal, "DASHBOARD_URL", f"{self.PORTAL}/dashboard"):
+            politica = page_profile.politica_recursos()
+        return {
+            nome for nome, (tipo, url) in requisicoes.items()
+            if politica.deve_bloquear(mock.Mock(resource_type=tipo, url=url))
+        }
+
+    def test_padrao_so_bloqueia_imagens_midia_e_fontes(self):
+        self.assertEqual(self.bloqueadas({}), {"imagem", "fonte"})
+
+    def test_bloqueio_de_terceiros_respeita_os_hosts_permitidos(self):
+        ambiente = {"PAGE_BLOCK_THIRD_PARTY": "true", "PAGE_ALLOWED_HOSTS": "code.jquery.com,jsdelivr.net"}
+
+        self.assertEqual(self.bloqueadas(ambiente), {"imagem", "fonte", "analytics"})
@@ -0,0 +1,45 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TimingProfile:
+    """
+    Registra a latência de cada etapa de uma requisição.
+    """
+
+    def __init__(self):
+        self.etapas = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nome):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            metrics.ETAPA_SEGUNDOS.observe(duracao, etapa=nome)
+            duracao_ms = round(duracao * 1000, 1)
+            # Etapas repetidas (ex.: vários itens de um lote) são acumuladas
+            with self._lock:
+                self.etapas[nome] = round(self.etapas.get(nome, 0) + duracao_ms, 1)
+            logger.info(f"Etapa '{nome}' concluída em {duracao_ms} ms")
+
+    def as_dict(self):
+        return {
+            "etapas_ms": dict(self.etapas),
+            "total_ms": round(sum(self.etapas.values()), 1),
+        }
+
+
+def etapa(perfil, nome):
+    """
+    Mede a etapa em `perfil`, ou não faz nada quando nenhum perfil é informado.
+    """
+    return perfil.etapa(nome) if perfil else nullcontext()
@@ -1,8 +1,17 @@
 from django.urls import path
-from .views import hello_world, consultar_ipv6, relatorio_ipv6
+from .views import (
+    hello_world, consultar_ipv6, consultar_ipv6_async, consultar_ipv6_batch, relatorio_ipv6, sessoes, contas, job_status, job_events, job_result,
+)
 
 urlpatterns = [
     path('hello-world/', hello_world, name='hello_world'),
     path('consultar-ipv6/', consultar_ipv6, name='consultar_ipv6'),
+    path('consultar-ipv6/async/', consultar_ipv6_async, name='consultar_ipv6_async'),
+    path('consultar-ipv6/batch/', consultar_ipv6_batch, name='consultar_ipv6_batch'),
     path('relatorio-ipv6/', relatorio_ipv6, name='relatorio_ipv6'),
+    path('sessoes/', sessoes, name='sessoes'),
+    path('contas/', contas, name='contas'),
+    path('jobs/<uuid:job_id>/', job_status, name='job_status'),
+    path('jobs/<uuid:job_id>/events/', job_events, name='job_events'),
+    path('jobs/<uuid:job_id>/result/', job_result, name='job_result'),
 ]
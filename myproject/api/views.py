@@ -1,22 +1,33 @@
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.renderers import JSONRenderer
 from drf_yasg.utils import swagger_auto_schema
-from playwright.sync_api import sync_playwright
 
-from django.http import FileResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_protect
-from .serializers import HelloWorldSerializer, ConsultarIpv6Serializer
+from .serializers import (
+    HelloWorldSerializer, ConsultarIpv6Serializer, ConsultarIpv6BatchSerializer, JobSerializer,
+    BuscaSessoesSerializer, SyslogSessionSerializer,
+)
+from .models import Job, QueryResult, ResultArtifact
+from . import accounts, artifacts, jobs, metrics, query_cache, result_parser, sessions
+from . import engines
+from .renderers import CSVRenderer, XLSXRenderer
 
 import os
 import json
+import uuid
+import time as pytime
 import logging
-import requests
-import pandas as pd
 
-# Configuração de logs
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
 @swagger_auto_schema(method='post', request_body=HelloWorldSerializer)
@@ -49,240 +60,371 @@ def consultar_ipv6(request):
         logger.info(f"IPv6: {ipv6}")
         logger.info(f"Licença: {licenca}")
 
-        retorno = run_playwright_script(date, time, ipv6, licenca)
-        if "error" in retorno:
-            return Response({"detail": retorno["error"]}, status=400)
-        return Response(retorno)
+        job = query_cache.enfileirar_consulta(serializer.validated_data)
+        return _job_aceito(job)
     else:
         return Response(serializer.errors, status=400)
 
 
+@csrf_protect
+async def consultar_ipv6_async(request):
+    """
+    Consulta síncrona para o cliente, mas assíncrona no servidor: sob ASGI um
+    único event loop conduz várias páginas do Playwright ao mesmo tempo.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Sob WSGI cada chamada roda em um event loop novo, que abriria o seu próprio Chromium
+        return JsonResponse(
+            {"detail": "Disponível apenas com o servidor ASGI (WEB_ASGI=true); use /api/consultar-ipv6/."},
+            status=501,
+        )
+    if request.method != "POST":
+        return JsonResponse({"detail": f'Método "{request.method}" não permitido.'}, status=405)
+    if not await _usuario_autenticado(request):
+        return JsonResponse({"detail": "As credenciais de autenticação não foram fornecidas."}, status=403)
+
+    try:
+        dados = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"detail": "JSON inválido."}, status=400)
+    serializer = ConsultarIpv6Serializer(data=dados)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    parametros = serializer.validated_data
+    chave = query_cache.chave(parametros)
+    em_cache = await sync_to_async(query_cache.obter)(chave)
+    excel = parametros.get("excel", settings.PORTAL_EXPORT_EXCEL)
+    if em_cache and excel:
+        await sync_to_async(query_cache.exportacao)(em_cache)
+    if em_cache:
+        return JsonResponse(query_cache.resultado_em_cache(em_cache))
+
+    destino = artifacts.novo_temporario() if excel else None
+    try:
+        # Carregado só aqui: o Playwright assíncrono não pesa na partida dos workers
+        from .portal_async import get_async_engine
+
+        retorno = await get_async_engine().consultar(
+            parametros["date"], parametros["time"], parametros["ipv6"], parametros["licenca"], destino
+        )
+    except Exception as e:
+        logger.error(f"Erro ao executar o script Playwright: {str(e)}")
+        return JsonResponse({"detail": "Erro ao executar o script Playwright"}, status=400)
+
+    artefato = None
+    if excel:
+        artefato = await sync_to_async(artifacts.armazenar)(destino, ResultArtifact.EXPORTACAO)
+        retorno.update({"file": artefato.caminho, "result_id": str(artefato.id)})
+    resultado = await sync_to_async(query_cache.guardar)(chave, parametros, artefato, retorno.pop("dados", None))
+    retorno["linhas"] = len(resultado.linhas)
+    return JsonResponse(retorno)
+
+
+async def _usuario_autenticado(request):
+    """
+    Autentica a requisição com as mesmas classes de autenticação do DRF usadas nas demais views.
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+
+    def autenticar():
+        try:
+            return drf_request.user.is_authenticated
+        except APIException:
+            return False
+
+    return await sync_to_async(autenticar)()
+
+
+@csrf_protect
+@swagger_auto_schema(method='post', request_body=ConsultarIpv6BatchSerializer)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def consultar_ipv6_batch(request):
+    serializer = ConsultarIpv6BatchSerializer(data=request.data)
+
+    if serializer.is_valid():
+        itens = serializer.validated_data["itens"]
+        logger.info(f"Lote com {len(itens)} consulta(s) recebido")
+
+        job = jobs.enfileirar("lote", {"itens": [dict(item) for item in itens]})
+        return _job_aceito(job)
+    else:
+        return Response(serializer.errors, status=400)
+
+
+def _job_aceito(job):
+    return Response(
+        {
+            "job_id": str(job.id),
+            "status": job.status,
+            "status_url": reverse("job_status", args=[job.id]),
+            "events_url": reverse("job_events", args=[job.id]),
+            "result_url": reverse("job_result", args=[job.id]),
+        },
+        status=202,
+    )
+
+
 @csrf_protect
 @swagger_auto_schema(method='get')
 @api_view(['GET'])
+@renderer_classes([JSONRenderer, CSVRenderer, XLSXRenderer])
 @permission_classes([IsAuthenticated])
 def relatorio_ipv6(request):
+    # pandas, openpyxl e o cliente da API de assinantes só são carregados no primeiro relatório
+    from . import export
+    from .enrichment import process_dataframe, process_excel_file
+
+    fonte, job, origem = _origem_do_relatorio(request)
+
+    # Com ?format=csv|xlsx o relatório é gerado em blocos, com memória constante
+    formato = request.accepted_renderer.format
+    if formato == "csv":
+        response = StreamingHttpResponse(export.stream_csv(fonte), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="resultado_processed.csv"'
+        return response
+    if formato == "xlsx":
+        try:
+            arquivo = export.write_xlsx(fonte)
+        except Exception:
+            logger.error("Erro ao processar o arquivo")
+            raise APIException("Erro ao processar arquivo")
+        return FileResponse(arquivo, as_attachment=True, filename="resultado_processed.xlsx")
+
     try:
-        file_path = "resultado.xlsx"
-        output_file_path = process_excel_file(file_path)
-        
+        if isinstance(fonte, str):
+            output_file_path = process_excel_file(fonte, artifacts.novo_temporario())
+        else:
+            output_file_path = process_dataframe(fonte, artifacts.novo_temporario())
+
         if os.path.exists(output_file_path):  # Verificar se o arquivo foi gerado
-            response = FileResponse(open(output_file_path, 'rb'), as_attachment=True, filename="resultado_processed.xlsx")
+            relatorio = artifacts.armazenar(output_file_path, ResultArtifact.RELATORIO, job=job, origem=origem)
+            response = FileResponse(open(relatorio.caminho, 'rb'), as_attachment=True, filename="resultado_processed.xlsx")
+            response["X-Result-Id"] = str(relatorio.id)
             return response
         else:
             raise APIException("Erro ao processar o arquivo ou nenhum dado foi encontrado.")
-    
+
     except Exception:  # Captura qualquer exceção
         logger.error("Erro ao processar o arquivo")
         raise APIException("Erro ao processar arquivo")
-          
 
-def run_playwright_script(date: str, time: str, ipv6: str, licenca: str):
+
+def _origem_do_relatorio(request):
     """
-    Executa o script do Playwright para realizar a automação de consulta.
+    Escolhe a exportação a processar: pelo id do resultado (?id=) ou pelo job
+    (?job_id=). Um dos dois é obrigatório, para que um cliente nunca receba o
+    resultado da consulta de outro.
+
+    Retorna (fonte, job, exportação). A fonte é o caminho da exportação ou, para
+    consultas feitas sem Excel, um DataFrame com as linhas guardadas no cache.
     """
-    try:
-        with sync_playwright() as playwright:
-            browser = playwright.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
-            page.goto(os.getenv("LOGIN_URL"))
-            page.wait_for_timeout(3000)
-
-            # Preencher o formulário de login
-            page.get_by_placeholder("Seu usuário").fill(os.getenv("LOGIN_USER"))
-            page.wait_for_timeout(500)
-            page.get_by_placeholder("Sua senha").fill(os.getenv("LOGIN_PASSWORD"))
-            page.wait_for_timeout(500)
-
-            # Submeter o formulário
-            page.get_by_role("button", name="Log In").click()
-            page.wait_for_timeout(1000)
-
-            # Esperar que o login seja concluído
-            page.goto("https://tjsolutions.com.br/painel/dashboard")
-            page.wait_for_url("https://tjsolutions.com.br/painel/dashboard")
-            page.wait_for_timeout(1000)
-
-            # Navegar para a página desejada após o login
-            page.get_by_role("link", name=" NC Syslog ").click()
-            page.wait_for_timeout(1000)
-            page.get_by_role("link", name="Consultar Autenticação").click()
-            page.wait_for_timeout(1000)
-            page.get_by_label("Data: *").fill(date)
-            page.wait_for_timeout(1000)
-            page.get_by_label("Hora:*").click()
-            page.wait_for_timeout(1000)
-            page.get_by_label("Hora:*").fill(time)
-            page.wait_for_timeout(1000)
-            page.get_by_label("IPv6:").click()
-            page.wait_for_timeout(1000)
-            page.get_by_label("IPv6:").fill(ipv6)
-            page.wait_for_timeout(1000)
-            page.get_by_role("textbox", name=f"Radius {licenca}").click()
-            page.wait_for_timeout(1000)
-            page.get_by_role("option", name=f"Radius {licenca}").click()
-            page.wait_for_timeout(1000)
-
-            # Clica no botão "Localizar Registro" e espera a resposta
-            page.get_by_role("button", name="Localizar Registro").click(timeout=120000)
-            
-            # Definindo o timeout de 2 minutos (120000 milissegundos) para esperar o carregamento completo da resposta
-            response = page.expect_response("https://tjsolutions.com.br/painel/ncsyslog_v6/consultar", timeout=120000)
-            
-            page.wait_for_load_state("networkidle", timeout=2000000)
-
-            logger.info(f"Response: {response}")
-
-            # Espera o botão " Excel" aparecer após a consulta
-            with page.expect_download() as download3_info:
-                page.get_by_role("button", name=" Excel").click()
-            download = download3_info.value
-
-            # Salvar o arquivo Excel na raiz da pasta do script
-            current_directory = os.getcwd()
-            saved_path = os.path.join(current_directory, "resultado.xlsx")
-            download.save_as(saved_path)
-
-            # ---------------------
-            context.close()  # Fecha o contexto do navegador
-            browser.close()  # Fecha o navegador
-
-            logger.info("Arquivo Excel salvo com sucesso!")
-            return {"message": "Consulta executada com sucesso!", "file": saved_path}
-    
-    except Exception as e:
-        logger.error(f"Erro ao executar o script Playwright: {str(e)}")
-        return {"Erro ao executar o script Playwright"}
+    parametros = {}
+    for parametro in ("id", "job_id"):
+        valor = request.query_params.get(parametro)
+        if valor:
+            try:
+                parametros[parametro] = uuid.UUID(valor)
+            except ValueError:
+                raise ValidationError({parametro: "Identificador inválido."})
+    if not parametros:
+        raise ValidationError({"job_id": "Informe o job_id da consulta ou o id do resultado."})
+
+    exportacoes = ResultArtifact.objects.filter(tipo=ResultArtifact.EXPORTACAO)
+    if "id" in parametros:
+        exportacoes = exportacoes.filter(id=parametros["id"])
+    if "job_id" in parametros:
+        # Jobs atendidos pelo cache apontam para a exportação de outro job
+        job = Job.objects.filter(id=parametros["job_id"], status=Job.CONCLUIDO).first()
+        if job is None:
+            raise NotFound("Job não encontrado ou ainda não concluído.")
+        result_id = (job.resultado or {}).get("result_id")
+        if result_id is None and job.chave:
+            consulta = QueryResult.objects.filter(chave=job.chave).first()
+            if consulta is None:
+                raise NotFound("Resultado não encontrado.")
+            import pandas as pd
+
+            # Linhas guardadas antes da padronização podem ter outros nomes de coluna
+            linhas = result_parser.padronizar_colunas(pd.DataFrame(consulta.linhas))
+            if linhas.empty:
+                raise NotFound("A consulta não retornou linhas para o relatório.")
+            if result_parser.CABECALHOS_EXPORTACAO["username"] not in linhas.columns:
+                raise ValidationError({"job_id": "O resultado da consulta não tem coluna de usuário para enriquecer."})
+            return linhas, job, None
+        exportacoes = exportacoes.filter(id=result_id)
+
+    origem = exportacoes.order_by("-criado_em").first()
+    if origem is None or not os.path.exists(origem.caminho):
+        raise NotFound("Resultado não encontrado.")
+    return origem.caminho, origem.job, origem
+
+
+@swagger_auto_schema(method='get', query_serializer=BuscaSessoesSerializer)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sessoes(request):
+    """
+    Busca nas sessões do syslog já consultadas (por IPv6/prefixo, usuário,
+    licença e horário). Com ipv6, date e time devolve só a sessão dona do
+    endereço naquele instante. Sem resultado local e com date, time, ipv6 e
+    licenca informados, enfileira a consulta ao portal e devolve o job.
+    """
+    serializer = BuscaSessoesSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    filtros = serializer.validated_data
+
+    instante = None
+    if filtros.get("date"):
+        try:
+            instante = sessions.instante_da_consulta(filtros["date"], filtros["time"])
+        except ValueError as e:
+            raise ValidationError({"date": str(e)})
+
+    if filtros.get("ipv6") and instante:
+        # Endereço e instante: só a sessão dona do endereço naquele momento (prefixo mais específico)
+        dona = sessions.localizar(filtros["ipv6"], instante, licenca=filtros.get("licenca"))
+        encontradas = [dona] if dona and filtros.get("username", dona.username) == dona.username else []
+    else:
+        encontradas = sessions.buscar(
+            ipv6=filtros.get("ipv6"),
+            username=filtros.get("username"),
+            licenca=filtros.get("licenca"),
+            instante=instante,
+            inicio=filtros.get("inicio"),
+            fim=filtros.get("fim"),
+            limite=filtros["limite"],
+        )
+    completa = all(filtros.get(campo) for campo in ("date", "time", "ipv6", "licenca"))
+    if encontradas or not completa:
+        return Response({"origem": "local", "sessoes": SyslogSessionSerializer(encontradas, many=True).data})
+
+    logger.info(f"Sessão não encontrada localmente, consultando o portal: {filtros['ipv6']} {filtros['date']} {filtros['time']}")
+    parametros = {campo: filtros[campo] for campo in ("date", "time", "ipv6", "licenca")}
+    job = query_cache.enfileirar_consulta({**parametros, "excel": False})
+    resposta = _job_aceito(job)
+    resposta.data["origem"] = "portal"
+    return resposta
 
 
-def fetch_data(username):
-    """
-    Faz uma requisição GraphQL para buscar dados de um usuário específico.
+@swagger_auto_schema(method='get')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def contas(request):
     """
-    url = os.getenv("API_URL")
-    query = f"""
-    query MyQuery {{
-        mk01 {{
-            mk_conexoes(where: {{username: {{_eq: "{username}"}}}}) {{
-                username
-                mk_pessoa {{
-                    codpessoa
-                    nome_razaosocial
-                    cpf
-                    email
-                    fone01
-                    fone02
-                    cd_revenda
-                    cep
-                    numero
-                    complementoendereco
-                }}
-                mk_logradouros {{
-                    logradouro
-                    mk_bairros {{
-                        bairro
-                        mk_cidades {{
-                            cidade
-                            mk_estado {{
-                                siglaestado
-                            }}
-                        }}
-                    }}
-                }}
-            }}
-        }}
-    }}
+    Estado e vazão de cada conta do portal neste processo: consultas em
+    andamento, concluídas, erros, consultas por minuto e pausa (backoff).
     """
-    
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {os.getenv("API_AUTH_TOKEN")}'  # Se precisar de autenticação
-    }
+    agendador = accounts.get_agendador()
+    return Response({"estrategia": agendador.estrategia, "contas": agendador.situacao()})
 
-    data = {'query': query}
-    response = requests.post(url, headers=headers, data=json.dumps(data))
 
-    if response.status_code == 200:
-        logger.info(response.json())
-        return response.json()
-    else:
-        logger.error(f"Falha na requisição para {username}. Status code: {response.status_code}")
-        logger.error(f"Erro: {response.text}")
-        return None
+@swagger_auto_schema(method='get')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_status(request, job_id):
+    job = Job.objects.filter(id=job_id).first()
+    if job is None:
+        raise NotFound("Job não encontrado.")
+    return Response(JobSerializer(job).data)
 
 
-def process_excel_file(file_path):
+@swagger_auto_schema(method='get')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_events(request, job_id):
     """
-    Processa o arquivo Excel gerado pela automação, faz requisições para cada usuário e salva o resultado em outro arquivo Excel.
+    Transmite o progresso do job em NDJSON (uma linha por atualização) até ele terminar.
+    """
+    if not Job.objects.filter(id=job_id).exists():
+        raise NotFound("Job não encontrado.")
+
+    def eventos():
+        ultimo = None
+        while True:
+            job = Job.objects.get(id=job_id)
+            atual = {"status": job.status, "progresso": job.progresso}
+            if atual != ultimo:
+                ultimo = atual
+                yield json.dumps(atual) + "\n"
+            if job.status in (Job.CONCLUIDO, Job.ERRO):
+                break
+            pytime.sleep(1)
 
-    :param file_path: Caminho para o arquivo Excel gerado
+    return StreamingHttpResponse(eventos(), content_type="application/x-ndjson")
+
+
+@swagger_auto_schema(method='get')
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_result(request, job_id):
+    job = Job.objects.filter(id=job_id).first()
+    if job is None:
+        raise NotFound("Job não encontrado.")
+    if job.status == Job.ERRO:
+        return Response({"detail": job.erro}, status=400)
+    if job.status != Job.CONCLUIDO:
+        return Response({"detail": "Job ainda em execução.", "status": job.status}, status=409)
+    if not job.arquivo and job.chave:
+        # Consulta feita sem Excel: devolve as linhas interpretadas
+        consulta = QueryResult.objects.filter(chave=job.chave).first()
+        if consulta is None:
+            raise NotFound("Resultado não encontrado.")
+        return Response({"linhas": consulta.linhas})
+    if not os.path.exists(job.arquivo):
+        raise NotFound("Arquivo do resultado não encontrado.")
+    return FileResponse(open(job.arquivo, 'rb'), as_attachment=True, filename="resultado.xlsx")
+
+
+def executar_consulta(job_id, date: str, time: str, ipv6: str, licenca: str, engine: str = None, excel: bool = None):
     """
-    # Carregar o arquivo Excel com os dados originais
-    logger.info(f"Carregando o arquivo Excel: {file_path}")
-    df_original = pd.read_excel(file_path, header=1)
-    
-    # Adicionar as novas colunas antes de iniciar o processamento
-    novas_colunas = ['Nome', 'CPF', 'Email', 'Telefone 1', 'Telefone 2', 'CEP', 'Número', 'Complemento', 'Logradouro', 'Bairro', 'Cidade', 'Estado']
-    for coluna in novas_colunas:
-        df_original[coluna] = ''
-
-    logger.info(f"Colunas após adição das novas colunas: {df_original.columns.tolist()}")
-
-    # Fazer a requisição POST para cada username e armazenar os resultados
-    for index, row in df_original.iterrows():
-        user = row['Usuário']
-        data = fetch_data(user)
-        
-        if data:
-            # Obter a lista de conexões
-            mk_conexoes = data.get('data', {}).get('mk01', {}).get('mk_conexoes', [])
-            logger.info(mk_conexoes)
-            
-            # Encontrar a conexão correspondente ao usuário atual
-            for connection_info in mk_conexoes:
-                username = connection_info.get('username')
-                
-                if username == user:
-                    # Extraia as informações relevantes dos dados retornados
-                    pessoa_info = connection_info.get('mk_pessoa', {})
-                    logradouro_info = connection_info.get('mk_logradouros', {})
-                    bairro_info = logradouro_info.get('mk_bairros', {})
-                    cidade_info = bairro_info.get('mk_cidades', {})
-                    estado_info = cidade_info.get('mk_estado', {})
-                    
-                    # Verificar se os dados estão sendo retornados corretamente
-                    logger.info(f"Dados extraídos para {user}: {pessoa_info}")
-
-                    # Adicione os dados ao DataFrame original
-                    df_original.at[index, 'Nome'] = pessoa_info.get('nome_razaosocial', '')
-                    df_original.at[index, 'CPF'] = pessoa_info.get('cpf', '')
-                    df_original.at[index, 'Email'] = pessoa_info.get('email', '')
-                    df_original.at[index, 'Telefone 1'] = pessoa_info.get('fone01', '')
-                    df_original.at[index, 'Telefone 2'] = pessoa_info.get('fone02', '')
-                    df_original.at[index, 'CEP'] = pessoa_info.get('cep', '')
-                    df_original.at[index, 'Número'] = pessoa_info.get('numero', '')
-                    df_original.at[index, 'Complemento'] = pessoa_info.get('complementoendereco', '')
-                    df_original.at[index, 'Logradouro'] = logradouro_info.get('logradouro', '')
-                    df_original.at[index, 'Bairro'] = bairro_info.get('bairro', '')
-                    df_original.at[index, 'Cidade'] = cidade_info.get('cidade', '')
-                    df_original.at[index, 'Estado'] = estado_info.get('siglaestado', '')
-                    break  # Saia do loop após encontrar a correspondência
-                else:
-                    logger.warning(f"Username não encontrado na resposta da API para {user}")
-        else:
-            logger.warning(f"Nenhum dado retornado da API para {user}")
+    Tarefa do job "consulta": executa a automação e guarda o resultado no cache de consultas.
+    A exportação em Excel só é baixada/gerada quando `excel` (padrão: settings.PORTAL_EXPORT_EXCEL)
+    está ativo; caso contrário as linhas vêm direto da resposta do portal.
+    Consultas idênticas simultâneas compartilham uma única execução e o resultado fica em cache.
+    """
+    parametros = {"date": date, "time": time, "ipv6": ipv6, "licenca": licenca}
+    chave = query_cache.chave(parametros)
+    excel = settings.PORTAL_EXPORT_EXCEL if excel is None else excel
 
-    # Verificar se a coluna foi adicionada
-    logger.info(f"Colunas após processamento: {df_original.head()}")
-    
-    # Salvar o arquivo
-    try:
-        output_file_path = file_path.replace('.xlsx', '_processed.xlsx')
-        df_original.to_excel(output_file_path, index=False)
-        logger.info(f"Arquivo Excel processado salvo em: {output_file_path}")
-    except Exception as e:
-        logger.error(f"Erro ao salvar o arquivo: {e}")
-        raise
-    
-    return output_file_path
\ No newline at end of file
+    def executar():
+        em_cache = query_cache.obter(chave)
+        if em_cache:
+            return query_cache.resultado_em_cache(em_cache)
+
+        destino = artifacts.novo_temporario() if excel else None
+        retorno = engines.executar(date, time, ipv6, licenca, destino, engine)
+        if "error" in retorno:
+            return retorno
+
+        artefato = None
+        if "file" in retorno:
+            artefato = artifacts.armazenar(retorno["file"], ResultArtifact.EXPORTACAO, job=Job.objects.get(id=job_id))
+            retorno.update({"file": artefato.caminho, "result_id": str(artefato.id)})
+        resultado = query_cache.guardar(chave, parametros, artefato, retorno.pop("dados", None))
+        retorno["linhas"] = len(resultado.linhas)
+        return retorno
+
+    retorno = dict(query_cache.executar_uma_vez(chave, executar))
+    if excel and "error" not in retorno and "file" not in retorno:
+        # A execução compartilhada (ou o cache) não tinha Excel: gera a exportação a partir das linhas
+        artefato = query_cache.exportacao(QueryResult.objects.get(chave=chave), job=Job.objects.get(id=job_id))
+        retorno.update({"file": artefato.caminho, "result_id": str(artefato.id)})
+    return retorno
+
+
+def metricas(request):
+    """
+    Métricas no formato do Prometheus. Com METRICS_TOKEN definido, exige
+    o cabeçalho `Authorization: Bearer <token>`; sem ele, só atende
+    requisições da própria máquina (as métricas trazem os nomes das contas).
+    """
+    if not metrics.ATIVO:
+        raise Http404("Métricas desativadas.")
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse(status=401)
+    if not token and request.META.get("REMOTE_ADDR") not in ("127.0.0.1", "::1"):
+        return HttpResponse("Defina METRICS_TOKEN para coletar as métricas pela rede.", status=403)
+    return HttpResponse(metrics.expor(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,11 @@
+"""
+Benchmarks de ponta a ponta da API, executados inteiramente em localhost:
+um portal falso (login, NC Syslog, consultar e exportação em Excel) e um
+stub da API GraphQL substituem o portal tjsolutions e a API do MK.
+
+`ipv6_index` mede a busca local da sessão dona de um endereço IPv6 em um
+instante, em memória e no SQLite, sobre sessões sintéticas.
+
+`enrichment` mede o enriquecimento de relatórios interrompido no meio e
+refeito, e o de uma exportação que só ganhou linhas novas.
+"""
@@ -0,0 +1,220 @@
+"""
+Enriquecimento de relatórios interrompido e refeito, com o stub GraphQL local:
+
+- completo: `process_excel_file` de uma exportação grande, do zero;
+- retomada: o mesmo processo é morto (SIGKILL, como no timeout de um worker)
+  na metade do tempo de um relatório completo e o relatório é pedido de novo;
+- delta: o relatório é refeito para uma exportação que só ganhou linhas novas.
+
+Cada cenário roda com um banco e uma pasta de resultados novos, e cada
+execução do relatório em um subprocesso próprio.
+
+    python -m benchmarks.enrichment --linhas 50000 --usuarios 20000 --saida enriquecimento.json
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from .runner import _commit, comparar
+from .stubs import COLUNAS_CONSULTA, StubGraphQL
+
+PASTA_PROJETO = Path(__file__).resolve().parent.parent
+
+CENARIOS = ("completo", "retomada", "delta")
+
+METRICAS = {"tempo_s": -1, "requisicoes_graphql": -1, "tempo_total_s": -1, "requisicoes_total": -1}
+
+_RELATORIO = (
+    "import sys, json, time, django\n"
+    "django.setup()\n"
+    "from api.enrichment import process_excel_file\n"
+    "inicio = time.perf_counter()\n"
+    "process_excel_file(sys.argv[1], sys.argv[2])\n"
+    "print(json.dumps({'tempo_s': time.perf_counter() - inicio}))\n"
+)
+
+
+def gerar_exportacao(caminho, linhas, usuarios, novas=0):
+    """
+    Exportação no formato do portal (título, cabeçalho na segunda linha). As
+    `novas` linhas do final usam usuários que não aparecem nas anteriores.
+    """
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet()
+    planilha.append(["Consulta de autenticação"])
+    planilha.append(COLUNAS_CONSULTA)
+    for i in range(linhas + novas):
+        usuario = zlib.crc32(str(i).encode()) % usuarios if i < linhas else usuarios + i
+        planilha.append([
+            "01/01/2024", f"{i // 3600 % 24:02d}:{i // 60 % 60:02d}", f"cliente{usuario:06d}",
+            f"2001:db8::{i:x}", f"bng-{i % 4}", f"{i:012x}",
+        ])
+    workbook.save(caminho)
+
+
+class Ambiente:
+    """
+    Banco migrado e pasta de resultados próprios de um cenário, com o stub GraphQL.
+    """
+
+    def __init__(self, pasta, graphql, args):
+        self.pasta = pasta
+        self.graphql = graphql
+        self.ambiente = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "myproject.settings",
+            "DATABASE_DIR": str(pasta),
+            "API_URL": graphql.url,
+            "API_AUTH_TOKEN": "benchmark",
+            "ENRICHMENT_RATE_LIMIT": str(args.limite_taxa),
+            "LOG_LEVEL": "WARNING",
+        }
+        if not args.cache_assinantes:
+            self.ambiente.update({"ENRICHMENT_CACHE_TTL": "0", "ENRICHMENT_CACHE_NEGATIVE_TTL": "0"})
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "-v", "0"], cwd=PASTA_PROJETO, env=self.ambiente, check=True
+        )
+
+    def relatorio(self, exportacao, interromper_apos=None):
+        """
+        Gera o relatório em um subprocesso. Com `interromper_apos`, mata o processo
+        depois desse número de segundos. Retorna o tempo do relatório (None se
+        interrompido), as requisições GraphQL feitas e o tempo de parede.
+        """
+        self.graphql.requisicoes = 0
+        inicio = time.perf_counter()
+        processo = subprocess.Popen(
+            [sys.executable, "-c", _RELATORIO, str(exportacao), str(self.pasta / "relatorio.xlsx")],
+            cwd=PASTA_PROJETO, env=self.ambiente, stdout=subprocess.PIPE, text=True,
+        )
+        while interromper_apos is not None and processo.poll() is None:
+            if time.perf_counter() - inicio >= interromper_apos:
+                processo.kill()
+                processo.wait()
+                return None, self.graphql.requisicoes, time.perf_counter() - inicio
+            time.sleep(0.005)
+        saida, _ = processo.communicate()
+        if processo.returncode != 0:
+            raise RuntimeError(f"Relatório terminou com código {processo.returncode}")
+        return json.loads(saida.strip().splitlines()[-1])["tempo_s"], self.graphql.requisicoes, time.perf_counter() - inicio
+
+
+def cenario_completo(ambiente, exportacoes, args):
+    tempo, requisicoes, _ = ambiente.relatorio(exportacoes["base"])
+    return {"tempo_s": tempo, "requisicoes_graphql": requisicoes}
+
+
+def cenario_retomada(ambiente, exportacoes, args):
+    """
+    Mata o relatório após `interromper_apos` segundos e o refaz.
+    """
+    _, interrompidas, tempo_perdido = ambiente.relatorio(exportacoes["base"], interromper_apos=args.interromper_apos)
+    tempo, requisicoes, _ = ambiente.relatorio(exportacoes["base"])
+    return {
+        "requisicoes_antes_da_queda": interrompidas,
+        "tempo_s": tempo,
+        "requisicoes_graphql": requisicoes,
+        "tempo_total_s": tempo_perdido + tempo,
+        "requisicoes_total": interrompidas + requisicoes,
+    }
+
+
+def cenario_delta(ambiente, exportacoes, args):
+    """
+    Relatório completo da exportação e, em seguida, da mesma exportação com `novas` linhas no final.
+    """
+    ambiente.relatorio(exportacoes["base"])
+    tempo, requisicoes, _ = ambiente.relatorio(exportacoes["delta"])
+    return {"tempo_s": tempo, "requisicoes_graphql": requisicoes}
+
+
+EXECUTORES = {"completo": cenario_completo, "retomada": cenario_retomada, "delta": cenario_delta}
+
+
+def executar(args):
+    resultados = {
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "linhas": args.linhas, "usuarios": args.usuarios, "novas": args.novas,
+            "latencia_graphql_ms": args.latencia_graphql,
+            "limite_taxa": args.limite_taxa, "cache_assinantes": args.cache_assinantes,
+        },
+        "cenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as pasta:
+        pasta = Path(pasta)
+        exportacoes = {"base": pasta / "base.xlsx", "delta": pasta / "delta.xlsx"}
+        gerar_exportacao(exportacoes["base"], args.linhas, args.usuarios)
+        gerar_exportacao(exportacoes["delta"], args.linhas, args.usuarios, args.novas)
+
+        graphql = StubGraphQL(latencia=args.latencia_graphql / 1000).iniciar()
+        try:
+            if "retomada" in args.cenarios and args.interromper_apos is None:
+                # Metade do tempo de parede de um relatório completo
+                _, _, parede = Ambiente(pasta / "medicao", graphql, args).relatorio(exportacoes["base"])
+                args.interromper_apos = round(parede / 2, 2)
+            resultados["parametros"]["interromper_apos_s"] = args.interromper_apos
+            for nome in args.cenarios:
+                print(f"Cenário '{nome}'...", file=sys.stderr)
+                ambiente = Ambiente(pasta / nome, graphql, args)
+                resumo = EXECUTORES[nome](ambiente, exportacoes, args)
+                resultados["cenarios"][nome] = {
+                    chave: round(valor, 2) if isinstance(valor, float) else valor for chave, valor in resumo.items()
+                }
+                shutil.rmtree(ambiente.pasta, ignore_errors=True)
+        finally:
+            graphql.encerrar()
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"commit {resultados['commit']} - {json.dumps(resultados['parametros'])}")
+    for nome, metricas in resultados["cenarios"].items():
+        print(f"\n[{nome}]")
+        for chave, valor in metricas.items():
+            print(f"  {chave:<28} {valor}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enriquecimento de relatórios interrompido, retomado e incremental.")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--linhas", type=int, default=50000, help="Linhas da exportação")
+    parser.add_argument("--usuarios", type=int, default=20000, help="Usuários distintos sorteados para as linhas")
+    parser.add_argument("--novas", type=int, default=100, help="Linhas acrescentadas no cenário delta")
+    parser.add_argument("--latencia-graphql", type=float, default=300, help="Latência (ms) do stub GraphQL")
+    parser.add_argument("--limite-taxa", type=float, default=10, help="ENRICHMENT_RATE_LIMIT (requisições/s)")
+    parser.add_argument(
+        "--interromper-apos", type=float, help="Segundos até a queda no cenário retomada (padrão: metade de um completo)"
+    )
+    parser.add_argument("--sem-cache-assinantes", dest="cache_assinantes", action="store_false")
+    parser.add_argument("--saida", help="Arquivo JSON onde gravar os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "ATUAL"), help="Compara dois arquivos de resultados")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        base, atual = (json.loads(Path(caminho).read_text()) for caminho in args.comparar)
+        comparar(base, atual, METRICAS)
+        return
+
+    resultados = executar(args)
+    imprimir(resultados)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
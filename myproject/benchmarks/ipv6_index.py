@@ -0,0 +1,238 @@
+"""
+Benchmark da busca da sessão dona de um endereço IPv6 em um instante:
+índice em memória (api.ipv6_index.IndicePrefixos) e SQLite (sessions.localizar),
+comparados à consulta por sobreposição de faixas usada antes.
+
+    python -m benchmarks.ipv6_index -n 1000000 --consultas 2000
+"""
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import ipaddress
+import platform
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from .runner import MonitorRss, _commit, percentil
+
+PASTA_PROJETO = Path(__file__).resolve().parent.parent
+
+BASE = 0x20010DB8 << 96  # 2001:db8::/32
+INICIO = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+DURACAO_SESSAO = 6 * 3600
+
+
+def gerar_sessoes(n, sessoes_por_prefixo, semente=42):
+    """
+    `n` sessões sintéticas: delegações /56 com alguns /64 dentro delas e /48 que
+    as contêm, cada prefixo com sessões consecutivas de até 6 horas (algumas sem fim).
+    """
+    aleatorio = random.Random(semente)
+    prefixos = []
+    for k in range(max(1, n // sessoes_por_prefixo)):
+        sorteio = aleatorio.random()
+        if sorteio < 0.8:
+            prefixos.append((BASE | (k << 72), 56))
+        elif sorteio < 0.9:
+            prefixos.append((BASE | (k << 72) | (aleatorio.randrange(256) << 64), 64))
+        else:
+            prefixos.append((BASE | ((k >> 8) << 80), 48))
+
+    sessoes = []
+    for indice in range(n):
+        menor, comprimento = prefixos[indice % len(prefixos)]
+        maior = menor | ((1 << (128 - comprimento)) - 1)
+        inicio = INICIO + (indice // len(prefixos)) * DURACAO_SESSAO + aleatorio.randrange(600)
+        fim = None if aleatorio.random() < 0.1 else inicio + aleatorio.randrange(600, DURACAO_SESSAO - 600)
+        sessoes.append((menor, maior, inicio, fim, indice))
+    return sessoes
+
+
+def gerar_consultas(sessoes, quantidade, semente=7):
+    """
+    Endereços dentro de prefixos guardados e instantes dentro de alguma sessão,
+    mais uma parte (1/5) fora de qualquer prefixo ou período.
+    """
+    aleatorio = random.Random(semente)
+    consultas = []
+    for _ in range(quantidade):
+        menor, maior, inicio, fim, _ = aleatorio.choice(sessoes)
+        if aleatorio.random() < 0.2:
+            consultas.append((BASE | (aleatorio.getrandbits(95) | (1 << 95)), inicio))
+            continue
+        consultas.append((aleatorio.randint(menor, maior), aleatorio.uniform(inicio, fim or inicio + 600)))
+    return consultas
+
+
+def _medir(funcao, consultas):
+    latencias = []
+    resultados = []
+    inicio = time.perf_counter()
+    for endereco, instante in consultas:
+        inicio_consulta = time.perf_counter()
+        resultados.append(funcao(endereco, instante))
+        latencias.append((time.perf_counter() - inicio_consulta) * 1000)
+    duracao = time.perf_counter() - inicio
+    resumo = {
+        "consultas": len(consultas),
+        "encontradas": sum(1 for resultado in resultados if resultado is not None),
+        "p50_ms": round(percentil(latencias, 50), 4),
+        "p95_ms": round(percentil(latencias, 95), 4),
+        "p99_ms": round(percentil(latencias, 99), 4),
+        "consultas_por_segundo": round(len(consultas) / duracao, 1) if duracao else None,
+    }
+    return resumo, resultados
+
+
+def benchmark_memoria(sessoes, consultas):
+    from api.ipv6_index import IndicePrefixos
+
+    with MonitorRss() as monitor:
+        inicio = time.perf_counter()
+        indice = IndicePrefixos(janela_sem_fim=timedelta(seconds=DURACAO_SESSAO))
+        for sessao in sessoes:
+            indice.adicionar(*sessao)
+        indice.construir()
+        construcao = time.perf_counter() - inicio
+        resumo, resultados = _medir(indice.localizar, consultas)
+    resumo.update({"construcao_s": round(construcao, 2), "pico_rss_mb": round(monitor.pico_mb, 1)})
+    return resumo, resultados
+
+
+def _configurar_django(pasta):
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "myproject.settings",
+        "DATABASE_DIR": str(pasta),
+        "SYSLOG_SESSION_MAX_HOURS": str(DURACAO_SESSAO / 3600),
+        "METRICS_ENABLED": "false",
+    })
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+def _gravar(sessoes, tamanho_lote=5000):
+    from api.models import SyslogSession
+    from api.sessions import hex128
+
+    def instante(valor):
+        return datetime.fromtimestamp(valor, tz=timezone.utc)
+
+    for posicao in range(0, len(sessoes), tamanho_lote):
+        SyslogSession.objects.bulk_create([
+            SyslogSession(
+                ipv6=f"{menor:x}", ipv6_inicio=hex128(menor), ipv6_fim=hex128(maior),
+                inicio=instante(inicio), fim=instante(fim) if fim is not None else None,
+                hash=f"{valor:064x}", sessao=str(valor),
+            )
+            for menor, maior, inicio, fim, valor in sessoes[posicao:posicao + tamanho_lote]
+        ])
+
+
+def benchmark_sqlite(sessoes, consultas, consultas_sobreposicao):
+    from django.db import connection
+    from django.db.models import Q
+
+    from api import sessions
+    from api.models import SyslogSession
+
+    inicio = time.perf_counter()
+    _gravar(sessoes)
+    carga = time.perf_counter() - inicio
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    def localizar(endereco, instante):
+        sessao = sessions.localizar(
+            str(ipaddress.IPv6Address(endereco)), datetime.fromtimestamp(instante, tz=timezone.utc)
+        )
+        return int(sessao.sessao) if sessao else None
+
+    def sobreposicao(endereco, instante):
+        # Consulta anterior: faixa por desigualdades em ipv6_inicio e ipv6_fim
+        chave = sessions.hex128(endereco)
+        momento = datetime.fromtimestamp(instante, tz=timezone.utc)
+        sessao = (
+            SyslogSession.objects.filter(ipv6_inicio__lte=chave, ipv6_fim__gte=chave, inicio__lte=momento)
+            .filter(Q(fim__gte=momento) | Q(fim__isnull=True, inicio__gte=momento - sessions.janela_sem_fim()))
+            .order_by("-ipv6_inicio", "ipv6_fim", "-inicio").first()
+        )
+        return int(sessao.sessao) if sessao else None
+
+    resumo, resultados = _medir(localizar, consultas)
+    resumo["carga_s"] = round(carga, 2)
+    resumo["sobreposicao"], resultados_sobreposicao = _medir(sobreposicao, consultas_sobreposicao)
+    return resumo, resultados, resultados_sobreposicao
+
+
+def executar(args):
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    print(f"Gerando {args.n} sessões...", file=sys.stderr)
+    sessoes = gerar_sessoes(args.n, args.sessoes_por_prefixo)
+    consultas = gerar_consultas(sessoes, args.consultas)
+    resultados = {
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"n": args.n, "consultas": args.consultas, "sessoes_por_prefixo": args.sessoes_por_prefixo},
+    }
+
+    print("Índice em memória...", file=sys.stderr)
+    resultados["memoria"], encontrados_memoria = benchmark_memoria(sessoes, consultas)
+
+    if not args.sem_sqlite:
+        print("SQLite...", file=sys.stderr)
+        with tempfile.TemporaryDirectory() as pasta:
+            _configurar_django(pasta)
+            sobreposicao = consultas[:args.consultas_sobreposicao]
+            resultados["sqlite"], encontrados_sqlite, encontrados_sobreposicao = benchmark_sqlite(
+                sessoes, consultas, sobreposicao
+            )
+        # As três implementações devem escolher a mesma sessão
+        resultados["divergencias"] = {
+            "memoria_sqlite": sum(1 for a, b in zip(encontrados_memoria, encontrados_sqlite) if a != b),
+            "sqlite_sobreposicao": sum(1 for a, b in zip(encontrados_sqlite, encontrados_sobreposicao) if a != b),
+        }
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"commit {resultados['commit']} - {json.dumps(resultados['parametros'])}")
+    for secao in ("memoria", "sqlite", "divergencias"):
+        if secao not in resultados:
+            continue
+        print(f"\n[{secao}]")
+        for chave, valor in resultados[secao].items():
+            print(f"  {chave:<24} {valor}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da busca de sessões por endereço IPv6 e instante.")
+    parser.add_argument("-n", type=int, default=100000, help="Sessões guardadas")
+    parser.add_argument("--consultas", type=int, default=2000, help="Buscas medidas")
+    parser.add_argument("--consultas-sobreposicao", type=int, default=200,
+                        help="Buscas medidas com a consulta por sobreposição (lenta em bases grandes)")
+    parser.add_argument("--sessoes-por-prefixo", type=int, default=4)
+    parser.add_argument("--sem-sqlite", action="store_true", help="Mede apenas o índice em memória")
+    parser.add_argument("--saida", help="Arquivo JSON onde gravar os resultados")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    resultados = executar(args)
+    imprimir(resultados)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,499 @@
+"""
+Executa os cenários de benchmark contra o portal falso e o stub GraphQL locais.
+
+Uso (a partir da pasta myproject/):
+
+    python -m benchmarks.runner --saida resultados.json
+    python -m benchmarks.runner --cenarios single concorrente --engine browser -n 50
+    python -m benchmarks.runner --comparar base.json resultados.json
+    python -m benchmarks.runner --cenarios concorrente --contas 4 --por-conta 1 --limite-conta 1
+
+Cada cenário roda em um subprocesso próprio, com banco, sessões e resultados em
+uma pasta temporária, para que o pico de RSS e os caches não vazem entre
+cenários. Com os mesmos parâmetros, os resultados são comparáveis entre commits.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .stubs import FakePortal, StubGraphQL
+
+PASTA_PROJETO = Path(__file__).resolve().parent.parent
+
+CENARIOS = ("single", "batch", "concorrente", "relatorio")
+
+# Métricas comparadas por --comparar, com o sentido de melhora
+METRICAS = {
+    "p50_ms": -1,
+    "p95_ms": -1,
+    "p99_ms": -1,
+    "consultas_por_minuto": 1,
+    "linhas_por_segundo": 1,
+    "pico_rss_mb": -1,
+    "pico_rss_total_mb": -1,
+}
+
+USUARIO_API = "benchmark"
+SENHA_API = "benchmark"
+
+
+def percentil(valores, p):
+    """
+    Percentil com interpolação linear entre as amostras ordenadas.
+    """
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicao - inferior)
+
+
+def resumir(latencias_ms, duracao, consultas):
+    return {
+        "amostras": len(latencias_ms),
+        "p50_ms": round(percentil(latencias_ms, 50), 1),
+        "p95_ms": round(percentil(latencias_ms, 95), 1),
+        "p99_ms": round(percentil(latencias_ms, 99), 1),
+        "media_ms": round(sum(latencias_ms) / len(latencias_ms), 1),
+        "duracao_s": round(duracao, 2),
+        "consultas_por_minuto": round(consultas / duracao * 60, 1) if duracao else None,
+    }
+
+
+def _rss_arvore_mb(pid):
+    """
+    RSS (MB) do processo somado ao de todos os descendentes (ex.: Chromium), via /proc.
+    """
+    total = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        try:
+            with open(f"/proc/{atual}/statm") as statm:
+                total += int(statm.read().split()[1]) * resource.getpagesize()
+            for tarefa in os.listdir(f"/proc/{atual}/task"):
+                with open(f"/proc/{atual}/task/{tarefa}/children") as filhos:
+                    pendentes.extend(int(filho) for filho in filhos.read().split())
+        except (OSError, ValueError):
+            continue
+    return total / 1024 / 1024
+
+
+class MonitorRss:
+    """
+    Amostra periodicamente o RSS da árvore de processos e guarda o pico.
+    O RUSAGE_CHILDREN não serve aqui: ele só conta filhos já encerrados.
+    """
+
+    def __init__(self, intervalo=0.1, pid=None):
+        self.intervalo = intervalo
+        self.pid = pid or os.getpid()
+        self.pico_mb = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.is_set():
+            self.pico_mb = max(self.pico_mb, _rss_arvore_mb(self.pid))
+            self._parar.wait(self.intervalo)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        self._thread.join()
+        self.pico_mb = max(self.pico_mb, _rss_arvore_mb(self.pid))
+
+
+def _pico_rss(monitor):
+    # ru_maxrss é em KB no Linux
+    return {
+        "pico_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "pico_rss_total_mb": round(monitor.pico_mb, 1),
+    }
+
+
+def _configurar_ambiente(pasta, portal, graphql, args):
+    os.environ.update({
+        "DJANGO_SETTINGS_MODULE": "myproject.settings",
+        "DATABASE_DIR": str(pasta),
+        "PORTAL_URL": portal.base_url,
+        "LOGIN_URL": portal.login_url,
+        "LOGIN_USER": portal.usuario,
+        "LOGIN_PASSWORD": portal.senha,
+        "API_URL": graphql.url,
+        "API_AUTH_TOKEN": "benchmark",
+        "PORTAL_ENGINE": args.engine,
+        "PORTAL_EXPORT_EXCEL": "true" if args.excel else "false",
+        "BROWSER_POOL_SIZE": str(args.workers),
+        "JOB_WORKERS": str(args.workers),
+        "BATCH_PARALLELISM": str(args.workers),
+        "ENRICHMENT_RATE_LIMIT": "1000",
+        # Sem cache de consultas: cada consulta do benchmark vai ao portal
+        "QUERY_CACHE_TTL": "0",
+    })
+    if not args.cache_assinantes:
+        os.environ.update({"ENRICHMENT_CACHE_TTL": "0", "ENRICHMENT_CACHE_NEGATIVE_TTL": "0"})
+
+
+def _contas_do_portal(args):
+    if args.contas == 1:
+        return None
+    return {f"bench{i}": f"senha{i}" for i in range(args.contas)}
+
+
+def _configurar_contas(portal, args):
+    """
+    Contas do agendador: as mesmas aceitas pelo portal falso, com o limite e a estratégia pedidos.
+    """
+    os.environ.update({
+        "PORTAL_ACCOUNT_CONCURRENCY": str(args.limite_conta),
+        "PORTAL_ACCOUNT_STRATEGY": args.estrategia,
+        "PORTAL_ACCOUNT_BACKOFF": str(args.backoff),
+    })
+    if args.contas > 1:
+        os.environ["PORTAL_ACCOUNTS"] = json.dumps(
+            [{"usuario": usuario, "senha": senha} for usuario, senha in portal.contas.items()]
+        )
+
+
+def _vazao_por_conta(portal):
+    """
+    Consultas atendidas por conta, vistas pelo agendador e pelo portal.
+    """
+    from api.accounts import get_agendador
+
+    return {
+        conta["nome"]: {
+            "consultas": conta["consultas"],
+            "erros": conta["erros"],
+            "consultas_por_minuto": conta["consultas_por_minuto"],
+            "no_portal": portal.consultas_por_conta.get(conta["usuario"], 0),
+        }
+        for conta in get_agendador().situacao()
+    }
+
+
+class _Api:
+    """
+    Cliente da API no mesmo processo (django.test.Client), autenticado por sessão.
+    A autenticação Basic recalcularia o hash da senha (PBKDF2) a cada polling do
+    job e dominaria a medição. Um cliente por thread, pois o Client guarda cookies.
+    """
+
+    def __init__(self):
+        from django.contrib.auth.models import User
+        from django.test import Client
+
+        self.client = Client(SERVER_NAME="localhost")
+        self.client.force_login(User.objects.get(username=USUARIO_API))
+
+    def consultar(self, indice, dia="01/01/2024"):
+        resposta = self.client.post(
+            "/api/consultar-ipv6/",
+            {"date": dia, "time": "10:00", "ipv6": f"2001:db8::{indice:x}", "licenca": "acme"},
+            content_type="application/json",
+        )
+        return resposta.json()["job_id"]
+
+    def aguardar(self, job_id, intervalo=0.01):
+        while True:
+            job = self.client.get(f"/api/jobs/{job_id}/").json()
+            if job["status"] in ("concluido", "erro"):
+                return job
+            time.sleep(intervalo)
+
+    def consulta_completa(self, indice):
+        inicio = time.perf_counter()
+        job = self.aguardar(self.consultar(indice))
+        return (time.perf_counter() - inicio) * 1000, job
+
+
+def _contar_erros(jobs):
+    return sum(1 for job in jobs if job["status"] == "erro")
+
+
+def cenario_single(args):
+    """
+    Consultas sequenciais, uma por vez: latência de ponta a ponta sem concorrência.
+    """
+    api = _Api()
+    api.consulta_completa(0)  # Aquecimento: login e inicialização do engine
+    inicio = time.perf_counter()
+    resultados = [api.consulta_completa(i) for i in range(1, args.n + 1)]
+    duracao = time.perf_counter() - inicio
+    resumo = resumir([r[0] for r in resultados], duracao, args.n)
+    resumo["erros"] = _contar_erros([r[1] for r in resultados])
+    return resumo
+
+
+def cenario_concorrente(args):
+    """
+    `n` consultas disparadas por `concorrencia` clientes simultâneos.
+    """
+    _Api().consulta_completa(0)
+
+    def consulta(indice):
+        return _Api().consulta_completa(indice)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concorrencia) as executor:
+        resultados = list(executor.map(consulta, range(1, args.n + 1)))
+    duracao = time.perf_counter() - inicio
+    resumo = resumir([r[0] for r in resultados], duracao, args.n)
+    resumo["erros"] = _contar_erros([r[1] for r in resultados])
+    return resumo
+
+
+def cenario_batch(args):
+    """
+    Um lote com `n` itens; as latências são as de cada item do lote.
+    """
+    api = _Api()
+    api.consulta_completa(0)
+    itens = [
+        {"date": "01/01/2024", "time": "10:00", "ipv6": f"2001:db8::{i:x}", "licenca": "acme", "engine": args.engine}
+        for i in range(1, args.n + 1)
+    ]
+    inicio = time.perf_counter()
+    resposta = api.client.post("/api/consultar-ipv6/batch/", {"itens": itens}, content_type="application/json")
+    job = api.aguardar(resposta.json()["job_id"], intervalo=0.05)
+    duracao = time.perf_counter() - inicio
+
+    tempos = [item["tempo_ms"] for item in job["progresso"].get("itens", []) if item]
+    resumo = resumir(tempos or [duracao * 1000], duracao, args.n)
+    resumo["erros"] = job["progresso"].get("erros", 0) if job["status"] != "erro" else args.n
+    return resumo
+
+
+def cenario_relatorio(args):
+    """
+    Relatório enriquecido (CSV em streaming) de uma consulta com `linhas` registros,
+    gerado `n` vezes: mede o enriquecimento via GraphQL.
+    """
+    api = _Api()
+    _, job = api.consulta_completa(0)
+    if job["status"] != "concluido":
+        raise RuntimeError(f"Consulta inicial falhou: {job['erro']}")
+
+    latencias = []
+    linhas = 0
+    inicio = time.perf_counter()
+    for _ in range(args.n):
+        inicio_relatorio = time.perf_counter()
+        resposta = api.client.get(f"/api/relatorio-ipv6/?job_id={job['id']}&format=csv")
+        conteudo = b"".join(resposta.streaming_content)
+        latencias.append((time.perf_counter() - inicio_relatorio) * 1000)
+        linhas += conteudo.count(b"\n") - 1
+    duracao = time.perf_counter() - inicio
+
+    resumo = resumir(latencias, duracao, args.n)
+    resumo["linhas_por_segundo"] = round(linhas / duracao, 1) if duracao else None
+    return resumo
+
+
+EXECUTORES = {
+    "single": cenario_single,
+    "batch": cenario_batch,
+    "concorrente": cenario_concorrente,
+    "relatorio": cenario_relatorio,
+}
+
+
+def executar_cenario(nome, args):
+    """
+    Executa um cenário neste processo (chamado pelo subprocesso de cada cenário).
+    """
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as pasta:
+        portal = FakePortal(
+            latencia=args.latencia_portal / 1000, linhas=args.linhas, contas=_contas_do_portal(args),
+            por_conta=args.por_conta, rejeitar_excedentes=args.rejeitar_excedentes,
+        ).iniciar()
+        graphql = StubGraphQL(latencia=args.latencia_graphql / 1000).iniciar()
+        _configurar_ambiente(pasta, portal, graphql, args)
+        _configurar_contas(portal, args)
+
+        import django
+        from django.core.management import call_command
+
+        django.setup()
+        call_command("migrate", verbosity=0)
+
+        from django.contrib.auth.models import User
+
+        User.objects.create_user(USUARIO_API, password=SENHA_API)
+
+        try:
+            with MonitorRss() as monitor:
+                resultado = EXECUTORES[nome](args)
+        finally:
+            portal.encerrar()
+            graphql.encerrar()
+
+        resultado.update(_pico_rss(monitor))
+        resultado.update({"requisicoes_portal": portal.requisicoes, "requisicoes_graphql": graphql.requisicoes})
+        if portal.recusadas:
+            resultado["recusadas_portal"] = portal.recusadas
+        resultado["por_conta"] = _vazao_por_conta(portal)
+        return resultado
+
+
+def _parametros(args):
+    return {
+        "engine": args.engine,
+        "excel": args.excel,
+        "n": args.n,
+        "concorrencia": args.concorrencia,
+        "workers": args.workers,
+        "linhas": args.linhas,
+        "latencia_portal_ms": args.latencia_portal,
+        "latencia_graphql_ms": args.latencia_graphql,
+        "cache_assinantes": args.cache_assinantes,
+        "contas": args.contas,
+        "por_conta": args.por_conta,
+        "rejeitar_excedentes": args.rejeitar_excedentes,
+        "limite_conta": args.limite_conta,
+        "estrategia": args.estrategia,
+    }
+
+
+def _argumentos_filho(args):
+    argumentos = [
+        "--engine", args.engine, "-n", str(args.n), "--concorrencia", str(args.concorrencia),
+        "--workers", str(args.workers), "--linhas", str(args.linhas),
+        "--latencia-portal", str(args.latencia_portal), "--latencia-graphql", str(args.latencia_graphql),
+        "--contas", str(args.contas), "--limite-conta", str(args.limite_conta), "--estrategia", args.estrategia,
+        "--backoff", str(args.backoff),
+    ]
+    if args.por_conta:
+        argumentos += ["--por-conta", str(args.por_conta)]
+    if args.rejeitar_excedentes:
+        argumentos.append("--rejeitar-excedentes")
+    if not args.excel:
+        argumentos.append("--sem-excel")
+    if args.cache_assinantes:
+        argumentos.append("--cache-assinantes")
+    if args.verbose:
+        argumentos.append("--verbose")
+    return argumentos
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_PROJETO, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args):
+    resultados = {
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": _parametros(args),
+        "cenarios": {},
+    }
+    for nome in args.cenarios:
+        print(f"Executando o cenário '{nome}'...", file=sys.stderr)
+        processo = subprocess.run(
+            [sys.executable, "-m", "benchmarks.runner", "--interno", nome, *_argumentos_filho(args)],
+            cwd=PASTA_PROJETO, stdout=subprocess.PIPE, text=True,
+        )
+        if processo.returncode != 0:
+            resultados["cenarios"][nome] = {"erro": f"subprocesso terminou com código {processo.returncode}"}
+            continue
+        resultados["cenarios"][nome] = json.loads(processo.stdout.strip().splitlines()[-1])
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"commit {resultados['commit']} - {json.dumps(resultados['parametros'])}")
+    for nome, metricas in resultados["cenarios"].items():
+        print(f"\n[{nome}]")
+        for chave, valor in metricas.items():
+            print(f"  {chave:<24} {valor}")
+
+
+def comparar(base, atual, sentidos=METRICAS):
+    """
+    Mostra a variação percentual de cada métrica entre duas execuções.
+    """
+    if base["parametros"] != atual["parametros"]:
+        print("Aviso: os parâmetros das execuções são diferentes; a comparação pode não ser válida.")
+    print(f"{base['commit']} -> {atual['commit']}")
+    for nome, metricas in atual["cenarios"].items():
+        anteriores = base["cenarios"].get(nome, {})
+        print(f"\n[{nome}]")
+        for chave, sentido in sentidos.items():
+            antes, depois = anteriores.get(chave), metricas.get(chave)
+            if not antes or depois is None:
+                continue
+            variacao = (depois - antes) / antes * 100
+            marcador = "melhor" if variacao * sentido > 0 else "pior" if variacao else "igual"
+            print(f"  {chave:<24} {antes:>10} -> {depois:<10} {variacao:+.1f}% ({marcador})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de ponta a ponta com portal e GraphQL locais.")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--engine", choices=("http", "browser"), default="http")
+    parser.add_argument("--sem-excel", dest="excel", action="store_false", help="Consultas sem a exportação em Excel")
+    parser.add_argument("-n", type=int, default=20, help="Consultas (ou relatórios) por cenário")
+    parser.add_argument("--concorrencia", type=int, default=8, help="Clientes simultâneos no cenário concorrente")
+    parser.add_argument("--workers", type=int, default=2, help="Workers de jobs / tamanho do pool de navegadores")
+    parser.add_argument("--linhas", type=int, default=20, help="Registros devolvidos por consulta no portal falso")
+    parser.add_argument("--latencia-portal", type=float, default=50, help="Latência (ms) do consultar no portal falso")
+    parser.add_argument("--latencia-graphql", type=float, default=20, help="Latência (ms) do stub GraphQL")
+    parser.add_argument("--cache-assinantes", action="store_true", help="Mantém o cache de assinantes entre relatórios")
+    parser.add_argument("--contas", type=int, default=1, help="Contas do portal (PORTAL_ACCOUNTS)")
+    parser.add_argument("--por-conta", type=int, help="Consultas simultâneas que o portal falso atende por conta")
+    parser.add_argument(
+        "--rejeitar-excedentes", action="store_true", help="O portal falso responde 429 acima de --por-conta"
+    )
+    parser.add_argument("--limite-conta", type=int, default=0, help="PORTAL_ACCOUNT_CONCURRENCY (0 = sem limite)")
+    parser.add_argument("--estrategia", choices=("menos_carregada", "rodizio"), default="menos_carregada")
+    parser.add_argument("--backoff", type=float, default=2, help="PORTAL_ACCOUNT_BACKOFF (s)")
+    parser.add_argument("--saida", help="Arquivo JSON onde gravar os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "ATUAL"), help="Compara dois arquivos de resultados")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--interno", choices=CENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        base, atual = (json.loads(Path(caminho).read_text()) for caminho in args.comparar)
+        comparar(base, atual)
+        return
+
+    if args.interno:
+        print(json.dumps(executar_cenario(args.interno, args)))
+        return
+
+    resultados = executar(args)
+    imprimir(resultados)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Teste de carga por HTTP do runserver (como no CMD anterior da imagem: DEBUG,
+SQLite sem WAL e sem reaproveitar conexões) contra o gunicorn configurado em
+gunicorn.conf.py, com o portal falso e o stub GraphQL de benchmarks.stubs.
+
+    python -m benchmarks.serving --perfis runserver gunicorn -n 2000 --concorrencia 32
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+from .runner import MonitorRss, _commit, _configurar_ambiente, comparar, resumir
+from .stubs import FakePortal, StubGraphQL
+
+PASTA_PROJETO = Path(__file__).resolve().parent.parent
+
+CENARIOS = ("leitura", "consulta")
+
+PERFIS = {
+    # Equivalente ao CMD anterior: python manage.py runserver com DEBUG
+    "runserver": {
+        "comando": ["manage.py", "runserver", "--noreload", "{endereco}"],
+        "ambiente": {"DEBUG": "true", "SQLITE_WAL": "false", "DB_CONN_MAX_AGE": "0", "SQLITE_TIMEOUT": "5"},
+    },
+    "gunicorn": {
+        "comando": ["-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", "{endereco}"],
+        "ambiente": {"DEBUG": "false", "WEB_ACCESS_LOG": "false"},
+    },
+    "gunicorn-asgi": {
+        "comando": ["-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", "{endereco}"],
+        "ambiente": {"DEBUG": "false", "WEB_ACCESS_LOG": "false", "WEB_ASGI": "true"},
+    },
+}
+
+USUARIO_API = "benchmark"
+
+
+def _porta_livre():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def preparar_banco(pasta):
+    """
+    Cria o banco modelo (migrado, com usuário, sessão e um job concluído) e
+    devolve os cookies e o id do job. Cada perfil recebe uma cópia dele.
+    """
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from django.test import Client
+    from django.utils.crypto import get_random_string
+
+    from api.models import Job
+
+    client = Client(SERVER_NAME="localhost")
+    client.force_login(User.objects.create_user(USUARIO_API, password=USUARIO_API))
+    job = Job.objects.create(tipo="consulta", status=Job.CONCLUIDO, resultado={"linhas": 0})
+    cookies = {"sessionid": client.cookies["sessionid"].value, "csrftoken": get_random_string(32)}
+    connections.close_all()
+    return cookies, str(job.id)
+
+
+class Servidor:
+    """
+    Servidor da API em um subprocesso, com o banco copiado do modelo.
+    """
+
+    def __init__(self, perfil, pasta_modelo, pasta, workers):
+        self.perfil = perfil
+        self.pasta = pasta
+        self.endereco = f"127.0.0.1:{_porta_livre()}"
+        shutil.copytree(pasta_modelo, pasta)
+        configuracao = PERFIS[perfil]
+        self.comando = [sys.executable, *(parte.format(endereco=self.endereco) for parte in configuracao["comando"])]
+        self.ambiente = {**os.environ, "DATABASE_DIR": str(pasta), "WEB_WORKERS": str(workers), **configuracao["ambiente"]}
+        self.processo = None
+
+    @property
+    def url(self):
+        return f"http://{self.endereco}"
+
+    def __enter__(self):
+        self.processo = subprocess.Popen(
+            self.comando, cwd=PASTA_PROJETO, env=self.ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        limite = time.monotonic() + 60
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                raise RuntimeError(f"{self.perfil} terminou com código {self.processo.returncode}")
+            try:
+                requests.get(f"{self.url}/api/hello-world/", timeout=60)
+                return self
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise RuntimeError(f"{self.perfil} não respondeu em 60s")
+
+    def __exit__(self, *exc):
+        self.processo.terminate()
+        try:
+            self.processo.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.processo.kill()
+
+
+class _Clientes:
+    """
+    Uma requests.Session por thread, autenticada pela sessão do Django e com o token CSRF.
+    """
+
+    def __init__(self, url, cookies):
+        self.url = url
+        self.cookies = cookies
+        self._local = threading.local()
+
+    def sessao(self):
+        if not hasattr(self._local, "sessao"):
+            sessao = requests.Session()
+            sessao.cookies.update(self.cookies)
+            sessao.headers.update({"X-CSRFToken": self.cookies["csrftoken"]})
+            self._local.sessao = sessao
+        return self._local.sessao
+
+
+def _carga(funcao, n, concorrencia):
+    def medir(indice):
+        inicio = time.perf_counter()
+        try:
+            ok = funcao(indice)
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - inicio) * 1000, ok
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        resultados = list(executor.map(medir, range(n)))
+    duracao = time.perf_counter() - inicio
+    resumo = resumir([r[0] for r in resultados], duracao, n)
+    resumo["erros"] = sum(1 for r in resultados if not r[1])
+    resumo["requisicoes_por_segundo"] = round(n / duracao, 1) if duracao else None
+    return resumo
+
+
+def _ler_job(clientes, job_id):
+    return clientes.sessao().get(f"{clientes.url}/api/jobs/{job_id}/", timeout=30).status_code == 200
+
+
+def aquecer(clientes, job_id, args):
+    """
+    Leituras antes da medição: cada worker carrega a aplicação na primeira requisição.
+    """
+    _carga(lambda _: _ler_job(clientes, job_id), args.concorrencia * 4, args.concorrencia)
+
+
+def cenario_leitura(clientes, job_id, args):
+    """
+    Leituras do status de um job: custo do servidor e do banco por requisição.
+    """
+    return _carga(lambda _: _ler_job(clientes, job_id), args.n, args.concorrencia)
+
+
+def cenario_consulta(clientes, job_id, args):
+    """
+    Consultas completas (POST + polling do job) pelo engine http contra o portal falso.
+    """
+    def consultar(indice):
+        sessao = clientes.sessao()
+        resposta = sessao.post(
+            f"{clientes.url}/api/consultar-ipv6/",
+            json={"date": "01/01/2024", "time": "10:00", "ipv6": f"2001:db8::{indice:x}", "licenca": "acme"},
+            timeout=30,
+        )
+        if resposta.status_code != 202:
+            return False
+        status_url = f"{clientes.url}{resposta.json()['status_url']}"
+        while True:
+            job = sessao.get(status_url, timeout=30).json()
+            if job["status"] in ("concluido", "erro"):
+                return job["status"] == "concluido"
+            time.sleep(0.02)
+
+    return _carga(consultar, args.n_consultas, args.concorrencia)
+
+
+EXECUTORES = {"leitura": cenario_leitura, "consulta": cenario_consulta}
+
+
+def executar(args):
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    resultados = {
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {
+            "n": args.n, "n_consultas": args.n_consultas, "concorrencia": args.concorrencia,
+            "workers": args.workers, "latencia_portal_ms": args.latencia_portal,
+        },
+        "cenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory() as pasta:
+        portal = FakePortal(latencia=args.latencia_portal / 1000).iniciar()
+        graphql = StubGraphQL().iniciar()
+        _configurar_ambiente(Path(pasta) / "modelo", portal, graphql, Namespace(
+            engine="http", excel=False, workers=2, cache_assinantes=True,
+        ))
+        # O modelo fica sem WAL; cada perfil liga (ou não) na sua cópia
+        os.environ.update({"SQLITE_WAL": "false", "METRICS_ENABLED": "false"})
+        cookies, job_id = preparar_banco(Path(pasta) / "modelo")
+
+        try:
+            for perfil in args.perfis:
+                print(f"Perfil '{perfil}'...", file=sys.stderr)
+                with Servidor(perfil, Path(pasta) / "modelo", Path(pasta) / perfil, args.workers) as servidor:
+                    clientes = _Clientes(servidor.url, cookies)
+                    aquecer(clientes, job_id, args)
+                    for cenario in args.cenarios:
+                        with MonitorRss(pid=servidor.processo.pid) as monitor:
+                            resumo = EXECUTORES[cenario](clientes, job_id, args)
+                        resumo["pico_rss_servidor_mb"] = round(monitor.pico_mb, 1)
+                        resultados["cenarios"][f"{perfil}/{cenario}"] = resumo
+        finally:
+            portal.encerrar()
+            graphql.encerrar()
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"commit {resultados['commit']} - {json.dumps(resultados['parametros'])}")
+    for nome, metricas in resultados["cenarios"].items():
+        print(f"\n[{nome}]")
+        for chave, valor in metricas.items():
+            print(f"  {chave:<24} {valor}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga do runserver e do gunicorn por HTTP.")
+    parser.add_argument("--perfis", nargs="+", choices=PERFIS, default=["runserver", "gunicorn"])
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("-n", type=int, default=2000, help="Requisições no cenário de leitura")
+    parser.add_argument("--n-consultas", type=int, default=100, help="Consultas no cenário de consulta")
+    parser.add_argument("--concorrencia", type=int, default=32, help="Clientes simultâneos")
+    parser.add_argument("--workers", type=int, default=2, help="WEB_WORKERS do gunicorn")
+    parser.add_argument("--latencia-portal", type=float, default=50, help="Latência (ms) do consultar no portal falso")
+    parser.add_argument("--saida", help="Arquivo JSON onde gravar os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "ATUAL"), help="Compara dois arquivos de resultados")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        base, atual = (json.loads(Path(caminho).read_text()) for caminho in args.comparar)
+        comparar(base, atual)
+        return
+
+    resultados = executar(args)
+    imprimir(resultados)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Custo de partida: cada cenário roda em um interpretador novo com -X importtime,
+medindo o tempo total, o tempo gasto em imports, o RSS ao final e quais
+bibliotecas pesadas (pandas, Playwright, ...) foram carregadas.
+
+    python -m benchmarks.startup -r 5 --saida partida.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .runner import _commit, comparar
+
+PASTA_PROJETO = Path(__file__).resolve().parent.parent
+
+PESADOS = ("pandas", "numpy", "openpyxl", "playwright", "requests")
+
+METRICAS = {"tempo_ms": -1, "importacao_ms": -1, "rss_mb": -1}
+
+_SETUP = "import django; django.setup()\n"
+
+# Código de cada cenário; `ambiente` complementa as variáveis do subprocesso
+CENARIOS = {
+    # Qualquer comando do manage.py (migrate, check, ...)
+    "setup": {"codigo": _SETUP},
+    # Worker do gunicorn ao importar myproject.wsgi (com o WEB_PRELOAD padrão)
+    "worker": {"codigo": "import myproject.wsgi\n"},
+    # Worker após a primeira requisição ao hello-world
+    "primeira-requisicao": {
+        "codigo": (
+            "import myproject.wsgi\n"
+            "from django.test import Client\n"
+            "Client(SERVER_NAME='localhost').post('/api/hello-world/', {'nome': 'x'})\n"
+        ),
+    },
+    # Worker com todos os engines pré-carregados
+    "worker-preload-completo": {
+        "codigo": "import myproject.wsgi\n",
+        "ambiente": {"WEB_PRELOAD": "urls,dados,browser,http"},
+    },
+}
+
+_FINAL = (
+    "import sys, json\n"
+    "rss = next(int(l.split()[1]) for l in open('/proc/self/status') if l.startswith('VmRSS'))\n"
+    "print(json.dumps({'rss_kb': rss, 'pesados': [m for m in %r if m in sys.modules]}))\n" % (PESADOS,)
+)
+
+
+def ler_importtime(saida):
+    """
+    Lê a saída do -X importtime: lista de (acumulado_us, proprio_us, modulo).
+    """
+    registros = []
+    for linha in saida.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, acumulado, modulo = linha.split(":", 1)[1].split("|")
+        registros.append((int(acumulado), int(proprio), modulo.strip()))
+    return registros
+
+
+def executar_uma_vez(nome, pasta):
+    cenario = CENARIOS[nome]
+    ambiente = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "myproject.settings",
+        "DATABASE_DIR": str(pasta),
+        "LOG_LEVEL": "WARNING",
+        **cenario.get("ambiente", {}),
+    }
+    inicio = time.perf_counter()
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", cenario["codigo"] + _FINAL],
+        cwd=PASTA_PROJETO, env=ambiente, capture_output=True, text=True,
+    )
+    tempo = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        raise RuntimeError(f"Cenário '{nome}' falhou:\n{processo.stderr[-2000:]}")
+
+    registros = ler_importtime(processo.stderr)
+    final = json.loads(processo.stdout.strip().splitlines()[-1])
+    return {
+        "tempo_ms": tempo * 1000,
+        "importacao_ms": sum(registro[1] for registro in registros) / 1000,
+        "rss_mb": final["rss_kb"] / 1024,
+        "pesados": final["pesados"],
+        "registros": registros,
+    }
+
+
+def _por_pacote(registros, quantidade):
+    # Tempo próprio somado por pacote de primeiro nível (django, pandas, api, ...)
+    pacotes = {}
+    for _, proprio, modulo in registros:
+        pacote = modulo.split(".")[0]
+        pacotes[pacote] = pacotes.get(pacote, 0) + proprio
+    maiores = sorted(pacotes.items(), key=lambda item: item[1], reverse=True)[:quantidade]
+    return {pacote: round(tempo / 1000, 1) for pacote, tempo in maiores}
+
+
+def executar(args):
+    resultados = {
+        "commit": _commit(),
+        "data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {"repeticoes": args.repeticoes},
+        "cenarios": {},
+    }
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome in args.cenarios:
+            print(f"Cenário '{nome}'...", file=sys.stderr)
+            execucoes = [executar_uma_vez(nome, pasta) for _ in range(args.repeticoes)]
+            resumo = {
+                chave: round(statistics.median(execucao[chave] for execucao in execucoes), 1) for chave in METRICAS
+            }
+            resumo["pesados"] = execucoes[-1]["pesados"]
+            resumo["imports_por_pacote_ms"] = _por_pacote(execucoes[-1]["registros"], args.top)
+            resultados["cenarios"][nome] = resumo
+    return resultados
+
+
+def imprimir(resultados):
+    print(f"commit {resultados['commit']} - {json.dumps(resultados['parametros'])}")
+    for nome, metricas in resultados["cenarios"].items():
+        print(f"\n[{nome}]")
+        for chave, valor in metricas.items():
+            if isinstance(valor, dict):
+                print(f"  {chave}")
+                for modulo, tempo in valor.items():
+                    print(f"    {modulo:<40} {tempo} ms")
+            else:
+                print(f"  {chave:<24} {valor}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Custo de partida (imports e RSS) da aplicação.")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("-r", "--repeticoes", type=int, default=5, help="Execuções por cenário (usa a mediana)")
+    parser.add_argument("--top", type=int, default=10, help="Pacotes com mais tempo de import a listar")
+    parser.add_argument("--saida", help="Arquivo JSON onde gravar os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("BASE", "ATUAL"), help="Compara dois arquivos de resultados")
+    args = parser.parse_args(argv)
+
+    if args.comparar:
+        base, atual = (json.loads(Path(caminho).read_text()) for caminho in args.comparar)
+        comparar(base, atual, METRICAS)
+        return
+
+    resultados = executar(args)
+    imprimir(resultados)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
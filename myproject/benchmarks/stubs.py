@@ -0,0 +1,355 @@
+import io
+import json
+import time
+import html
+import zlib
+import secrets
+import threading
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from openpyxl import Workbook
+
+COLUNAS_CONSULTA = ["Data", "Hora", "Usuário", "IPv6", "NAS", "Sessão"]
+
+LOGIN_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Login</title></head><body>
+<form action="/login" method="post">
+  <input type="hidden" name="_token" value="{token}">
+  <input name="usuario" placeholder="Seu usuário">
+  <input name="senha" type="password" placeholder="Sua senha">
+  <button type="submit">Log In</button>
+</form>
+</body></html>"""
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Dashboard</title></head><body>
+<nav>
+  <a href="#" onclick="document.getElementById('menu').hidden = false; return false;"> NC Syslog </a>
+  <ul id="menu" hidden><li><a href="{base}/ncsyslog_v6">Consultar Autenticação</a></li></ul>
+</nav>
+</body></html>"""
+
+CONSULTA_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="csrf-token" content="{csrf}"><title>NC Syslog</title></head><body>
+<form id="consulta" onsubmit="return false;">
+  <label for="data">Data: *</label><input id="data" name="data">
+  <label for="hora">Hora:*</label><input id="hora" name="hora">
+  <label for="ipv6">IPv6:</label><input id="ipv6" name="ipv6">
+  <label for="radius">Licença</label>
+  <select id="radius" name="radius" hidden>{opcoes}</select>
+  <span id="radius-widget" role="textbox" tabindex="0" aria-label="{primeira}"
+        onclick="document.getElementById('radius-opcoes').hidden = false;">{primeira}</span>
+  <ul id="radius-opcoes" role="listbox" hidden>{itens}</ul>
+  <button type="button" id="localizar">Localizar Registro</button>
+</form>
+<div id="resultado"></div>
+<button type="button" id="excel" style="display: none"> Excel</button>
+<script>
+document.querySelectorAll("#radius-opcoes [role=option]").forEach(function (item) {{
+  item.addEventListener("click", function () {{
+    document.getElementById("radius").value = item.dataset.value;
+    document.getElementById("radius-opcoes").hidden = true;
+  }});
+}});
+document.getElementById("localizar").addEventListener("click", async function () {{
+  const dados = new URLSearchParams(new FormData(document.getElementById("consulta")));
+  const resposta = await fetch("{base}/ncsyslog_v6/consultar", {{
+    method: "POST",
+    body: dados,
+    headers: {{"X-CSRF-TOKEN": "{csrf}", "X-Requested-With": "XMLHttpRequest"}},
+  }});
+  const json = await resposta.json();
+  const linhas = json.data.map(function (r) {{
+    return "<tr>" + Object.values(r).map(function (v) {{ return "<td>" + v + "</td>"; }}).join("") + "</tr>";
+  }});
+  document.getElementById("resultado").innerHTML = "<table>" + linhas.join("") + "</table>";
+  const excel = document.getElementById("excel");
+  excel.onclick = function () {{ window.location = "{base}/ncsyslog_v6/exportar?" + dados.toString(); }};
+  excel.style.display = "inline";
+}});
+</script>
+</body></html>"""
+
+
+class _Servidor:
+    """
+    Servidor HTTP local em uma porta livre, executado em uma thread daemon.
+    """
+
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.requisicoes = 0
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    def _handler(self):
+        raise NotImplementedError
+
+    def _contar(self):
+        with self._lock:
+            self.requisicoes += 1
+
+    def iniciar(self):
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def encerrar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    @property
+    def url(self):
+        host, porta = self._servidor.server_address
+        return f"http://{host}:{porta}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Cabeçalho e corpo saem em escritas separadas; com Nagle cada resposta esperaria o ACK atrasado
+    disable_nagle_algorithm = True
+
+    def _enviar(self, status, corpo=b"", content_type="text/html; charset=utf-8", headers=()):
+        if isinstance(corpo, str):
+            corpo = corpo.encode()
+        self.send_response(status)
+        for nome, valor in headers:
+            self.send_header(nome, valor)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _corpo(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(tamanho).decode() if tamanho else ""
+
+    def log_message(self, *args):
+        pass
+
+
+class FakePortal(_Servidor):
+    """
+    Imitação do portal com as mesmas telas, rótulos e endpoints usados pelos
+    engines browser e http. Cada consulta devolve `linhas` registros, com
+    usuários sorteados (de forma determinística) entre `usuarios` assinantes.
+
+    `contas` (usuário -> senha) define as contas aceitas no login. Com
+    `por_conta`, cada conta processa no máximo esse número de consultas ao
+    mesmo tempo: as demais esperam a vez ou, com `rejeitar_excedentes`,
+    recebem HTTP 429.
+    """
+
+    def __init__(
+        self, latencia=0.05, linhas=20, usuarios=1000, licencas=("acme",), usuario="bench", senha="bench",
+        contas=None, por_conta=None, rejeitar_excedentes=False,
+    ):
+        super().__init__(latencia)
+        self.linhas = linhas
+        self.usuarios = usuarios
+        self.licencas = licencas
+        self.usuario = usuario
+        self.senha = senha
+        self.contas = contas or {usuario: senha}
+        self.por_conta = por_conta
+        self.rejeitar_excedentes = rejeitar_excedentes
+        self.logins = 0
+        self.consultas = 0
+        self.consultas_por_conta = {conta: 0 for conta in self.contas}
+        self.recusadas = 0
+        self._semaforos = {conta: threading.Semaphore(por_conta) for conta in self.contas} if por_conta else {}
+        self._sessoes = {}
+        self._token_login = secrets.token_hex(8)
+        self._csrf = secrets.token_hex(8)
+
+    @property
+    def base_url(self):
+        return f"{self.url}/painel"
+
+    @property
+    def login_url(self):
+        return f"{self.url}/login"
+
+    @contextmanager
+    def _vez_da_conta(self, conta):
+        """
+        Ocupa uma das consultas simultâneas da conta; devolve False se ela foi recusada.
+        """
+        semaforo = self._semaforos.get(conta)
+        if semaforo is None:
+            yield True
+            return
+        if not semaforo.acquire(blocking=not self.rejeitar_excedentes):
+            with self._lock:
+                self.recusadas += 1
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            semaforo.release()
+
+    def registros(self, data, hora, ipv6):
+        semente = zlib.crc32(f"{data}|{hora}|{ipv6}".encode())
+        return [
+            {
+                "Data": data,
+                "Hora": hora,
+                "Usuário": f"cliente{(semente + i * 7919) % self.usuarios:06d}",
+                "IPv6": ipv6,
+                "NAS": f"bng-{i % 4}",
+                "Sessão": f"{semente:08x}{i:04x}",
+            }
+            for i in range(self.linhas)
+        ]
+
+    def _handler(self):
+        portal = self
+
+        class Handler(_Handler):
+            def _conta(self):
+                cookie = SimpleCookie(self.headers.get("Cookie", ""))
+                return portal._sessoes.get(cookie["sessao"].value) if "sessao" in cookie else None
+
+            def _autenticado(self):
+                return self._conta() is not None
+
+            def do_GET(self):
+                portal._contar()
+                url = urlsplit(self.path)
+                if url.path == "/login":
+                    return self._enviar(200, LOGIN_HTML.format(token=portal._token_login))
+                if not self._autenticado():
+                    return self._enviar(302, headers=[("Location", "/login")])
+                if url.path == "/painel/dashboard":
+                    return self._enviar(200, DASHBOARD_HTML.format(base="/painel"))
+                if url.path == "/painel/ncsyslog_v6":
+                    opcoes = "".join(f'<option value="{i}">Radius {html.escape(l)}</option>' for i, l in enumerate(portal.licencas))
+                    itens = "".join(
+                        f'<li role="option" data-value="{i}">Radius {html.escape(l)}</li>' for i, l in enumerate(portal.licencas)
+                    )
+                    return self._enviar(200, CONSULTA_HTML.format(
+                        base="/painel", csrf=portal._csrf, opcoes=opcoes, itens=itens,
+                        primeira=f"Radius {html.escape(portal.licencas[0])}",
+                    ))
+                if url.path == "/painel/ncsyslog_v6/exportar":
+                    return self._exportar(parse_qs(url.query))
+                return self._enviar(404, "Não encontrado")
+
+            def do_POST(self):
+                portal._contar()
+                dados = parse_qs(self._corpo())
+                if self.path == "/login":
+                    usuario = dados.get("usuario", [""])[0]
+                    valido = (
+                        dados.get("_token") == [portal._token_login]
+                        and usuario in portal.contas
+                        and dados.get("senha") == [portal.contas[usuario]]
+                    )
+                    if not valido:
+                        return self._enviar(302, headers=[("Location", "/login")])
+                    sessao = secrets.token_hex(16)
+                    with portal._lock:
+                        portal._sessoes[sessao] = usuario
+                        portal.logins += 1
+                    return self._enviar(302, headers=[
+                        ("Location", "/painel/dashboard"), ("Set-Cookie", f"sessao={sessao}; Path=/; HttpOnly"),
+                    ])
+                if self.path == "/painel/ncsyslog_v6/consultar":
+                    conta = self._conta()
+                    if conta is None or self.headers.get("X-CSRF-TOKEN") != portal._csrf:
+                        return self._enviar(419, "Sessão expirada")
+                    with portal._vez_da_conta(conta) as aceita:
+                        if not aceita:
+                            return self._enviar(429, "Muitas requisições")
+                        time.sleep(portal.latencia)
+                    with portal._lock:
+                        portal.consultas += 1
+                        portal.consultas_por_conta[conta] += 1
+                    registros = portal.registros(*(dados.get(campo, [""])[0] for campo in ("data", "hora", "ipv6")))
+                    return self._enviar(200, json.dumps({"data": registros}), "application/json")
+                return self._enviar(404, "Não encontrado")
+
+            def _exportar(self, dados):
+                with portal._vez_da_conta(self._conta()) as aceita:
+                    if not aceita:
+                        return self._enviar(429, "Muitas requisições")
+                    time.sleep(portal.latencia)
+                workbook = Workbook(write_only=True)
+                planilha = workbook.create_sheet()
+                planilha.append(["Consulta de autenticação"])
+                planilha.append(COLUNAS_CONSULTA)
+                for registro in portal.registros(*(dados.get(campo, [""])[0] for campo in ("data", "hora", "ipv6"))):
+                    planilha.append(list(registro.values()))
+                arquivo = io.BytesIO()
+                workbook.save(arquivo)
+                self._enviar(
+                    200,
+                    arquivo.getvalue(),
+                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    [("Content-Disposition", 'attachment; filename="consulta.xlsx"')],
+                )
+
+        return Handler
+
+
+class StubGraphQL(_Servidor):
+    """
+    Stub da API GraphQL do MK: responde `mk01.mk_conexoes` para os usernames
+    pedidos, após `latencia` segundos. Uma fração `desconhecidos` dos usuários
+    não é encontrada, para exercitar o cache negativo. `erros` são status HTTP
+    devolvidos, em ordem, antes das respostas normais (para as retentativas).
+    """
+
+    def __init__(self, latencia=0.02, desconhecidos=0.05, erros=()):
+        super().__init__(latencia)
+        self.desconhecidos = desconhecidos
+        self.erros = list(erros)
+
+    def conexao(self, username):
+        numero = zlib.crc32(username.encode())
+        if numero % 1000 < self.desconhecidos * 1000:
+            return None
+        return {
+            "username": username,
+            "mk_pessoa": {
+                "codpessoa": numero % 100000,
+                "nome_razaosocial": f"Assinante {username}",
+                "cpf": f"{numero % 10 ** 11:011d}",
+                "email": f"{username}@example.com",
+                "fone01": f"0{numero % 10 ** 10:010d}",
+                "fone02": None,
+                "cd_revenda": 1,
+                "cep": f"0{numero % 10 ** 7:07d}",
+                "numero": str(numero % 2000),
+                "complementoendereco": "",
+            },
+            "mk_logradouros": {
+                "logradouro": f"Rua {numero % 300}",
+                "mk_bairros": {
+                    "bairro": f"Bairro {numero % 40}",
+                    "mk_cidades": {"cidade": "Cidade", "mk_estado": {"siglaestado": "SP"}},
+                },
+            },
+        }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(_Handler):
+            def do_POST(self):
+                stub._contar()
+                usernames = json.loads(self._corpo() or "{}").get("variables", {}).get("usernames", [])
+                with stub._lock:
+                    erro = stub.erros.pop(0) if stub.erros else None
+                if erro:
+                    return self._enviar(erro, "Erro simulado", "text/plain", [("Retry-After", "0")])
+                time.sleep(stub.latencia)
+                conexoes = [c for c in (stub.conexao(u) for u in usernames) if c]
+                self._enviar(200, json.dumps({"data": {"mk01": {"mk_conexoes": conexoes}}}), "application/json")
+
+        return Handler
@@ -0,0 +1,80 @@
+"""
+Configuração do gunicorn para produção (gunicorn -c gunicorn.conf.py).
+
+Cada worker é um processo com o seu próprio pool de navegadores e os seus
+workers de jobs, então o total de Chromium é WEB_WORKERS x BROWSER_POOL_SIZE.
+As threads de requisição só enfileiram e acompanham jobs (a consulta roda nos
+workers de jobs), mas o polling, o NDJSON de eventos e os relatórios em
+streaming seguram uma thread cada; por isso o padrão é 4 threads por navegador.
+
+Os engines (pandas, Playwright, requests) são importados no primeiro uso; para
+pagar esse custo na partida do worker, liste os grupos em WEB_PRELOAD (ver
+api/preload.py), por exemplo WEB_PRELOAD=urls,browser.
+
+As migrações são aplicadas uma vez no processo master, antes dos workers
+(MIGRATE_ON_START, ativo por padrão). Com MIGRATE_ON_START=false, aplique
+`python manage.py migrate` no deploy.
+"""
+import os
+
+_pool = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+_asgi = os.getenv("WEB_ASGI", "false").lower() in ("1", "true", "yes")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_WORKERS", "2"))
+
+if _asgi:
+    # Necessário para a view assíncrona /api/consultar-ipv6/async/
+    wsgi_app = "myproject.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "myproject.wsgi:application"
+    worker_class = "gthread"
+    threads = int(os.getenv("WEB_THREADS", str(max(4, 4 * _pool))))
+
+# O Playwright e as threads de jobs não sobrevivem ao fork: cada worker importa a aplicação
+preload_app = False
+# Sem reciclagem por número de requisições: ela derrubaria o pool e os jobs em execução
+max_requests = 0
+
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+# Heartbeat dos workers em memória, e não no disco do contêiner
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = "-" if os.getenv("WEB_ACCESS_LOG", "true").lower() in ("1", "true", "yes") else None
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    _preparar_metricas()
+    if os.getenv("MIGRATE_ON_START", "true").lower() not in ("1", "true", "yes"):
+        return
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", interactive=False)
+    # O master não atende requisições: as conexões abertas aqui não devem ir para os workers
+    from django.db import connections
+
+    connections.close_all()
+
+
+def _preparar_metricas():
+    """
+    Diretório onde cada worker grava as suas métricas, para que /metrics some
+    as de todos (ver api/metrics.py). É esvaziado a cada partida: contadores de
+    uma execução anterior não devem somar aos desta.
+    """
+    import glob
+    import tempfile
+
+    if not os.getenv("METRICS_DIR"):
+        os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="metrics-", dir=worker_tmp_dir)
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+    for arquivo in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+        os.remove(arquivo)
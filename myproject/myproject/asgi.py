@@ -14,3 +14,13 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myproject.settings')
 
 application = get_asgi_application()
+
+# Carrega na partida do worker o que a primeira requisição precisaria (WEB_PRELOAD)
+from api.preload import precarregar
+
+precarregar()
+
+# Workers de jobs já na partida: retomam os jobs pendentes de antes de um restart
+from api.jobs import iniciar_workers
+
+iniciar_workers()
@@ -13,6 +13,11 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
+# Carregar variáveis de ambiente antes de qualquer configuração lida delas
+load_dotenv()
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,10 +26,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
 
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-6mq44rj12&ipxzq190nh+!c12fb+_rh(roa+3v5okkc*@cso^^'
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure-6mq44rj12&ipxzq190nh+!c12fb+_rh(roa+3v5okkc*@cso^^')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# A imagem Docker define DEBUG=false; o padrão mantém o runserver local como antes
+DEBUG = os.getenv('DEBUG', 'true').lower() in ('1', 'true', 'yes')
 
 CSRF_TRUSTED_ORIGINS = [
     'https://playwrightlogs.online.dev.br',
@@ -151,21 +157,68 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 # Define a pasta onde o banco de dados será salvo
-DATABASE_DIR = BASE_DIR / 'data'
+DATABASE_DIR = Path(os.getenv("DATABASE_DIR", BASE_DIR / 'data'))
 
 
 # Cria a pasta se não existir
 DATABASE_DIR.mkdir(parents=True, exist_ok=True)
 
 
+# WAL permite leituras (polling de jobs, relatórios) durante as escritas dos
+# workers; IMMEDIATE reserva a escrita já no início da transação, e o timeout
+# faz a conexão esperar pela trava em vez de falhar com "database is locked"
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': DATABASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': float(os.getenv('SQLITE_TIMEOUT', '20')),
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;PRAGMA synchronous=NORMAL'
+                if os.getenv('SQLITE_WAL', 'true').lower() in ('1', 'true', 'yes') else ''
+            ),
+        },
+        # Reaproveita a conexão entre requisições da mesma thread (segundos)
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        # Banco de testes em arquivo, com o mesmo WAL e timeout: o padrão em memória
+        # compartilhada falha com "table is locked" quando threads escrevem juntas
+        'TEST': {'NAME': DATABASE_DIR / 'test_db.sqlite3'},
     }
 }
 
 
+# Engine padrão das consultas ao portal: "browser" (Playwright) ou "http" (requisição direta)
+
+PORTAL_ENGINE = os.getenv("PORTAL_ENGINE", "browser")
+
+# Baixa a exportação em Excel do portal; com "false" as linhas são lidas da
+# resposta da consulta e o xlsx só é gerado quando o cliente pede (excel=true)
+
+PORTAL_EXPORT_EXCEL = os.getenv("PORTAL_EXPORT_EXCEL", "true").lower() in ("1", "true", "yes")
+
+
+# Logs da aplicação no console, no formato usado antes em views.py. O logger
+# "django" deixa de ter handler próprio para não duplicar as linhas no root
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'padrao': {'format': '%(asctime)s - %(levelname)s - %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'padrao'},
+    },
+    'root': {'handlers': ['console'], 'level': os.getenv('LOG_LEVEL', 'INFO')},
+    'loggers': {
+        'django': {'handlers': [], 'level': 'INFO'},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -202,6 +255,13 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Destino do collectstatic (feito no build da imagem); fora do DEBUG os arquivos
+# são servidos pela própria aplicação quando SERVE_STATIC=true
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+SERVE_STATIC = os.getenv('SERVE_STATIC', 'true').lower() in ('1', 'true', 'yes')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1,13 +1,12 @@
+from django.conf import settings
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+from django.views.static import serve
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from dotenv import load_dotenv
 from django.views.generic import TemplateView
-
-# Carregar variáveis de ambiente
-load_dotenv()
+from api.views import metricas
 
 
 schema_view = get_schema_view(
@@ -26,9 +25,16 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('metrics', metricas, name='metrics'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('swagger-custom/', TemplateView.as_view(
         template_name='swagger-ui.html',
         extra_context={'schema_url': 'schema-swagger-ui'}
     ), name='swagger-ui-custom'),
-]
\ No newline at end of file
+]
+
+if not settings.DEBUG and settings.SERVE_STATIC:
+    # Arquivos estáticos (admin, Swagger) sem servidor web na frente
+    urlpatterns += [
+        re_path(rf'^{settings.STATIC_URL.strip("/")}/(?P<path>.*)$', serve, {'document_root': settings.STATIC_ROOT}),
+    ]